@@ -0,0 +1 @@
+default_app_config = 'tcapp.apps.TcappConfig' #pylint:disable=invalid-name
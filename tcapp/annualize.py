@@ -0,0 +1,328 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Exact, integer-only, annualization of incomes.
+
+The functions here mirror ``Income.annual_income`` and the
+``annualize_income_*`` functions in ``tcapp.models`` but:
+
+- they work on compact ``IncomeRow`` tuples, which can be read straight
+  out of the database with ``values_list(*INCOME_ROW_FIELDS)``, instead
+  of model instances,
+- they never go through floating point. Each intermediate result is
+  an exact rational number.
+
+Rounding: amounts are in cents. An annual income is the exact rational
+result truncated toward zero to a whole cent, as ``int()`` does in
+``tcapp.models``. Period-to-date incomes are truncated once, after
+the amounts for all categories are summed. Year-to-date and direct
+calculations sum incomes that were each truncated, as in ``tcapp.models``.
+The two implementations therefore agree except when floating point errors
+in ``tcapp.models`` cross a whole cent. See the ``check_annualization``
+command.
+
+``tcapp.models`` does not import ``division`` from ``__future__``, so under
+Python 2 ``Income.annual_income`` floors ``amount * period_per_avg / 100``
+(hourly and daily incomes) and ``amount * periods / nb_days`` (other
+periods) before multiplying. The kernel floors the same intermediate
+results when ``FLOOR_DIVISION`` is `True` (i.e. under Python 2) such that
+reports always agree with the forms and eligibility pages.
+
+``residents_total_income`` and ``applications_total_income`` compute
+the gross annual income of many residents at once, for reports.
+When NumPy is installed, they delegate to the vectorized implementation
+in ``tcapp.annualize_numpy``.
+"""
+from __future__ import unicode_literals
+
+import calendar, logging
+from collections import namedtuple
+
+from django.utils import six
+
+from .models import ApplicationResident, Income, Question
+from .utils import datetime_or_now
+
+try:
+    from math import gcd
+except ImportError: # Python < 3.5
+    from fractions import gcd #pylint:disable=deprecated-method
+
+
+LOGGER = logging.getLogger(__name__)
+
+INCOME_ROW_FIELDS = ('verified', 'period', 'category', 'amount',
+    'period_per_avg', 'avg', 'avg_per_year', 'starts_at', 'ends_at')
+
+IncomeRow = namedtuple('IncomeRow', INCOME_ROW_FIELDS) #pylint:disable=invalid-name
+
+# Number of natural periods (x100) in a year, except for ``Income.OTHER``
+# (i.e. days) which depends on the year.
+NATURAL_PERIODS_PER_YEAR = {
+    Income.WEEKLY: 5200,
+    Income.BI_WEEKLY: 2600,
+    Income.SEMI_MONTHLY: 2400,
+    Income.MONTHLY: 1200,
+    Income.YEARLY: 100,
+}
+
+# Integer ``/`` floors in ``tcapp.models`` under Python 2.
+FLOOR_DIVISION = six.PY2
+
+FIXED_PERIODS = (Income.WEEKLY, Income.BI_WEEKLY, Income.SEMI_MONTHLY,
+    Income.MONTHLY, Income.YEARLY)
+
+# Questions whose incomes are annualized together, in the order
+# of ``Resident.total_income`` (Part III Gross Annual Income). Sources
+# are merged across the questions of a group.
+INCOME_QUESTION_GROUPS = (
+    Question.INCOME_SELF_EMPLOYED,
+    Question.INCOME_EMPLOYEE,
+    Question.B_SOCIAL_SECURITY_AND_PENSIONS,
+    Question.C_PUBLIC_ASSISTANCE,
+    Question.D_OTHER_INCOME,
+)
+
+QUESTION_GROUPS = {question_id: idx
+    for idx, questions in enumerate(INCOME_QUESTION_GROUPS)
+    for question_id in questions}
+
+# Columns of ``residents_total_income`` rows: the resident and
+# question/source used to group incomes followed by an ``IncomeRow``.
+RESIDENT_INCOME_FIELDS = ('resident', 'question', 'source') \
+    + INCOME_ROW_FIELDS
+
+
+def as_income_row(income):
+    """
+    Returns the ``IncomeRow`` for an ``Income`` instance.
+    """
+    return IncomeRow(*[getattr(income, field) for field in INCOME_ROW_FIELDS])
+
+
+def _div_trunc(numerator, denominator):
+    """
+    Integer division truncated toward zero, as ``int(a / b)`` does.
+    """
+    quotient = abs(numerator) // abs(denominator)
+    if (numerator < 0) != (denominator < 0):
+        return -quotient
+    return quotient
+
+
+def _reduce(numerator, denominator):
+    divisor = abs(gcd(numerator, denominator)) or 1
+    return numerator // divisor, denominator // divisor
+
+
+def nb_days(row):
+    try:
+        return (row.ends_at - row.starts_at).days + 1
+    except TypeError:
+        return 0
+
+
+def total_natural_periods_per_year(row):
+    """
+    Total number of days, weeks, months, etc. (x100) in a year.
+    """
+    natural_period = row.period
+    if natural_period in (Income.HOURLY, Income.DAILY, Income.WEEKLY):
+        natural_period = row.avg
+    result = NATURAL_PERIODS_PER_YEAR.get(natural_period)
+    if result is None:
+        if natural_period != Income.OTHER:
+            raise ValueError("Unable to compute natural periods per year"\
+                " with period: '%s'" % natural_period)
+        result = (366 if calendar.isleap(datetime_or_now(row.ends_at).year)
+            else 365) * 100
+    return result
+
+
+def nb_natural_periods_per_year(row):
+    if row.avg_per_year == 0:
+        return total_natural_periods_per_year(row)
+    return row.avg_per_year
+
+
+def annual_income(row):
+    """
+    Annual income in cents of a single income *row*.
+    """
+    if row.verified == Income.VERIFIED_TAX_RETURN:
+        return row.amount
+    if row.period in (Income.HOURLY, Income.DAILY):
+        # ``period_per_avg`` and periods per year are both x100.
+        if FLOOR_DIVISION:
+            return _div_trunc(row.amount * row.period_per_avg // 100
+                * nb_natural_periods_per_year(row), 100)
+        return _div_trunc(row.amount * row.period_per_avg
+            * nb_natural_periods_per_year(row), 10000)
+    if row.period in FIXED_PERIODS:
+        return _div_trunc(row.amount * nb_natural_periods_per_year(row), 100)
+    if row.period == Income.OTHER:
+        days = nb_days(row)
+        if days == 0:
+            raise ValueError("Unable to compute annual income with a zero "\
+                "days period")
+        if FLOOR_DIVISION:
+            return _div_trunc(
+                row.amount * nb_natural_periods_per_year(row) // days, 100)
+        return _div_trunc(
+            row.amount * nb_natural_periods_per_year(row), days * 100)
+    raise ValueError("Unable to compute annual income with period:"\
+        " '%s'" % row.period)
+
+
+def annualize_employer(rows):
+    return sum([annual_income(row) for row in rows])
+
+
+def annualize_tax_return(rows):
+    return sum([row.amount for row in rows])
+
+
+def annualize_period_to_date(rows):
+    """
+    Sum, for each category, of the amounts earned divided by the fraction
+    of the year the pay periods cover.
+    """
+    amounts = {}
+    fractions = {}
+    for row in rows:
+        amounts[row.category] = amounts.get(row.category, 0) + row.amount
+        # fraction of the year += nb_days * 100 / total_periods
+        total_periods = total_natural_periods_per_year(row)
+        numerator, denominator = fractions.get(row.category, (0, 1))
+        fractions[row.category] = _reduce(
+            numerator * total_periods + nb_days(row) * 100 * denominator,
+            denominator * total_periods)
+    total_numerator, total_denominator = 0, 1
+    for category, amount in six.iteritems(amounts):
+        numerator, denominator = fractions[category]
+        if numerator <= 0:
+            LOGGER.warning("divide by zero in PTD calculation")
+            continue
+        # total += amount / (numerator / denominator)
+        total_numerator, total_denominator = _reduce(
+            total_numerator * numerator
+            + amount * denominator * total_denominator,
+            total_denominator * numerator)
+    return _div_trunc(total_numerator, total_denominator)
+
+
+def annualize_year_to_date(rows):
+    """
+    Sum, for each category, of the annual income of the latest pay-stub.
+    """
+    lasts = {}
+    for row in rows:
+        if row.ends_at is None:
+            raise ValueError(
+                "Using a data point without an ends_at for YTD calculation")
+        last = lasts.get(row.category)
+        if last is None or last.ends_at < row.ends_at:
+            lasts[row.category] = row
+        elif (last.ends_at.date() == row.ends_at.date()
+              and annual_income(last) < annual_income(row)):
+            lasts[row.category] = row
+    return sum([annual_income(row) for row in six.itervalues(lasts)])
+
+
+def annualize(rows, verified):
+    if verified == Income.VERIFIED_YEAR_TO_DATE:
+        return annualize_year_to_date(rows)
+    elif verified == Income.VERIFIED_PERIOD_TO_DATE:
+        return annualize_period_to_date(rows)
+    elif verified == Income.VERIFIED_TAX_RETURN:
+        return annualize_tax_return(rows)
+    return annualize_employer(rows)
+
+
+def greater_of_annualize(verifications):
+    """
+    Greater of annualized income based on various verification method.
+
+    *verifications* is a dict of {verified: [IncomeRow, ...]}
+    """
+    result = 0
+    for verified, rows in six.iteritems(verifications):
+        try:
+            result = max(result, annualize(rows, verified))
+        except ValueError:
+            # XXX We skip bogus entries, as ``tcapp.models`` does.
+            pass
+    return result
+
+
+def sum_greater_of_annualize(verif_by_sources):
+    """
+    *verif_by_sources* is a dict of {source: {verified: [IncomeRow, ...]}}
+    """
+    return sum([greater_of_annualize(verifications)
+        for verifications in six.itervalues(verif_by_sources)])
+
+
+def rows_total_income(rows):
+    """
+    Pure Python implementation of ``residents_total_income``.
+
+    *rows* are tuples of ``RESIDENT_INCOME_FIELDS``.
+    """
+    by_residents = {}
+    for row in rows:
+        group = QUESTION_GROUPS.get(row[1])
+        if group is None:
+            continue
+        verif_by_sources = by_residents.setdefault(row[0], {})
+        verifications = verif_by_sources.setdefault((group, row[2]), {})
+        income = IncomeRow(*row[3:])
+        verifications.setdefault(income.verified, []).append(income)
+    return {resident_id: sum_greater_of_annualize(verif_by_sources)
+        for resident_id, verif_by_sources in six.iteritems(by_residents)}
+
+
+def residents_total_income(incomes, vectorized=None):
+    """
+    Returns the gross annual income in cents, as ``Resident.total_income``,
+    of all residents with *incomes* (a queryset of ``Income``)
+    as ``{resident_id: amount}``.
+
+    The vectorized implementation is used when *vectorized* is `True`,
+    or when it is `None` and NumPy is installed.
+
+    Pay-stubs used in year-to-date calculations are considered in
+    chronological order such that, for each category, the latest one
+    is used, and amongst those ending at the same time, the one with
+    the greater annual income.
+    """
+    rows = list(incomes.order_by('resident', 'question', 'source',
+        'verified', 'ends_at').values_list(*RESIDENT_INCOME_FIELDS))
+    if vectorized is None or vectorized:
+        try:
+            from . import annualize_numpy
+            return annualize_numpy.residents_total_income(rows)
+        except ImportError:
+            if vectorized:
+                raise
+            LOGGER.debug("NumPy is not installed,"\
+                " annualizing incomes one at a time.")
+    return rows_total_income(rows)
+
+
+def applications_total_income(applications, vectorized=None):
+    """
+    Returns the total income in cents, as ``Application.total_income``,
+    of *applications* (a queryset of ``Application``)
+    as ``{application_id: amount}``.
+    """
+    applicants = ApplicationResident.objects.filter(
+        application__in=applications)
+    by_residents = residents_total_income(Income.objects.filter(
+        resident__in=applicants.values('resident')), vectorized=vectorized)
+    results = {}
+    for application_id, resident_id in applicants.values_list(
+            'application', 'resident'):
+        results[application_id] = (results.get(application_id, 0)
+            + by_residents.get(resident_id, 0))
+    return results
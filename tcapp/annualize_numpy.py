@@ -0,0 +1,289 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Vectorized annualization of incomes for reports.
+
+``residents_total_income`` loads incomes as columns and computes annual
+incomes, year-to-date, period-to-date, greater-of and sum-by-source
+reductions with NumPy. It returns the same results as the integer kernel
+in ``tcapp.annualize``, which it falls back to for the rare rows or groups
+whose intermediate results do not fit in 64-bit integers.
+
+NumPy is an optional dependency. Importing this module raises
+an ``ImportError`` when it is not installed.
+"""
+from __future__ import unicode_literals
+
+import datetime, logging
+
+import numpy as np
+from django.utils.timezone import utc
+
+from . import annualize
+from .models import Income
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Products larger than this are computed with Python integers.
+INT64_SAFE = 2 ** 62
+
+# Least common multiple of all possible ``total_natural_periods_per_year``
+# such that period-to-date fractions of the year are exact integers.
+PERIODS_LCM = 694668000
+
+MICROSECONDS_PER_DAY = 24 * 3600 * 1000000
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=utc)
+
+NAT = np.iinfo(np.int64).min
+
+NB_PERIODS = max(dict(Income.PERIOD)) + 1
+
+
+def _as_microseconds(values):
+    """
+    Returns datetimes as an array of microseconds since Epoch,
+    with ``None`` as NaT.
+    """
+    # Much faster than letting NumPy convert ``datetime`` instances.
+    return np.fromiter((_microseconds(value - EPOCH)
+        if value is not None else NAT for value in values),
+        dtype=np.int64, count=len(values)).view('datetime64[us]')
+
+
+def _microseconds(delta):
+    # ``timedelta // timedelta`` is not supported by Python 2.
+    return (delta.days * MICROSECONDS_PER_DAY
+        + delta.seconds * 1000000 + delta.microseconds)
+
+
+def _as_lookup(table):
+    lookup = np.full(NB_PERIODS, -1, dtype=np.int64)
+    for period, value in table.items():
+        lookup[period] = value
+    return lookup
+
+
+def _trunc_div(numerator, denominator):
+    """
+    Element-wise integer division truncated toward zero.
+    """
+    quotient = np.abs(numerator) // np.maximum(np.abs(denominator), 1)
+    return np.where((numerator < 0) != (denominator < 0), -quotient, quotient)
+
+
+def _starts(*keys):
+    """
+    Returns the indices at which a run of equal *keys* starts
+    in sorted arrays.
+    """
+    changed = np.zeros(len(keys[0]), dtype=bool)
+    if len(changed):
+        changed[0] = True
+    for key in keys:
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+
+class IncomeColumns(object):
+    """
+    Incomes as columns, with the annual income of each income.
+    """
+    #pylint:disable=too-many-instance-attributes
+
+    def __init__(self, rows):
+        self.rows = rows
+        columns = list(zip(*rows)) if rows else [
+            ()] * len(annualize.RESIDENT_INCOME_FIELDS)
+        (residents, questions, sources, verified, period, category, amount,
+         period_per_avg, avg, avg_per_year, starts_at, ends_at) = columns
+        self.resident = np.array(residents, dtype=np.int64)
+        self.group = np.array([annualize.QUESTION_GROUPS.get(question, -1)
+            for question in questions], dtype=np.int64)
+        self.source = np.array([source if source is not None else -1
+            for source in sources], dtype=np.int64)
+        self.verified = np.array(verified, dtype=np.int64)
+        self.period = np.array(period, dtype=np.int64)
+        self.category = np.array(category, dtype=np.int64)
+        self.amount = np.array(amount, dtype=np.int64)
+        self.period_per_avg = np.array(period_per_avg, dtype=np.int64)
+        self.avg = np.array(avg, dtype=np.int64)
+        self.avg_per_year = np.array(avg_per_year, dtype=np.int64)
+        self.starts_at = _as_microseconds(starts_at)
+        self.ends_at = _as_microseconds(ends_at)
+        self.total_periods = self.get_total_natural_periods_per_year()
+        self.nb_days = self.get_nb_days()
+        self.annual, self.error = self.get_annual_income()
+
+    def get_nb_days(self):
+        known = ~(np.isnat(self.starts_at) | np.isnat(self.ends_at))
+        delta = (self.ends_at - self.starts_at).astype(np.int64)
+        return np.where(known, delta // MICROSECONDS_PER_DAY + 1, 0)
+
+    def get_total_natural_periods_per_year(self):
+        """
+        Total number of days, weeks, months, etc. (x100) in a year,
+        -1 when it cannot be computed.
+        """
+        natural_period = np.where(np.isin(self.period,
+            (Income.HOURLY, Income.DAILY, Income.WEEKLY)),
+            self.avg, self.period)
+        valid = (natural_period >= 0) & (natural_period < NB_PERIODS)
+        natural_period = np.where(valid, natural_period, 0)
+        years = np.where(np.isnat(self.ends_at), datetime_or_now().year,
+            self.ends_at.astype('datetime64[Y]').astype(np.int64) + 1970)
+        days_per_year = np.where((years % 4 == 0)
+            & ((years % 100 != 0) | (years % 400 == 0)), 36600, 36500)
+        result = _as_lookup(annualize.NATURAL_PERIODS_PER_YEAR)[natural_period]
+        result = np.where(natural_period == Income.OTHER,
+            days_per_year, result)
+        return np.where(valid, result, -1)
+
+    def get_annual_income(self):
+        """
+        Returns the annual income of each income and whether it raised
+        a ``ValueError`` in ``tcapp.annualize.annual_income``.
+        """
+        nb_periods = np.where(self.avg_per_year == 0,
+            self.total_periods, self.avg_per_year)
+        hourly = np.isin(self.period, (Income.HOURLY, Income.DAILY))
+        fixed = np.isin(self.period, annualize.FIXED_PERIODS)
+        other = self.period == Income.OTHER
+        tax_return = self.verified == Income.VERIFIED_TAX_RETURN
+        error = ~tax_return & (
+            ((self.avg_per_year == 0) & (self.total_periods < 0))
+            | ~(hourly | fixed | other)
+            | (other & (self.nb_days == 0)))
+        multiplier = np.where(hourly, self.period_per_avg, 1)
+        divisor = np.where(hourly, 10000,
+            np.where(other, self.nb_days * 100, 100))
+        overflow = ~tax_return & ~error & (np.abs(self.amount.astype(float))
+            * np.abs(multiplier.astype(float))
+            * np.abs(nb_periods.astype(float)) >= INT64_SAFE)
+        amount = np.where(overflow | error, 0, self.amount)
+        if annualize.FLOOR_DIVISION:
+            # As ``tcapp.annualize.annual_income`` under Python 2.
+            numerator = np.where(hourly,
+                amount * multiplier // 100 * nb_periods,
+                np.where(other, amount * nb_periods // np.where(
+                    self.nb_days == 0, 1, self.nb_days),
+                amount * nb_periods))
+            divisor = np.full(len(numerator), 100, dtype=np.int64)
+        else:
+            numerator = amount * multiplier * nb_periods
+        annual = np.where(tax_return, self.amount,
+            np.where(error, 0, _trunc_div(numerator, divisor)))
+        for idx in np.flatnonzero(overflow):
+            annual[idx] = annualize.annual_income(
+                annualize.IncomeRow(*self.rows[idx][3:]))
+        return annual, error
+
+
+def _period_to_date(columns, order, lengths):
+    """
+    Annualized period-to-date income of each group of *lengths* incomes
+    in *order* (grouped by category), and whether it raised
+    a ``ValueError``.
+    """
+    #pylint:disable=too-many-locals
+    nb_groups = len(lengths)
+    starts = np.cumsum(lengths) - lengths
+    group_of = np.repeat(np.arange(nb_groups), lengths)
+    total_periods = columns.total_periods[order]
+    errors = np.logical_or.reduceat(total_periods < 0, starts)
+    # fraction of the year (x PERIODS_LCM) covered by each pay period.
+    fractions = columns.nb_days[order] * 100 * (
+        PERIODS_LCM // np.where(total_periods > 0, total_periods, 1))
+    categories = _starts(group_of, columns.category[order])
+    amounts = np.add.reduceat(columns.amount[order], categories)
+    fractions = np.add.reduceat(fractions, categories)
+    category_group = group_of[categories]
+    counted = fractions > 0
+    fallback = np.zeros(nb_groups, dtype=bool)
+    np.logical_or.at(fallback, category_group, counted & (
+        (amounts < 0) | (np.abs(amounts.astype(float)) * PERIODS_LCM
+            >= INT64_SAFE)))
+    safe = counted & ~fallback[category_group]
+    numerators = np.where(safe, amounts * PERIODS_LCM, 0)
+    denominators = np.where(safe, fractions, 1)
+    values = np.zeros(nb_groups, dtype=np.int64)
+    np.add.at(values, category_group, numerators // denominators)
+    remainders = np.zeros(nb_groups, dtype=float)
+    np.add.at(remainders, category_group,
+        (numerators % denominators) / denominators.astype(float))
+    values += np.floor(remainders).astype(np.int64)
+    # The sum of remainders is exact unless it is close to a whole number.
+    fallback |= (remainders > 0.5) & (
+        np.abs(remainders - np.round(remainders)) < 1e-6)
+    for idx in np.flatnonzero(fallback & ~errors):
+        values[idx] = annualize.annualize_period_to_date([
+            annualize.IncomeRow(*columns.rows[row][3:])
+            for row in order[starts[idx]:starts[idx] + lengths[idx]]])
+    return values, errors
+
+
+def residents_total_income(rows):
+    """
+    Vectorized implementation of ``tcapp.annualize.residents_total_income``.
+
+    *rows* are tuples of ``tcapp.annualize.RESIDENT_INCOME_FIELDS``.
+    """
+    #pylint:disable=too-many-locals
+    columns = IncomeColumns(rows)
+    order = np.flatnonzero(columns.group >= 0)
+    # Groups of incomes (resident, group, source, verified, category),
+    # each sorted chronologically, then by annual income.
+    order = order[np.lexsort((
+        columns.annual[order], columns.ends_at[order].astype(np.int64),
+        columns.category[order], columns.verified[order],
+        columns.source[order], columns.group[order],
+        columns.resident[order]))]
+    resident = columns.resident[order]
+    group = columns.group[order]
+    source = columns.source[order]
+    verified = columns.verified[order]
+    starts = _starts(resident, group, source, verified)
+    ends = np.append(starts[1:], len(order))
+    group_verified = verified[starts]
+    values = np.add.reduceat(columns.annual[order], starts) if len(
+        starts) else np.zeros(0, dtype=np.int64)
+    errors = np.logical_or.reduceat(columns.error[order], starts) if len(
+        starts) else np.zeros(0, dtype=bool)
+
+    # Year-to-date: the latest pay-stub of each category.
+    ytd = np.flatnonzero(group_verified == Income.VERIFIED_YEAR_TO_DATE)
+    if len(ytd):
+        is_ytd = np.repeat(group_verified == Income.VERIFIED_YEAR_TO_DATE,
+            ends - starts)
+        group_of = np.repeat(np.arange(len(starts)), ends - starts)
+        category = columns.category[order]
+        last = np.append(_starts(group_of, category)[1:], len(order)) - 1
+        last = last[is_ytd[last]]
+        values[ytd] = 0
+        errors[ytd] = False
+        np.add.at(values, group_of[last], columns.annual[order][last])
+        np.logical_or.at(errors, group_of[last], columns.error[order][last])
+        np.logical_or.at(errors, group_of,
+            is_ytd & np.isnat(columns.ends_at[order]))
+
+    # Period-to-date: sum of amounts over the fraction of the year covered.
+    ptd = np.flatnonzero(group_verified == Income.VERIFIED_PERIOD_TO_DATE)
+    if len(ptd):
+        is_ptd = np.repeat(
+            group_verified == Income.VERIFIED_PERIOD_TO_DATE, ends - starts)
+        values[ptd], errors[ptd] = _period_to_date(
+            columns, order[is_ptd], (ends - starts)[ptd])
+
+    # Greater of all verification methods for a source (at least zero),
+    # then sum of all sources for a resident.
+    values = np.where(errors, 0, np.maximum(values, 0))
+    sources = _starts(resident[starts], group[starts], source[starts])
+    if not len(sources):
+        return {}
+    greater_of = np.maximum.reduceat(values, sources)
+    residents = resident[starts][sources]
+    totals = _starts(residents)
+    return dict(zip(residents[totals].tolist(),
+        np.add.reduceat(greater_of, totals).tolist()))
@@ -8,10 +8,13 @@ from django.db import transaction
 from extra_views.contrib.mixins import SearchableListMixin, SortableListMixin
 from rest_framework.generics import (CreateAPIView, ListAPIView,
     RetrieveUpdateAPIView)
+from rest_framework.response import Response
 
 from .. import signals
-from ..mixins import ApplicationMixin, PropertyMixin
+from ..eligibility import estimate_application
+from ..mixins import ApplicationMixin, ConditionalGetMixin, PropertyMixin
 from ..models import Application
+from ..pagination import ApplicationPagination
 from ..serializers import (ApplicationDetailSerializer,
     ApplicationSummarySerializer)
 
@@ -24,8 +27,7 @@ class ApplicationFilterMixin(SearchableListMixin):
     ``Application`` list result of a search query, filtered by dates.
     """
 
-    search_fields = ['applicants__last_name',
-                     'applicants__first_name']
+    search_fields = ['head_name']
 
 
 class SmartApplicationListMixin(SortableListMixin, ApplicationFilterMixin):
@@ -34,7 +36,9 @@ class SmartApplicationListMixin(SortableListMixin, ApplicationFilterMixin):
     """
 
     sort_fields_aliases = [('created_at', 'created_at'),
-                           ('printable_name', 'printable_name'),
+                           ('printable_name', 'head_name'),
+                           ('household_size', 'household_size'),
+                           ('annual_income', 'annual_income'),
                            ('status', 'status'),
                            ('unit_number', 'unit_number')]
 
@@ -42,7 +46,8 @@ class SmartApplicationListMixin(SortableListMixin, ApplicationFilterMixin):
 class ApplicationQuerysetMixin(PropertyMixin):
 
     def get_queryset(self):
-        return Application.objects.filter(lihtc_property=self.project)
+        return Application.objects.filter(
+            lihtc_property=self.project).select_related('lihtc_property')
 
 
 class ApplicationAPIView(SmartApplicationListMixin,
@@ -62,7 +67,17 @@ class ApplicationAPIView(SmartApplicationListMixin,
 
       - Application.created_at
       - Application.printable_name
+      - Application.household_size
+      - Application.annual_income
       - Application.status
+      - Application.unit_number
+
+    ``count`` and the per-status ``facets`` are computed in a single
+    grouped query and cached briefly. When ordered by ``created_at``,
+    passing a ``cursor`` parameter (empty for the first page) selects
+    pages through a keyset on (``created_at``, ``id``) instead
+    of an ``OFFSET``. The ``next`` link then carries the cursor
+    for the following page.
 
     **Example request**:
 
@@ -77,6 +92,16 @@ class ApplicationAPIView(SmartApplicationListMixin,
 
         {
             "count": 1,
+            "facets": {
+                "new-application": 1,
+                "verification": 0,
+                "household-income": 0,
+                "certification": 0,
+                "lease": 0,
+                "move-in": 0,
+                "re-certification": 0,
+                "archived": 0
+            },
             "next": null,
             "previous": null,
             "results": [
@@ -84,12 +109,15 @@ class ApplicationAPIView(SmartApplicationListMixin,
                     "created_at": "2017-01-01T00:00:00Z",
                     "printable_name": "Donny Test"
                     "slug": "ABC123",
-                    "status": "new-application"
+                    "status": "new-application",
+                    "household_size": 2,
+                    "annual_income": 3600000
                 }
             ]
         }
     """
     serializer_class = ApplicationSummarySerializer
+    pagination_class = ApplicationPagination
 
 
 class ApplicationCreateAPIView(PropertyMixin, CreateAPIView):
@@ -172,10 +200,28 @@ class ApplicationCreateAPIView(PropertyMixin, CreateAPIView):
                 "student_status": {}
             }]
         }
+
+    With ``?estimate=1``, the payload is validated the same way but
+    nothing is saved. The response is the household income estimate
+    and eligibility at the 50% and 60% AMI limits instead (see
+    ``tcapp.eligibility.estimate_application``).
     """
 
     serializer_class = ApplicationDetailSerializer
 
+    @property
+    def is_estimate(self):
+        return bool(self.request.query_params.get('estimate'))
+
+    def create(self, request, *args, **kwargs):
+        if not self.is_estimate:
+            return super(ApplicationCreateAPIView, self).create(
+                request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(estimate_application(
+            serializer.validated_data, self.project))
+
     def perform_create(self, serializer):
         with transaction.atomic():
             application = serializer.save()
@@ -185,11 +231,15 @@ class ApplicationCreateAPIView(PropertyMixin, CreateAPIView):
                     args=(application.lihtc_property, application,))))
 
 
-class ApplicationDetailAPIView(ApplicationMixin, RetrieveUpdateAPIView):
+class ApplicationDetailAPIView(ConditionalGetMixin, ApplicationMixin,
+                               RetrieveUpdateAPIView):
     """
     GET Retrieve a single ``Application``
     PUT Update information on an ``Application``
 
+    GET responses carry ETag and Last-Modified validators. A conditional
+    GET on an unchanged application returns 304 Not Modified.
+
     **Example request**:
 
     .. sourcecode:: http
@@ -218,3 +268,10 @@ class ApplicationDetailAPIView(ApplicationMixin, RetrieveUpdateAPIView):
 
     def get_object(self):
         return self.application
+
+    def get(self, request, *args, **kwargs):
+        not_modified = self.get_not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+        return self.set_validators(super(ApplicationDetailAPIView, self).get(
+            request, *args, **kwargs))
@@ -0,0 +1,61 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+
+import logging
+
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+
+from ..compliance import get_rent_compliance
+from ..mixins import PropertyMixin
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RentComplianceAPIView(PropertyMixin, GenericAPIView):
+    """
+    Checks the gross monthly rent (rent, utility allowance and other
+    non-optional charges) of each unit currently rented at a property
+    against the Federal LIHTC rent limit for the unit.
+
+    With ``?over_limit=1``, only the units over the limit are returned.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        GET /api/properties/:project/compliance/rents/?over_limit=1
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+        {
+            "nb_units": 120,
+            "nb_over_limit": 1,
+            "units": [{
+                "application": "ea709e622c8e40a6869b492c078b2b5f",
+                "unit_number": "204",
+                "head_name": "Bill Smith",
+                "nb_bedrooms": 2,
+                "effective_date": "2018-03-01T00:00:00Z",
+                "monthly_rent": 105000,
+                "monthly_utility_allowance": 8500,
+                "monthly_other_charges": 0,
+                "gross_monthly_rent": 113500,
+                "rent_restriction": 50,
+                "rent_limit_100": 220200,
+                "rent_limit": 110100,
+                "is_over_limit": true
+            }]
+        }
+    """
+
+    def get(self, request, *args, **kwargs):
+        #pylint:disable=unused-argument
+        result = get_rent_compliance(self.project)
+        if request.query_params.get('over_limit'):
+            result = dict(result, units=[unit for unit in result['units']
+                if unit['is_over_limit']])
+        return Response(result)
@@ -1,18 +1,26 @@
 # Copyright (c) 2017, TeaCapp LLC
 #   All rights reserved.
 
-import hashlib, logging, os
+import json, logging, os, posixpath, time, zipfile
+from multiprocessing.pool import ThreadPool
 
+from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils.encoding import force_text
 from rest_framework import parsers, status
 from rest_framework.response import Response
-from rest_framework.generics import ListAPIView
+from rest_framework.generics import GenericAPIView, ListAPIView
 
-from ..mixins import ApplicationMixin
+from .. import signals
+from ..blobs import (add_references, create_blob, get_blob_key, get_blobs,
+    get_digest, store_blob)
+from ..mixins import ApplicationMixin, ConditionalGetMixin
 from ..models import Resident, Source, UploadedDocument
 from ..serializers import UploadedDocumentSerializer
+from ..signed_urls import SIGNED_URL_REUSE_PERIOD
 
 #pylint:disable=no-name-in-module,import-error
 from django.utils.six.moves.urllib.parse import urlparse, urlunparse
@@ -21,8 +29,82 @@ from django.utils.six.moves.urllib.parse import urlparse, urlunparse
 
 LOGGER = logging.getLogger(__name__)
 
+# Document URLs in responses are signed and expire. They are valid for
+# at least ``SIGNED_URL_REUSE_PERIOD`` seconds when handed out. The ETag
+# changes as often, so clients never revalidate a copy with expired URLs.
+SIGNED_URL_ETAG_PERIOD = SIGNED_URL_REUSE_PERIOD
 
-class DocumentUploadView(ApplicationMixin, ListAPIView):
+BULK_UPLOAD_MAX_FILES = getattr(settings, 'BULK_UPLOAD_MAX_FILES', 500)
+# Maximum total size (in bytes) of extracted files in a bulk upload.
+BULK_UPLOAD_MAX_SIZE = getattr(
+    settings, 'BULK_UPLOAD_MAX_SIZE', 500 * 1024 * 1024)
+BULK_UPLOAD_WORKERS = getattr(settings, 'BULK_UPLOAD_WORKERS', 4)
+
+
+def get_extension(filename):
+    # tentatively extract file extension.
+    parts = os.path.splitext(force_text(filename.replace('\\', '/')))
+    return parts[-1].lower() if len(parts) > 1 else ""
+
+
+def get_document_url(location):
+    # Signed URLs are stored without their query string.
+    parts = urlparse(location)
+    return urlunparse((parts.scheme, parts.netloc, parts.path, "", "", ""))
+
+
+class BulkUploadError(ValueError):
+    pass
+
+
+def iter_uploaded_files(uploaded_files):
+    """
+    Yields (name, content) for each file in *uploaded_files*. Entries
+    of ZIP archives are extracted one at a time.
+    """
+    nb_files = 0
+    total_size = 0
+    for uploaded_file in uploaded_files:
+        if zipfile.is_zipfile(uploaded_file):
+            uploaded_file.seek(0)
+            archive = zipfile.ZipFile(uploaded_file)
+            entries = [(info.filename, info)
+                for info in archive.infolist()
+                if not (info.filename.endswith('/')
+                    or info.filename.startswith('__MACOSX/')
+                    or posixpath.basename(info.filename).startswith('.'))]
+        else:
+            uploaded_file.seek(0)
+            archive = None
+            entries = [(uploaded_file.name, None)]
+        for name, info in entries:
+            nb_files += 1
+            total_size += info.file_size if info else uploaded_file.size
+            if nb_files > BULK_UPLOAD_MAX_FILES:
+                raise BulkUploadError("more than %d files in upload."
+                    % BULK_UPLOAD_MAX_FILES)
+            if total_size > BULK_UPLOAD_MAX_SIZE:
+                raise BulkUploadError("more than %d bytes in upload."
+                    % BULK_UPLOAD_MAX_SIZE)
+            yield (force_text(name),
+                archive.read(info) if info else uploaded_file.read())
+
+
+def _hash_content(content):
+    # hashlib releases the GIL on large buffers, so hashes are computed
+    # in parallel by the threads of the pool.
+    return get_digest(content)
+
+
+def _store_content(key_name_content):
+    key_name, content = key_name_content
+    # Keys are content-addressed, so an existing key has the same content.
+    if default_storage.exists(key_name):
+        return key_name
+    return default_storage.save(key_name, ContentFile(content))
+
+
+class DocumentUploadView(ConditionalGetMixin, ApplicationMixin, ListAPIView):
 
     parser_classes = (parsers.FormParser, parsers.MultiPartParser,
         parsers.JSONParser)
@@ -32,6 +114,26 @@ class DocumentUploadView(ApplicationMixin, ListAPIView):
     def get_queryset(self):
         return UploadedDocument.objects.filter(application=self.application)
 
+    def get_etag_key(self):
+        # Uploads and deletes touch ``application.updated_at``
+        # (see ``tcapp.signals``).
+        return '%s|%s|%s|%d' % (self.request.path,
+            self.request.META.get('HTTP_ACCEPT', ''),
+            self.application.updated_at.isoformat(),
+            int(time.time()) // SIGNED_URL_ETAG_PERIOD)
+
+    def get_last_modified(self):
+        # A ``Last-Modified`` validator would let clients keep a copy
+        # with expired URLs.
+        return None
+
+    def get(self, request, *args, **kwargs):
+        not_modified = self.get_not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+        return self.set_validators(super(DocumentUploadView, self).get(
+            request, *args, **kwargs))
+
     def post(self, request, *args, **kwargs):
         #pylint:disable=too-many-locals,too-many-statements
         try:
@@ -84,8 +186,9 @@ class DocumentUploadView(ApplicationMixin, ListAPIView):
                 LOGGER.warning("re-computed url (%s) != location (%s)",
                 s3_storage.url(name), location)
             with s3_storage.open(name) as uploaded_file:
-                key_name = "%s/%s%s" % (self.application.slug,
-                    hashlib.sha256(uploaded_file.read()).hexdigest(), ext)
+                content = uploaded_file.read()
+            digest = get_digest(content)
+            blob = get_blobs([digest]).get(digest)
             kwargs = {}
             if 'access_key' in self.request.session:
                 kwargs['aws_access_key_id'] = self.request.session['access_key']
@@ -98,30 +201,171 @@ class DocumentUploadView(ApplicationMixin, ListAPIView):
             conn = boto.connect_s3(**kwargs)
             bucket = conn.get_bucket(bucket_name)
             key = bucket.get_key(name)
-            key.copy(bucket_name, key_name,
-                metadata=metadata, preserve_acl=True, encrypt_key=True)
+            if blob is None:
+                key_name = get_blob_key(digest, ext)
+                key.copy(bucket_name, key_name,
+                    metadata=metadata, preserve_acl=True, encrypt_key=True)
+                blob = create_blob(digest, key_name, len(content), name)
+            # Otherwise the same content was uploaded before and
+            # the new upload is discarded.
             bucket.delete_key(key)
-            location = s3_storage.url(key_name)
+            location = s3_storage.url(blob.storage_key)
 
         elif 'file' in request.FILES:
             uploaded_file = request.FILES['file']
-            # tentatively extract file extension.
-            parts = os.path.splitext(
-                force_text(uploaded_file.name.replace('\\', '/')))
-            ext = parts[-1].lower() if len(parts) > 1 else ""
-            key_name = "%s/%s%s" % (self.application.slug,
-                hashlib.sha256(uploaded_file.read()).hexdigest(), ext)
-            location = self.request.build_absolute_uri(default_storage.url(
-                default_storage.save(key_name, uploaded_file)))
+            blob = store_blob(uploaded_file.read(), uploaded_file.name,
+                get_extension(uploaded_file.name))
+            location = self.request.build_absolute_uri(
+                default_storage.url(blob.storage_key))
 
         else:
             return Response({'details': "no location or file specified."},
                 status=status.HTTP_400_BAD_REQUEST)
 
-        parts = urlparse(location)
         UploadedDocument.objects.get_or_create(application=self.application,
-            url=urlunparse((parts.scheme, parts.netloc, parts.path,
-            "", "", "")), defaults={'category': category, 'resident': tenant,
-            'source': source})
+            url=get_document_url(location), defaults={'category': category,
+            'resident': tenant, 'source': source, 'blob': blob})
         return Response({'location': location}, status=status.HTTP_201_CREATED)
 
+
+class BulkDocumentUploadView(ApplicationMixin, GenericAPIView):
+    """
+    Uploads many supporting documents in a single request.
+
+    The request is a multipart payload of files in ``file``, each one
+    either a document or a ZIP archive of documents. ``categories``
+    (optional) is a JSON object with the category of documents keyed
+    by file name; other documents are filed under ``category``.
+    Documents already attached to the application are skipped.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        POST /api/properties/main-street/applications/ea709e62/upload/bulk/
+
+        file=certification.zip
+        categories={"paystubs/march.pdf": 1, "tic.pdf": 16}
+
+    **Example response**:
+
+    .. sourcecode:: json
+
+        {
+          "nb_created": 2,
+          "documents": [{
+            "name": "paystubs/march.pdf",
+            "location": "https://...",
+            "category": 1,
+            "duplicate": false
+          }, ...]
+        }
+    """
+    parser_classes = (parsers.MultiPartParser, parsers.FormParser)
+
+    @staticmethod
+    def _get_category(value, default=UploadedDocument.OTHER):
+        try:
+            category = int(value)
+        except (TypeError, ValueError):
+            return default
+        if category not in dict(UploadedDocument.CATEGORY):
+            return default
+        return category
+
+    def get_categories(self):
+        default = self._get_category(self.request.data.get('category'))
+        try:
+            categories = json.loads(self.request.data.get('categories', '{}'))
+        except ValueError:
+            categories = {}
+        if not isinstance(categories, dict):
+            categories = {}
+        return default, {force_text(name): self._get_category(
+            category, default=default)
+            for name, category in categories.items()}
+
+    def post(self, request, *args, **kwargs):
+        #pylint:disable=too-many-locals,unused-argument
+        uploaded_files = request.FILES.getlist('file')
+        if not uploaded_files:
+            return Response({'details': "no file specified."},
+                status=status.HTTP_400_BAD_REQUEST)
+        tenant = request.data.get('tenant', None)
+        if tenant:
+            tenant = get_object_or_404(Resident, slug=tenant)
+        default_category, categories = self.get_categories()
+
+        # Files are read a batch at a time such that at most a few files
+        # are held in memory while the pool hashes and stores them.
+        documents = []
+        blobs = {}
+        pool = ThreadPool(BULK_UPLOAD_WORKERS)
+        try:
+            batch = []
+            for name, content in iter_uploaded_files(uploaded_files):
+                batch += [(name, content)]
+                if len(batch) >= 2 * BULK_UPLOAD_WORKERS:
+                    self._store_batch(pool, batch, documents, blobs)
+                    batch = []
+            if batch:
+                self._store_batch(pool, batch, documents, blobs)
+        except (BulkUploadError, zipfile.BadZipfile) as err:
+            return Response({'details': str(err)},
+                status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            pool.close()
+            pool.join()
+
+        existing_urls = set(UploadedDocument.objects.filter(
+            application=self.application).values_list('url', flat=True))
+        new_documents = []
+        results = []
+        references = {}
+        for name, digest in documents:
+            blob = blobs[digest]
+            location = self.request.build_absolute_uri(
+                default_storage.url(blob.storage_key))
+            url = get_document_url(location)
+            # Content already attached to the application, possibly
+            # earlier in the same upload.
+            duplicate = url in existing_urls
+            category = categories.get(name, default_category)
+            if not duplicate:
+                existing_urls.add(url)
+                new_documents += [UploadedDocument(
+                    application=self.application, resident=tenant, url=url,
+                    title=posixpath.basename(name)[:253], category=category,
+                    blob=blob)]
+                references[blob.pk] = references.get(blob.pk, 0) + 1
+            results += [{'name': name, 'location': location,
+                'category': category, 'duplicate': duplicate}]
+        with transaction.atomic():
+            UploadedDocument.objects.bulk_create(new_documents)
+            # ``bulk_create`` does not send ``post_save`` signals.
+            add_references(references)
+            signals.schedule_application_touches([self.application.pk])
+        return Response({'nb_created': len(new_documents),
+            'documents': results}, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def _store_batch(pool, batch, documents, blobs):
+        """
+        Hashes the files in *batch*, then stores, in parallel, the ones
+        whose content was never uploaded before.
+        """
+        digests = pool.map(_hash_content, [content for _, content in batch])
+        blobs.update(get_blobs([digest for digest in digests
+            if digest not in blobs]))
+        to_store = {}
+        for (name, content), digest in zip(batch, digests):
+            if digest not in blobs and digest not in to_store:
+                to_store[digest] = (name, content)
+            documents += [(name, digest)]
+        to_store = list(to_store.items())
+        stored = pool.map(_store_content, [
+            (get_blob_key(digest, get_extension(name)), content)
+            for digest, (name, content) in to_store])
+        for (digest, (name, content)), storage_key in zip(to_store, stored):
+            blobs[digest] = create_blob(
+                digest, storage_key, len(content), name)
@@ -0,0 +1,175 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+
+import logging
+
+from django.shortcuts import get_object_or_404
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+
+from ..eligibility import (annual_income_of_sources, application_household,
+    get_limits_table, get_restrictions, simulate)
+from ..mixins import PropertyMixin
+from ..models import Application
+from ..serializers import SourceSerializer
+from ..utils import datetime_or_now
+
+#pylint:disable=old-style-class
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_SCENARIOS = 100
+
+
+class ScenarioSerializer(serializers.Serializer):
+
+    income_restriction = serializers.IntegerField(
+        min_value=1, max_value=100, required=False)
+    rent_restriction = serializers.IntegerField(
+        min_value=1, max_value=100, required=False)
+    family_size_delta = serializers.IntegerField(required=False)
+    annual_income_delta = serializers.IntegerField(required=False)
+
+    def create(self, validated_data):
+        pass
+
+    def update(self, instance, validated_data):
+        pass
+
+
+class SimulationSerializer(serializers.Serializer):
+
+    application = serializers.SlugField(required=False)
+    family_size = serializers.IntegerField(min_value=1, required=False)
+    annual_income = serializers.IntegerField(min_value=0, required=False)
+    sources = SourceSerializer(many=True, required=False)
+    nb_bedrooms = serializers.IntegerField(min_value=0, required=False)
+    effective_date = serializers.DateTimeField(required=False)
+    scenarios = ScenarioSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('application') and 'family_size' not in attrs:
+            raise ValidationError({'family_size': [
+                "This field is required when no application is specified."]})
+        if len(attrs.get('scenarios', [])) > MAX_SCENARIOS:
+            raise ValidationError({'scenarios': [
+                "At most %d scenarios can be simulated at once."
+                % MAX_SCENARIOS]})
+        return attrs
+
+    def create(self, validated_data):
+        pass
+
+    def update(self, instance, validated_data):
+        pass
+
+
+class EligibilitySimulationAPIView(PropertyMixin, GenericAPIView):
+    """
+    Simulates the eligibility of a household under various scenarios,
+    without modifying any record.
+
+    The household is either an existing ``application`` (its household
+    size, annual income, number of bedrooms and restrictions as last
+    computed) or described by ``family_size``, ``nb_bedrooms``
+    and either ``annual_income`` (in cents) or income ``sources``
+    (as in the application API). Fields passed along with an
+    ``application`` override those of the application.
+
+    Each scenario can override the ``income_restriction`` and
+    ``rent_restriction`` (AMI percentages), and add ``family_size_delta``
+    members and ``annual_income_delta`` cents to the household.
+    When no scenarios are passed, the household is evaluated at each
+    AMI percentage of the property units.
+
+    Limits are the latest published before ``effective_date``
+    (the application effective date or now by default).
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        POST /api/properties/:project/simulate/
+
+        {
+            "application": "ea709e622c8e40a6869b492c078b2b5f",
+            "scenarios": [
+                {"income_restriction": 50},
+                {"income_restriction": 60},
+                {"income_restriction": 60, "family_size_delta": 1},
+                {"income_restriction": 60, "annual_income_delta": 500000}
+            ]
+        }
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+        {
+            "family_size": 3,
+            "annual_income": 4200000,
+            "nb_bedrooms": 2,
+            "effective_date": "2018-03-01T00:00:00Z",
+            "results": [{
+                "family_size": 3,
+                "annual_income": 4200000,
+                "income_restriction": 50,
+                "income_limit_100": 8810000,
+                "income_limit": 4405000,
+                "income_limit_140": 6167000,
+                "is_eligible": true,
+                "is_eligible_140": true,
+                "nb_bedrooms": 2,
+                "rent_restriction": 50,
+                "rent_limit": 110100
+            },
+            ...
+            ]
+        }
+    """
+    serializer_class = SimulationSerializer
+
+    def get_household(self, validated_data):
+        household = {'nb_bedrooms': None, 'rent_restriction': None}
+        at_time = None
+        application_slug = validated_data.get('application')
+        if application_slug:
+            application = get_object_or_404(Application.objects.only(
+                'effective_date', 'household_size', 'annual_income',
+                'nb_bedrooms', 'federal_income_restriction',
+                'federal_rent_restriction'),
+                slug=application_slug, lihtc_property=self.project)
+            household.update(application_household(application))
+            at_time = application.effective_date
+        for field_name in ('family_size', 'annual_income', 'nb_bedrooms'):
+            if field_name in validated_data:
+                household[field_name] = validated_data[field_name]
+        if 'sources' in validated_data:
+            try:
+                household['annual_income'] = annual_income_of_sources(
+                    validated_data['sources'])
+            except ValueError as err:
+                raise ValidationError({'sources': [str(err)]})
+        household.setdefault('annual_income', 0)
+        return household, datetime_or_now(
+            validated_data.get('effective_date', at_time))
+
+    def post(self, request, *args, **kwargs):
+        #pylint:disable=unused-argument
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        household, at_time = self.get_household(serializer.validated_data)
+        scenarios = serializer.validated_data.get('scenarios')
+        if not scenarios:
+            scenarios = [{'income_restriction': restriction}
+                for restriction in get_restrictions(self.project)]
+        results = simulate(get_limits_table(self.project.county),
+            household, scenarios, at_time=at_time)
+        return Response({
+            'family_size': household['family_size'],
+            'annual_income': household['annual_income'],
+            'nb_bedrooms': household['nb_bedrooms'],
+            'effective_date': at_time,
+            'results': results})
@@ -4,7 +4,6 @@
 import logging
 
 from django.conf import settings as django_settings
-from extended_templates.backends import get_email_backend
 from rest_framework import serializers
 from rest_framework.generics import CreateAPIView
 
@@ -33,6 +32,7 @@ class RequestDemoAPIView(PropertyMixin, CreateAPIView):
     serializer_class = RequestDemoSerializer
 
     def perform_create(self, serializer):
+        from extended_templates.backends import get_email_backend
         get_email_backend().send(
             recipients=[admin[1] for admin in django_settings.ADMINS],
             reply_to=serializer.validated_data['email'],
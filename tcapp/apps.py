@@ -0,0 +1,14 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+
+from django.apps import AppConfig
+
+
+class TcappConfig(AppConfig):
+
+    name = 'tcapp'
+
+    def ready(self):
+        # Connects the receivers that keep denormalized fields up-to-date
+        # regardless of the entry point (views, API, management commands).
+        from . import signals #pylint:disable=unused-variable
@@ -8,6 +8,11 @@ from django.conf import settings
 
 #pylint: disable=invalid-name
 
+# Output filenames embed a hash of the bundle content (``%(version)s``,
+# see ``ASSETS_VERSIONS``) so they can be cached by browsers forever.
+# The ``compress_assets`` command then writes gzip (and brotli) variants
+# next to each output, served by ``tcapp.views.static.serve``.
+
 # All the CSS we need for the entire app. This tradeoff between
 # bandwidth and latency is good as long as we have a high and consistent
 # utilization of all the CSS tags for all pages on the site.
@@ -15,16 +20,16 @@ css_base = Bundle(
     Bundle(
         os.path.join(settings.BASE_DIR,
             'assets/less/base/tcapp-bootstrap.less'),
-        filters='less', output='cache/bootstrap.css',
+        filters='less', output='cache/bootstrap.%(version)s.css',
         debug=False),
         'vendor/font-awesome.css',
-    filters='cssmin', output='cache/teacapp.css')
+    filters='cssmin', output='cache/teacapp.%(version)s.css')
 register('css_base', css_base)
 
 css_email = Bundle(
     os.path.join(settings.BASE_DIR, 'assets/less/email/email.less'),
     filters=['less', 'cssmin'],
-    output='cache/email.css', debug=False)
+    output='cache/email.%(version)s.css', debug=False)
 register('css_email', css_email)
 
 
@@ -32,14 +37,14 @@ register('css_email', css_email)
 js_base = Bundle(
     'vendor/jquery.js',
     'vendor/bootstrap.js',
-    filters='yui_js', output='cache/base.js')
+    filters='yui_js', output='cache/base.%(version)s.js')
 register('js_base', js_base)
 
 js_angular = Bundle(
     'vendor/moment.js',
     'vendor/angular.min.js', # XXX pre-minified or runs into errors
     'vendor/ui-bootstrap-tpls.js',
-    filters='jsmin', output='cache/angular.js')
+    filters='jsmin', output='cache/angular.%(version)s.js')
 register('js_angular', js_angular)
 
 # Application javascript
@@ -49,5 +54,5 @@ js_tcapp = Bundle(
     'vendor/dropzone.js', # XXX After djaodjin-postal.js or error
     'js/djaodjin-upload.js',
     'js/tcapp.js',
-    filters='rjsmin', output='cache/tcapp.js')
+    filters='rjsmin', output='cache/tcapp.%(version)s.js')
 register('js_tcapp', js_tcapp)
@@ -0,0 +1,369 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Benchmarks of the annualization and eligibility hot paths.
+
+Micro-benchmarks time the pure functions in ``tcapp.models`` on in-memory
+``Income`` records. Macro-benchmarks time model properties and views
+against an application in the database (ex: generated through
+the ``generate_synthetic_data`` command) and record the number of SQL
+queries they issue.
+
+Benchmarks are run through the ``benchmark`` management command, which
+writes results as JSON so they can be compared across commits.
+"""
+from __future__ import unicode_literals
+
+import datetime, logging, platform, subprocess
+from collections import OrderedDict
+from timeit import default_timer
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.urlresolvers import resolve, reverse
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import six
+from django.utils.timezone import utc
+
+from .models import (Application, Income, Resident,
+    annualize_income_employer, annualize_income_period_to_date,
+    annualize_income_tax_return, annualize_income_year_to_date,
+    greater_of_annualize_income, sum_greater_of_annualize_income)
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+MICRO = 'micro'
+MACRO = 'macro'
+
+# Registered benchmarks: name -> (kind, setup).
+# A setup function takes a ``BenchmarkContext`` and returns the callable
+# to time, or `None` when the benchmark cannot run in that context.
+BENCHMARKS = OrderedDict()
+
+
+def register(name, kind=MICRO):
+    def decorator(setup):
+        BENCHMARKS[name] = (kind, setup)
+        return setup
+    return decorator
+
+
+class BenchmarkContext(object):
+    """
+    Records shared by all benchmarks in a run.
+    """
+
+    def __init__(self, application=None, nb_sources=4):
+        self.nb_sources = nb_sources
+        self.application = application
+        self._verif_by_sources = None
+
+    @property
+    def verif_by_sources(self):
+        """
+        In-memory incomes, ``{source: {verified: [Income, ...]}}``, covering
+        every verification method and income period.
+        """
+        if self._verif_by_sources is None:
+            self._verif_by_sources = make_verif_by_sources(self.nb_sources)
+        return self._verif_by_sources
+
+    def incomes(self, verified):
+        results = []
+        for verifications in six.itervalues(self.verif_by_sources):
+            results += verifications.get(verified, [])
+        return results
+
+
+def make_verif_by_sources(nb_sources):
+    """
+    Returns in-memory incomes for *nb_sources* sources, all verification
+    methods and income periods, as used by
+    ``sum_greater_of_annualize_income``.
+    """
+    ends_at = datetime_or_now().replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    verif_by_sources = OrderedDict()
+    for source in range(0, nb_sources):
+        verifications = {}
+        amount = 4500000 + source * 100000
+        # Employer and tenant direct calculations, one income per period.
+        for verified in Income.DIRECT_CALCULATION:
+            verifications[verified] = [
+                Income(verified=verified, period=Income.HOURLY,
+                    amount=amount // 2080, period_per_avg=4000,
+                    avg=Income.WEEKLY, avg_per_year=5200),
+                Income(verified=verified, period=Income.WEEKLY,
+                    amount=amount // 52, avg=Income.WEEKLY),
+                Income(verified=verified, period=Income.MONTHLY,
+                    amount=amount // 12),
+                Income(verified=verified, period=Income.OTHER,
+                    amount=amount // 12, ends_at=ends_at,
+                    starts_at=ends_at - datetime.timedelta(days=30))]
+        # Pay-stubs
+        verifications[Income.VERIFIED_YEAR_TO_DATE] = [
+            Income(verified=Income.VERIFIED_YEAR_TO_DATE,
+                period=Income.OTHER, category=Income.REGULAR,
+                amount=amount * month // 12,
+                starts_at=ends_at.replace(month=1, day=1),
+                ends_at=ends_at.replace(month=1, day=1)
+                    + datetime.timedelta(days=30 * month))
+            for month in range(1, 4)]
+        verifications[Income.VERIFIED_PERIOD_TO_DATE] = [
+            Income(verified=Income.VERIFIED_PERIOD_TO_DATE,
+                period=Income.OTHER, category=category,
+                amount=amount // 24, ends_at=ends_at - datetime.timedelta(
+                    days=15 * idx),
+                starts_at=ends_at - datetime.timedelta(days=15 * idx + 14))
+            for idx in range(0, 6)
+            for category in (Income.REGULAR, Income.OVERTIME)]
+        verifications[Income.VERIFIED_TAX_RETURN] = [
+            Income(verified=Income.VERIFIED_TAX_RETURN,
+                period=Income.YEARLY, amount=amount)]
+        verif_by_sources[source] = verifications
+    return verif_by_sources
+
+
+@register('annualize_income_employer')
+def bench_annualize_income_employer(context):
+    incomes = context.incomes(Income.VERIFIED_EMPLOYER)
+    return lambda: annualize_income_employer(incomes)
+
+
+@register('annualize_income_year_to_date')
+def bench_annualize_income_year_to_date(context):
+    incomes = context.incomes(Income.VERIFIED_YEAR_TO_DATE)
+    return lambda: annualize_income_year_to_date(incomes)
+
+
+@register('annualize_income_period_to_date')
+def bench_annualize_income_period_to_date(context):
+    incomes = context.incomes(Income.VERIFIED_PERIOD_TO_DATE)
+    return lambda: annualize_income_period_to_date(incomes)
+
+
+@register('annualize_income_tax_return')
+def bench_annualize_income_tax_return(context):
+    incomes = context.incomes(Income.VERIFIED_TAX_RETURN)
+    return lambda: annualize_income_tax_return(incomes)
+
+
+@register('greater_of_annualize_income')
+def bench_greater_of_annualize_income(context):
+    verifications = next(six.itervalues(context.verif_by_sources))
+    return lambda: greater_of_annualize_income(verifications)
+
+
+@register('sum_greater_of_annualize_income')
+def bench_sum_greater_of_annualize_income(context):
+    verif_by_sources = context.verif_by_sources
+    return lambda: sum_greater_of_annualize_income(verif_by_sources)
+
+
+@register('Resident.total_income', kind=MACRO)
+def bench_resident_total_income(context):
+    if context.application is None:
+        return None
+    residents = list(Resident.objects.filter(
+        applications=context.application))
+    def run():
+        for resident in residents:
+            resident.total_income #pylint:disable=pointless-statement
+    return run
+
+
+@register('Application.total_annual_income', kind=MACRO)
+def bench_application_total_annual_income(context):
+    if context.application is None:
+        return None
+    return lambda: context.application.total_annual_income
+
+
+def make_manager_request(path, lihtc_property):
+    """
+    Returns a GET request on *path* made by a manager of *lihtc_property*
+    with a current subscription.
+    """
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    request.session = {'roles': {'manager': [{
+        'slug': lihtc_property.slug,
+        'subscriptions': [{'ends_at': datetime.datetime(
+            year=datetime.MAXYEAR, month=1, day=1, tzinfo=utc).isoformat()}]
+    }]}}
+    return request
+
+
+def view_runner(url_name, args, lihtc_property):
+    """
+    Returns a callable that renders the view at *url_name* for a manager
+    of *lihtc_property*.
+    """
+    path = reverse(url_name, args=args)
+    match = resolve(path)
+    def run():
+        response = match.func(make_manager_request(path, lihtc_property),
+            *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    run.path = path
+    return run
+
+
+def _adult_resident(application):
+    return application.applicants.filter(date_of_birth__lte=(
+        datetime_or_now() - datetime.timedelta(days=18 * 366))).first()
+
+
+@register('view:application_checklist', kind=MACRO)
+def bench_application_checklist(context):
+    if context.application is None:
+        return None
+    return view_runner('application_checklist', (
+        context.application.lihtc_property, context.application),
+        context.application.lihtc_property)
+
+
+@register('view:verification_tic', kind=MACRO)
+def bench_verification_tic(context):
+    if context.application is None:
+        return None
+    return view_runner('verification_tic', (
+        context.application.lihtc_property, context.application),
+        context.application.lihtc_property)
+
+
+@register('view:tenant_verification_ticq', kind=MACRO)
+def bench_tenant_verification_ticq(context):
+    resident = (_adult_resident(context.application)
+        if context.application is not None else None)
+    if resident is None:
+        return None
+    return view_runner('tenant_verification_ticq', (
+        context.application.lihtc_property, context.application, resident),
+        context.application.lihtc_property)
+
+
+@register('view:tenant_verification_under_5000_assets', kind=MACRO)
+def bench_under_5000_assets(context):
+    resident = (_adult_resident(context.application)
+        if context.application is not None else None)
+    if resident is None:
+        return None
+    return view_runner('tenant_verification_under_5000_assets', (
+        context.application.lihtc_property, resident),
+        context.application.lihtc_property)
+
+
+@register('view:income_report', kind=MACRO)
+def bench_income_report(context):
+    if context.application is None:
+        return None
+    return view_runner('income_report', (
+        context.application.lihtc_property,),
+        context.application.lihtc_property)
+
+
+def measure(func, repeat=5, number=1):
+    """
+    Calls *func* *number* times in a row, *repeat* times, and returns
+    the time per call (in seconds) along with the number of SQL queries
+    issued per call.
+    """
+    timings = []
+    nb_queries = 0
+    for _ in range(0, repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = default_timer()
+            for _ in range(0, number):
+                func()
+            timings += [(default_timer() - start) / number]
+        nb_queries = len(queries) // number
+    timings.sort()
+    return OrderedDict([
+        ('repeat', repeat),
+        ('number', number),
+        ('min', timings[0]),
+        ('median', timings[len(timings) // 2]),
+        ('mean', sum(timings) / len(timings)),
+        ('nb_queries', nb_queries)])
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR, stderr=subprocess.STDOUT).decode(
+            'utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(application=None, names=None, kinds=None,
+                   repeat=5, number=None):
+    """
+    Runs the registered benchmarks matching *names* and *kinds*
+    and returns the results as a JSON-serializable dictionnary.
+    """
+    #pylint:disable=too-many-arguments
+    context = BenchmarkContext(application=application)
+    results = []
+    for name, (kind, setup) in six.iteritems(BENCHMARKS):
+        if kinds and kind not in kinds:
+            continue
+        if names and not any([pattern in name for pattern in names]):
+            continue
+        func = setup(context)
+        if func is None:
+            LOGGER.info("skipping %s (no application)", name)
+            continue
+        if number is None:
+            nb_calls = 1000 if kind == MICRO else 1
+        else:
+            nb_calls = number
+        func() # warm up
+        result = OrderedDict([('name', name), ('kind', kind)])
+        result.update(measure(func, repeat=repeat, number=nb_calls))
+        results += [result]
+    return OrderedDict([
+        ('commit', get_commit()),
+        ('created_at', datetime_or_now().isoformat()),
+        ('python', platform.python_version()),
+        ('database', connection.vendor),
+        ('application', application.slug if application else None),
+        ('results', results)])
+
+
+def compare_results(previous, current, threshold=0.1):
+    """
+    Returns a list of (name, previous median, current median, ratio,
+    previous nb_queries, current nb_queries, is_regression) for benchmarks
+    present in both *previous* and *current* results.
+    """
+    by_names = {result['name']: result for result in previous['results']}
+    comparison = []
+    for result in current['results']:
+        before = by_names.get(result['name'])
+        if before is None:
+            continue
+        ratio = (result['median'] / before['median']
+            if before['median'] else 1.0)
+        comparison += [(result['name'], before['median'], result['median'],
+            ratio, before['nb_queries'], result['nb_queries'],
+            (ratio > 1 + threshold
+             or result['nb_queries'] > before['nb_queries']))]
+    return comparison
+
+
+def get_largest_application():
+    """
+    Returns the application with the largest household, the most
+    expensive one to compute, or `None` if there are no applications.
+    """
+    return Application.objects.select_related(
+        'lihtc_property__county').order_by(
+        '-household_size', '-annual_income').first()
@@ -0,0 +1,143 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Content-addressed storage of uploaded documents.
+
+The content of a document is stored once, under ``blobs/<sha256><ext>``,
+and recorded as a ``DocumentBlob``. Uploading the same content again,
+to the same or another application, only creates an ``UploadedDocument``
+row pointing to the existing blob.
+
+``DocumentBlob.refcount`` is kept up-to-date by signals when documents
+are created or deleted one at a time, and through ``add_references``
+after a ``bulk_create``. Storage of unreferenced blobs is reclaimed
+by the ``collect_blobs`` command rather than inline.
+
+An upload can pick an existing blob whose refcount is still zero,
+then insert the document that references it a moment later.
+``get_blobs`` bumps ``last_used_at`` before it reads the blobs, and
+``collect_blobs`` only deletes blobs unused for ``BLOB_GRACE_PERIOD``.
+If the collector deletes a blob before the bump, the upload does not
+find it and stores the content anew. Otherwise the blob is protected
+until the document is inserted, provided that takes less than the
+grace period.
+"""
+from __future__ import unicode_literals
+
+import datetime, hashlib, logging, mimetypes
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import six
+
+from .models import DocumentBlob
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+BLOB_KEY_PREFIX = 'blobs'
+
+# Time an unreferenced blob is kept after it was last used.
+BLOB_GRACE_PERIOD = datetime.timedelta(
+    seconds=getattr(settings, 'BLOB_GRACE_PERIOD', 3600))
+
+
+def get_digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_blob_key(digest, ext):
+    return "%s/%s%s" % (BLOB_KEY_PREFIX, digest, ext)
+
+
+def get_blobs(digests):
+    """
+    Returns the blobs already stored for *digests*, keyed by digest.
+
+    The blobs are marked as used first, so ``collect_blobs`` does not
+    delete them before the caller references them.
+    """
+    queryset = DocumentBlob.objects.filter(sha256__in=set(digests))
+    queryset.update(last_used_at=datetime_or_now())
+    return {blob.sha256: blob for blob in queryset}
+
+
+def create_blob(digest, storage_key, size, name):
+    """
+    Records the blob stored at *storage_key*. If a concurrent upload
+    recorded the same content first, its blob is returned.
+    """
+    content_type, _ = mimetypes.guess_type(name)
+    try:
+        with transaction.atomic():
+            return DocumentBlob.objects.create(sha256=digest,
+                storage_key=storage_key, size=size,
+                content_type=content_type or '')
+    except IntegrityError:
+        return DocumentBlob.objects.get(sha256=digest)
+
+
+def store_blob(content, name, ext, digest=None):
+    """
+    Returns the blob for *content*, writing *content* to storage only
+    if it was never uploaded before.
+    """
+    if digest is None:
+        digest = get_digest(content)
+    blob = get_blobs([digest]).get(digest)
+    if blob is None:
+        storage_key = get_blob_key(digest, ext)
+        saved_key = None
+        if not default_storage.exists(storage_key):
+            storage_key = saved_key = default_storage.save(
+                storage_key, ContentFile(content))
+        blob = create_blob(digest, storage_key, len(content), name)
+        if saved_key and saved_key != blob.storage_key:
+            # A concurrent upload recorded the same content first under
+            # another key (ex: the storage suffixed ours). No row refers
+            # to our copy so `collect_blobs` would never reclaim it.
+            default_storage.delete(saved_key)
+    return blob
+
+
+def add_references(counts):
+    """
+    Adds *counts* (``{blob_id: delta}``) to the refcount of blobs.
+    """
+    for blob_id, delta in six.iteritems(counts):
+        if blob_id and delta:
+            DocumentBlob.objects.filter(pk=blob_id).update(
+                refcount=F('refcount') + delta,
+                last_used_at=datetime_or_now())
+
+
+def collect_blobs(dry_run=False):
+    """
+    Deletes blobs unreferenced and unused for ``BLOB_GRACE_PERIOD``
+    from storage and returns the number of blobs and bytes reclaimed.
+    """
+    nb_blobs = 0
+    nb_bytes = 0
+    used_before = datetime_or_now() - BLOB_GRACE_PERIOD
+    for blob in DocumentBlob.objects.filter(refcount=0,
+            last_used_at__lt=used_before).iterator():
+        if not dry_run:
+            # The row is only deleted if the blob is still unreferenced
+            # and was not picked by an upload in the meantime.
+            nb_deleted, _ = DocumentBlob.objects.filter(pk=blob.pk,
+                refcount=0, last_used_at__lt=used_before,
+                documents__isnull=True).delete()
+            if not nb_deleted:
+                continue
+            try:
+                default_storage.delete(blob.storage_key)
+            except (IOError, OSError) as err:
+                LOGGER.warning("cannot delete blob %s at %s: %s",
+                    blob, blob.storage_key, err)
+        nb_blobs += 1
+        nb_bytes += blob.size
+    return nb_blobs, nb_bytes
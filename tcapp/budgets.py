@@ -0,0 +1,127 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Maximum number of SQL queries a view is allowed to issue.
+
+A view declares its budget through a ``query_budget`` class attribute
+and ``QueryBudgetMixin`` as its first base class. The budget scales
+with the size of the data rendered (number of residents in the household,
+number of applications in a report), such that an N+1 query pattern
+shows up as a budget overrun.
+
+Queries are counted on every database connection, such that views
+routed to the read-only replica (see ``tcapp.routers``) are checked
+as well.
+
+When ``settings.QUERY_BUDGET_CHECK`` is `True` (defaults to ``DEBUG``),
+requests exceeding their budget are logged, or raise ``QueryBudgetExceeded``
+when ``settings.QUERY_BUDGET_STRICT`` is `True`. The ``check_query_budgets``
+command renders every budgeted view against the applications in the
+database and reports the views whose budget or scaling is exceeded.
+"""
+from __future__ import unicode_literals
+
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+LOGGER = logging.getLogger(__name__)
+
+QUERY_BUDGET_CHECK = getattr(settings, 'QUERY_BUDGET_CHECK', settings.DEBUG)
+QUERY_BUDGET_STRICT = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class CaptureAllQueries(object):
+    """
+    Captures the queries executed on all database connections
+    (see ``django.test.utils.CaptureQueriesContext``).
+    """
+
+    def __init__(self):
+        self.contexts = [CaptureQueriesContext(conn)
+            for conn in connections.all()]
+
+    def __enter__(self):
+        for context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for context in reversed(self.contexts):
+            context.__exit__(exc_type, exc_value, traceback)
+
+    def __len__(self):
+        return sum([len(context) for context in self.contexts])
+
+    @property
+    def captured_queries(self):
+        results = []
+        for context in self.contexts:
+            results += context.captured_queries
+        return results
+
+
+class QueryBudget(object):
+    """
+    At most ``base`` queries, plus ``per_resident`` queries per resident
+    and ``per_application`` queries per application rendered.
+    """
+
+    def __init__(self, base, per_resident=0, per_application=0):
+        self.base = base
+        self.per_resident = per_resident
+        self.per_application = per_application
+
+    def __repr__(self):
+        return "QueryBudget(base=%d, per_resident=%d, per_application=%d)" % (
+            self.base, self.per_resident, self.per_application)
+
+    def limit(self, nb_residents=0, nb_applications=0):
+        return (self.base + self.per_resident * nb_residents
+            + self.per_application * nb_applications)
+
+
+class QueryBudgetMixin(object):
+    """
+    Counts the SQL queries issued while rendering the view and checks
+    them against ``query_budget``.
+    """
+    query_budget = None
+
+    def get_query_budget_scale(self):
+        """
+        Returns the keyword arguments passed to ``QueryBudget.limit``.
+        """
+        if self.kwargs.get('resident'):
+            # Forms for a single resident.
+            return {'nb_residents': 1}
+        application = getattr(self, 'application', None)
+        if application is None:
+            return {}
+        return {'nb_residents': application.applicants.count()}
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.query_budget is None or not QUERY_BUDGET_CHECK:
+            return super(QueryBudgetMixin, self).dispatch(
+                request, *args, **kwargs)
+        with CaptureAllQueries() as queries:
+            response = super(QueryBudgetMixin, self).dispatch(
+                request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        nb_queries = len(queries)
+        limit = self.query_budget.limit(**self.get_query_budget_scale())
+        if nb_queries > limit:
+            msg = "%s issued %d queries, over its budget of %d (%s)" % (
+                self.__class__.__name__, nb_queries, limit, self.query_budget)
+            if QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(msg)
+            LOGGER.warning(msg)
+        return response
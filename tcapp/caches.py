@@ -0,0 +1,112 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Versioned cache keys for the public project pages.
+
+Cached entries are never explicitly deleted. Instead, keys embed
+the version of the data they were computed from: one version per property
+(bumped when the property or its AMI units mix is saved), one for income
+and rent limits (bumped when limits are imported), one for the search
+index (bumped when it is rebuilt), one for the rents of each property
+(bumped when an application or utility allowance of the property changes)
+and one for the contacts of properties (see ``tcapp.contacts``).
+Bumping a version makes all entries computed from the previous one
+unreachable until they expire.
+
+The versions are themselves stored in the cache, so a bump is only seen
+by processes that share the cache backend with the process bumping it
+(ex: the ``import_income_levels`` command and the gunicorn workers).
+Settings refuse the per-process 'locmem' backend unless ``DEBUG`` is set.
+"""
+from __future__ import unicode_literals
+
+import hashlib, time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+PROJECT_CACHE_TIMEOUT = getattr(settings, 'PROJECT_CACHE_TIMEOUT', 3600)
+
+LIMITS_VERSION = 'limits'
+SEARCH_INDEX_VERSION = 'search-index'
+CONTACTS_VERSION = 'contacts'
+
+
+def _version_key(name):
+    return 'version-%s' % name
+
+
+def get_version(name):
+    version = cache.get(_version_key(name))
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(_version_key(name), version, None):
+            version = cache.get(_version_key(name), version)
+    return version
+
+
+def bump_version(name):
+    cache.set(_version_key(name), int(time.time() * 1000), None)
+
+
+def property_version_name(lihtc_property):
+    return 'property-%d' % lihtc_property.pk
+
+
+def bump_property_version(lihtc_property):
+    bump_version(property_version_name(lihtc_property))
+
+
+def rents_version_name(lihtc_property):
+    return 'rents-%d' % lihtc_property.pk
+
+
+def bump_rents_version(lihtc_property):
+    bump_version(rents_version_name(lihtc_property))
+
+
+def bump_limits_version():
+    bump_version(LIMITS_VERSION)
+
+
+def bump_search_index_version():
+    bump_version(SEARCH_INDEX_VERSION)
+
+
+def bump_contacts_version():
+    bump_version(CONTACTS_VERSION)
+
+
+def get_project_cache_version(lihtc_property):
+    """
+    Returns a version string for cached data about *lihtc_property*
+    that changes whenever the property or the limits change.
+    """
+    versions = cache.get_many([_version_key(LIMITS_VERSION),
+        _version_key(property_version_name(lihtc_property))])
+    limits_version = versions.get(_version_key(LIMITS_VERSION))
+    if limits_version is None:
+        limits_version = get_version(LIMITS_VERSION)
+    property_version = versions.get(
+        _version_key(property_version_name(lihtc_property)))
+    if property_version is None:
+        property_version = get_version(property_version_name(lihtc_property))
+    return '%s-%s' % (property_version, limits_version)
+
+
+def get_project_cache_key(lihtc_property, name):
+    return 'project-%s-%s-%s' % (
+        lihtc_property.slug, name, get_project_cache_version(lihtc_property))
+
+
+def get_rent_compliance_cache_key(lihtc_property):
+    return 'rent-compliance-%s-%s-%s' % (lihtc_property.slug,
+        get_project_cache_version(lihtc_property),
+        get_version(rents_version_name(lihtc_property)))
+
+
+def get_search_cache_key(query):
+    return 'project-search-%s-%s' % (
+        hashlib.md5(query.encode('utf-8')).hexdigest(),
+        get_version(SEARCH_INDEX_VERSION))
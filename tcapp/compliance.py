@@ -0,0 +1,139 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Rent compliance of the units of a property.
+
+``check_rents`` compares the gross rent of each unit currently rented
+(rent + utility allowance + other non-optional charges) with the Federal
+LIHTC rent limit for the unit, as ``Application.gross_monthly_rent_for_unit``
+and ``Application.rent_limit`` would. Instead of one query per
+application, it loads the applications, the utility allowance schedule
+of the property (used when an application has no recorded allowance)
+and the rent limits of its county (see ``tcapp.eligibility.LimitsTable``)
+once, then joins them in memory.
+
+``get_rent_compliance`` caches the results per property until the rents
+(applications or utility allowances) or the limits change.
+"""
+from __future__ import unicode_literals
+
+import bisect, logging
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .caches import PROJECT_CACHE_TIMEOUT, get_rent_compliance_cache_key
+from .eligibility import get_limits_table
+from .models import Application, UtilityAllowance
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Applications whose household rents a unit.
+RENTED_STATUSES = (Application.STATUS_CERTIFICATION,
+    Application.STATUS_LEASE, Application.STATUS_MOVE_IN,
+    Application.STATUS_RE_CERTIFICATION)
+
+
+def current_applications(lihtc_property):
+    """
+    Applications of the households currently renting a unit
+    at *lihtc_property*. Applications superseded by a recertification
+    are excluded.
+    """
+    return Application.objects.filter(lihtc_property=lihtc_property,
+        status__in=RENTED_STATUSES).exclude(
+        recertifications__recertified_by__isnull=False)
+
+
+def _load_allowances(lihtc_property):
+    results = {}
+    for nb_bedrooms, created_at, full_amount, non_optional_amount in \
+            UtilityAllowance.objects.filter(
+                lihtc_property=lihtc_property).order_by(
+                'nb_bedrooms', 'created_at').values_list('nb_bedrooms',
+                'created_at', 'full_amount', 'non_optional_amount'):
+        results.setdefault(nb_bedrooms, []).append(
+            (created_at, full_amount, non_optional_amount))
+    return results
+
+
+def _effective_allowance(history, at_time):
+    # Latest allowance that was published before *at_time*.
+    if not history:
+        return None
+    idx = bisect.bisect_left(history, (at_time,))
+    if idx == 0:
+        return None
+    return history[idx - 1][1:]
+
+
+def check_rents(lihtc_property):
+    """
+    Returns the rent compliance of each unit currently rented
+    at *lihtc_property*, ordered by unit number.
+
+    The utility allowance and other charges are those recorded
+    on the application (see ``Application.gross_monthly_rent_for_unit``),
+    or, when none were recorded, those of the property schedule in effect
+    at the application effective date.
+    A unit without a rent limit (no limit published or no rent
+    restriction) cannot be over the limit.
+    """
+    #pylint:disable=too-many-locals
+    table = get_limits_table(lihtc_property.county)
+    allowances = _load_allowances(lihtc_property)
+    results = []
+    for (slug, unit_number, head_name, nb_bedrooms, effective_date,
+         monthly_rent, monthly_utility_allowance, monthly_other_charges,
+         rent_restriction) in current_applications(lihtc_property).order_by(
+            'unit_number', 'pk').values_list('slug', 'unit_number',
+            'head_name', 'nb_bedrooms', 'effective_date', 'monthly_rent',
+            'monthly_utility_allowance', 'monthly_other_charges',
+            'federal_rent_restriction'):
+        at_time = datetime_or_now(effective_date)
+        if not (monthly_utility_allowance or monthly_other_charges):
+            # Nothing recorded on the application.
+            allowance = _effective_allowance(
+                allowances.get(nb_bedrooms), at_time)
+            if allowance:
+                monthly_utility_allowance, monthly_other_charges = allowance
+        gross_rent = (monthly_rent + monthly_utility_allowance
+            + monthly_other_charges)
+        rent_limit_100 = table.rent_limit_100(nb_bedrooms, at_time=at_time) \
+            if nb_bedrooms is not None else 0
+        rent_limit = (rent_limit_100 * (rent_restriction or 0)) // 100
+        results += [OrderedDict([
+            ('application', slug),
+            ('unit_number', unit_number),
+            ('head_name', head_name),
+            ('nb_bedrooms', nb_bedrooms),
+            ('effective_date', effective_date),
+            ('monthly_rent', monthly_rent),
+            ('monthly_utility_allowance', monthly_utility_allowance),
+            ('monthly_other_charges', monthly_other_charges),
+            ('gross_monthly_rent', gross_rent),
+            ('rent_restriction', rent_restriction),
+            ('rent_limit_100', rent_limit_100),
+            ('rent_limit', rent_limit),
+            ('is_over_limit', rent_limit > 0 and gross_rent > rent_limit)])]
+    return results
+
+
+def get_rent_compliance(lihtc_property):
+    """
+    Returns the (cached) rent compliance of the units of *lihtc_property*
+    along with the number of units over the limit.
+    """
+    cache_key = get_rent_compliance_cache_key(lihtc_property)
+    result = cache.get(cache_key)
+    if result is None:
+        units = check_rents(lihtc_property)
+        result = OrderedDict([
+            ('nb_units', len(units)),
+            ('nb_over_limit', len([unit for unit in units
+                if unit['is_over_limit']])),
+            ('units', units)])
+        cache.set(cache_key, result, PROJECT_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,119 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Resolves the e-mail addresses of the managers of a LIHTC property.
+
+The addresses are updated through an organization profile page
+(i.e. in the saas tables) so they are looked up with a raw SQL query,
+then kept in the shared cache for ``CONTACTS_CACHE_TIMEOUT`` seconds
+under keys versioned by ``tcapp.caches.CONTACTS_VERSION``.
+
+``invalidate_property_contacts`` bumps that version. All workers see
+the bump only because ``settings.CACHE_BACKEND`` must be shared by all
+processes (memcached or file; locmem is only accepted with ``DEBUG``).
+It is called when a user, role or organization is saved or deleted
+in this process (see ``tcapp.signals``). Managers and e-mail addresses
+are usually changed through the saas service though, which does not
+notify this process. Those changes are only picked up once the cached
+entries expire, i.e. freshness relies on ``CONTACTS_CACHE_TIMEOUT``.
+"""
+from __future__ import unicode_literals
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.utils import OperationalError
+from django.utils import six
+
+from .caches import CONTACTS_VERSION, bump_contacts_version, get_version
+
+
+LOGGER = logging.getLogger(__name__)
+
+CONTACTS_CACHE_TIMEOUT = getattr(settings, 'CONTACTS_CACHE_TIMEOUT', 300)
+
+# Role of the property managers in saas_role.
+MANAGER_ROLE_DESCRIPTION_ID = 1
+
+
+# Tables which, when modified, can change the contacts of properties.
+CONTACTS_TABLES = ('auth_user', 'saas_role', 'saas_organization')
+
+
+def _cache_key(slug, version):
+    return 'property-contacts-%s-%s' % (slug, version)
+
+
+def _fetch_property_contacts(slugs):
+    """
+    Returns a dictionnary of e-mail addresses of managers keyed
+    by property slug, for all *slugs*, in a single query.
+    """
+    contacts = {slug: [] for slug in slugs}
+    with connection.cursor() as cursor:
+        # XXX Hack to read a property e-mail address that can be updated
+        #     through an organization profile page.
+        cursor.execute("SELECT saas_organization.slug, auth_user.email"
+            " FROM auth_user"
+            " INNER JOIN saas_role ON auth_user.id = saas_role.user_id"
+            " INNER JOIN saas_organization"
+            " ON saas_role.organization_id = saas_organization.id"
+            " WHERE saas_role.role_description_id = %%s"
+            " AND saas_organization.slug IN (%s)"
+            % ', '.join(['%s'] * len(slugs)),
+            [MANAGER_ROLE_DESCRIPTION_ID] + list(slugs))
+        for slug, email in cursor.fetchall():
+            contacts[slug] += [email]
+    return contacts
+
+
+def get_property_contacts(lihtc_properties):
+    """
+    Returns the e-mail addresses of the managers of each property
+    in *lihtc_properties*, keyed by property slug.
+
+    Properties whose addresses are not cached are resolved in a single
+    query. When the saas tables cannot be queried, the addresses default
+    to ``settings.DEFAULT_FROM_EMAIL`` (and are not cached).
+    """
+    slugs = set([lihtc_property.slug for lihtc_property in lihtc_properties])
+    version = get_version(CONTACTS_VERSION)
+    cached = cache.get_many([_cache_key(slug, version) for slug in slugs])
+    contacts = {slug: cached[_cache_key(slug, version)]
+        for slug in slugs if _cache_key(slug, version) in cached}
+    missing = slugs - set(contacts)
+    if missing:
+        try:
+            fetched = _fetch_property_contacts(missing)
+            cache.set_many({_cache_key(slug, version): emails
+                for slug, emails in six.iteritems(fetched)},
+                CONTACTS_CACHE_TIMEOUT)
+            contacts.update(fetched)
+        except OperationalError as err:
+            LOGGER.warning("cannot resolve contacts for %s: %s",
+                ', '.join(sorted(missing)), err)
+            contacts.update({
+                slug: [settings.DEFAULT_FROM_EMAIL] for slug in missing})
+    return contacts
+
+
+def get_property_contact(lihtc_property):
+    """
+    Returns the e-mail addresses of the managers of *lihtc_property*.
+    """
+    return get_property_contacts([lihtc_property])[lihtc_property.slug]
+
+
+def invalidate_property_contacts(lihtc_properties=None):
+    """
+    Removes the cached e-mail addresses for *lihtc_properties*
+    (defaults to all properties).
+    """
+    if lihtc_properties is None:
+        bump_contacts_version()
+    else:
+        version = get_version(CONTACTS_VERSION)
+        cache.delete_many([_cache_key(lihtc_property.slug, version)
+            for lihtc_property in lihtc_properties])
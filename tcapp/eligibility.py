@@ -0,0 +1,324 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+In-memory eligibility of households against income and rent limits.
+
+``Application.income_limit`` and ``Application.rent_limit`` issue one query
+per call. Here, all limits published for a county are loaded once into
+a ``LimitsTable`` cached under the limits version (see ``tcapp.caches``),
+so evaluating many scenarios for a household (other AMI restrictions,
+one more member, a raise) does not touch the database.
+
+``estimate_application`` computes the income and eligibility of
+a household from a validated ``ApplicationDetailSerializer`` payload,
+without creating any record, the way ``Application`` properties would
+once the payload is saved. Sources are mapped to questions by the same
+helpers as ``ResidentSerializer.create`` (see ``tcapp.questionnaire``).
+"""
+from __future__ import unicode_literals
+
+import bisect, logging
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils import six
+
+from . import annualize
+from .caches import LIMITS_VERSION, PROJECT_CACHE_TIMEOUT, get_version
+from .models import (Asset, Income, IncomeLimit, PropertyAMIUnits, Question,
+    RentLimit)
+from .questionnaire import (income_periods, income_question_id,
+    pop_asset_sources, pop_income_sources)
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Income restrictions evaluated when a property does not record
+# its AMI units mix.
+DEFAULT_RESTRICTIONS = (50, 60)
+
+# Minimum cash value of assets (in cents) above which income is imputed
+# (see ``Application.imputed_income_from_assets``).
+IMPUTED_ASSETS_THRESHOLD = 500000
+
+
+class LimitsTable(object):
+    """
+    All income limits (by family size) and rent limits (by number
+    of bedrooms) published for a county, in chronological order.
+    """
+
+    def __init__(self, income_limits, rent_limits):
+        self.income_limits = income_limits
+        self.rent_limits = rent_limits
+
+    @staticmethod
+    def _full_amount(history, at_time):
+        # Latest limit that was published before *at_time*.
+        if not history:
+            return 0
+        idx = bisect.bisect_left(history, (at_time,))
+        if idx == 0:
+            return 0
+        return history[idx - 1][1]
+
+    def income_limit_100(self, family_size, at_time=None):
+        return self._full_amount(self.income_limits.get(family_size),
+            datetime_or_now(at_time))
+
+    def rent_limit_100(self, nb_bedrooms, at_time=None):
+        return self._full_amount(self.rent_limits.get(nb_bedrooms),
+            datetime_or_now(at_time))
+
+
+def _load_limits(queryset, key_field):
+    results = {}
+    for key, created_at, full_amount in queryset.order_by(
+            key_field, 'created_at').values_list(
+            key_field, 'created_at', 'full_amount'):
+        results.setdefault(key, []).append((created_at, full_amount))
+    return results
+
+
+def get_limits_table(county):
+    """
+    Returns the ``LimitsTable`` for *county*.
+    """
+    cache_key = 'limits-table-%d-%s' % (county.pk, get_version(LIMITS_VERSION))
+    table = cache.get(cache_key)
+    if table is None:
+        table = LimitsTable(
+            _load_limits(IncomeLimit.objects.filter(county=county),
+                'family_size'),
+            _load_limits(RentLimit.objects.filter(county=county),
+                'nb_bedrooms'))
+        cache.set(cache_key, table, PROJECT_CACHE_TIMEOUT)
+    return table
+
+
+def get_restrictions(lihtc_property):
+    """
+    Income restrictions (AMI percentages) of the units at *lihtc_property*.
+    """
+    restrictions = sorted(set(PropertyAMIUnits.objects.filter(
+        lihtc_property=lihtc_property, ami_percentage__gt=0).values_list(
+        'ami_percentage', flat=True)))
+    return restrictions if restrictions else list(DEFAULT_RESTRICTIONS)
+
+
+def as_income_row(data):
+    """
+    Returns the ``IncomeRow`` for validated ``IncomeSerializer`` *data*,
+    with the defaults and constraints applied when an ``Income``
+    is created through the API.
+    """
+    period, avg, avg_per_year = income_periods(data)
+    return annualize.IncomeRow(
+        verified=data.get('verified', Income.VERIFIED_TENANT), period=period,
+        category=data.get('category') or Income.OTHER,
+        amount=data.get('amount', 0),
+        period_per_avg=data.get('period_per_avg', 0), avg=avg,
+        avg_per_year=avg_per_year, starts_at=data.get('starts_at'),
+        ends_at=data.get('ends_at'))
+
+
+def annual_income_of_sources(sources):
+    """
+    Annual income in cents of validated ``SourceSerializer`` *sources*,
+    the greater of verification methods for each source.
+    """
+    verif_by_sources = {}
+    for idx, source in enumerate(sources):
+        verifications = verif_by_sources.setdefault(idx, {})
+        for income in source.get('incomes', []):
+            if income.get('amount', 0) <= 0:
+                continue
+            row = as_income_row(income)
+            verifications.setdefault(row.verified, []).append(row)
+    return annualize.sum_greater_of_annualize(verif_by_sources)
+
+
+def evaluate(table, family_size, annual_income, income_restriction,
+             nb_bedrooms=None, rent_restriction=None, at_time=None):
+    """
+    Returns the limits that apply to a household and whether it is eligible,
+    computed as ``Application`` properties do.
+    """
+    #pylint:disable=too-many-arguments
+    income_limit_100 = table.income_limit_100(family_size, at_time=at_time)
+    income_limit = (income_limit_100 * income_restriction) // 100
+    income_limit_140 = (income_limit * 140) // 100
+    result = OrderedDict([
+        ('family_size', family_size),
+        ('annual_income', annual_income),
+        ('income_restriction', income_restriction),
+        ('income_limit_100', income_limit_100),
+        ('income_limit', income_limit),
+        ('income_limit_140', income_limit_140),
+        ('is_eligible', annual_income <= income_limit),
+        ('is_eligible_140', annual_income <= income_limit_140)])
+    if nb_bedrooms is not None:
+        if rent_restriction is None:
+            rent_restriction = income_restriction
+        result.update([
+            ('nb_bedrooms', nb_bedrooms),
+            ('rent_restriction', rent_restriction),
+            ('rent_limit', (table.rent_limit_100(nb_bedrooms, at_time=at_time)
+                * rent_restriction) // 100)])
+    return result
+
+
+def simulate(table, household, scenarios, at_time=None):
+    """
+    Evaluates each of *scenarios* applied to *household*.
+
+    *household* is a dict with ``family_size``, ``annual_income``,
+    ``nb_bedrooms`` and ``income_restriction`` keys. Each scenario
+    overrides ``income_restriction`` or ``rent_restriction`` and adds
+    ``family_size_delta`` and ``annual_income_delta`` to the household.
+    """
+    results = []
+    for scenario in scenarios:
+        results += [evaluate(table,
+            family_size=max(household['family_size']
+                + scenario.get('family_size_delta', 0), 1),
+            annual_income=max(household['annual_income']
+                + scenario.get('annual_income_delta', 0), 0),
+            income_restriction=scenario.get('income_restriction',
+                household.get('income_restriction', 0)),
+            nb_bedrooms=household.get('nb_bedrooms'),
+            rent_restriction=scenario.get('rent_restriction',
+                household.get('rent_restriction')),
+            at_time=at_time)]
+    return results
+
+
+def application_household(application):
+    """
+    Household of *application* from its denormalized summary
+    (see ``Application.update_summary``).
+    """
+    return {
+        'family_size': application.household_size,
+        'annual_income': application.annual_income,
+        'nb_bedrooms': application.nb_bedrooms,
+        'income_restriction': application.federal_income_restriction,
+        'rent_restriction': (application.federal_rent_restriction
+            if application.federal_rent_restriction else None)}
+
+
+def estimate_incomes(resident):
+    """
+    Returns the annual income of each income source of validated
+    ``ResidentSerializer`` data *resident* as a list of
+    (question_id, source name, annual income) along with the total.
+    """
+    verif_by_sources = OrderedDict()
+    for question_id, source in pop_income_sources(dict(resident)):
+        # Sources are looked up by name and position for a resident.
+        source_key = (source.get('name'), source.get('position'))
+        for income in source.get('incomes', []):
+            if income.get('amount', 0) <= 0:
+                continue
+            income_question_pk = income_question_id(question_id, income)
+            key = (annualize.QUESTION_GROUPS.get(income_question_pk),
+                source_key)
+            row = as_income_row(income)
+            verifications = verif_by_sources.setdefault(
+                key, (income_question_pk, {}))[1]
+            verifications.setdefault(row.verified, []).append(row)
+    results = []
+    total = 0
+    for key, (question_id, verifications) in six.iteritems(verif_by_sources):
+        amount = annualize.greater_of_annualize(verifications)
+        results += [(question_id, key[1][0], amount)]
+        if key[0] is not None:
+            total += amount
+    return results, total
+
+
+def estimate_assets(resident):
+    """
+    Returns the cash value and annual income of the assets of validated
+    ``ResidentSerializer`` data *resident*.
+    """
+    sources, cash_on_hand = pop_asset_sources(dict(resident))
+    assets = [((source.get('name'), source.get('position')), asset)
+        for source in sources for asset in source.get('assets', [])]
+    if cash_on_hand:
+        assets += [((Question.CASH_ON_HAND[0], None), cash_on_hand)]
+    greater_of = {}
+    for source_key, asset in assets:
+        amount = asset.get('amount', 0)
+        if amount <= 0:
+            continue
+        category = asset.get('category') or Asset.OWNER
+        key = (source_key, category)
+        if key not in greater_of or amount > greater_of[key][0]:
+            greater_of[key] = (amount, asset.get('interest_rate', 0))
+    cash_value = 0
+    annual_income = 0
+    for amount, interest_rate in six.itervalues(greater_of):
+        cash_value += amount
+        annual_income += (amount * interest_rate) // 10000
+    return cash_value, annual_income
+
+
+def estimate_application(validated_data, lihtc_property, at_time=None):
+    """
+    Returns the household income estimate and eligibility of validated
+    ``ApplicationDetailSerializer`` data *validated_data*
+    at *lihtc_property*.
+    """
+    #pylint:disable=too-many-locals
+    applicants = validated_data.get('applicants', [])
+    family_size = len(applicants) + len(validated_data.get('children', []))
+    total_income = 0
+    cash_value_of_assets = 0
+    annual_income_from_assets = 0
+    residents = []
+    question_ids = set([])
+    for resident in applicants:
+        incomes, resident_total_income = estimate_incomes(resident)
+        cash_value, assets_annual_income = estimate_assets(resident)
+        total_income += resident_total_income
+        cash_value_of_assets += cash_value
+        annual_income_from_assets += assets_annual_income
+        question_ids |= set([income[0] for income in incomes])
+        residents += [{
+            'full_name': resident.get('full_name', ""),
+            'phone': resident.get('phone', ""),
+            'email': resident.get('email', ""),
+            'incomes': incomes,
+            'total_income': resident_total_income}]
+    titles = {question.pk: question.title
+        for question in Question.objects.filter(pk__in=question_ids)}
+    for resident in residents:
+        resident['incomes'] = [{
+            'title': titles.get(question_id, ""),
+            'source': source_name if source_name != "N/A" else "",
+            'amount': amount}
+            for question_id, source_name, amount in resident['incomes']]
+    if cash_value_of_assets < IMPUTED_ASSETS_THRESHOLD:
+        imputed_income_from_assets = 0
+    else:
+        imputed_income_from_assets = (cash_value_of_assets * 6) // 10000
+    total_annual_income = total_income + max(annual_income_from_assets,
+        imputed_income_from_assets)
+    table = get_limits_table(lihtc_property.county)
+    limits = [evaluate(table, family_size, total_annual_income, restriction,
+        at_time=at_time) for restriction in DEFAULT_RESTRICTIONS]
+    eligible_restrictions = [limit['income_restriction']
+        for limit in limits if limit['is_eligible']]
+    return OrderedDict([
+        ('family_size', family_size),
+        ('applicants', residents),
+        ('total_income', total_income),
+        ('cash_value_of_assets', cash_value_of_assets),
+        ('annual_income_from_assets', annual_income_from_assets),
+        ('imputed_income_from_assets', imputed_income_from_assets),
+        ('total_annual_income', total_annual_income),
+        ('limits', limits),
+        ('eligible_restriction', min(eligible_restrictions)
+            if eligible_restrictions else None)])
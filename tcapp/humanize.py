@@ -6,6 +6,9 @@ from __future__ import unicode_literals
 from django.utils import six
 
 
+DATETIME_FORMAT = "%m-%d-%Y"
+
+
 def as_money(value, currency='usd', whole_dollars=False, show_unit=True):
     assert isinstance(value, six.integer_types)
     currency = currency.lower()
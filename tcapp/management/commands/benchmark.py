@@ -0,0 +1,100 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Runs the annualization and eligibility benchmarks (see ``tcapp.benchmarks``).
+
+Example:
+   python manage.py generate_synthetic_data --seed 1
+   python manage.py benchmark --output bench-HEAD.json
+   python manage.py benchmark --compare bench-HEAD.json
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import (MACRO, MICRO, compare_results,
+    get_largest_application, run_benchmarks)
+from ...models import Application
+
+
+class Command(BaseCommand):
+
+    help = "Runs micro-benchmarks of the income annualization functions"\
+        " and macro-benchmarks of the eligibility properties and views."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--application', action='store',
+            dest='application', default=None,
+            help="application used in macro-benchmarks"\
+" (defaults to the one with the largest household).")
+        parser.add_argument('--micro', action='store_true',
+            dest='micro', default=False,
+            help="only run micro-benchmarks.")
+        parser.add_argument('--macro', action='store_true',
+            dest='macro', default=False,
+            help="only run macro-benchmarks.")
+        parser.add_argument('--repeat', action='store', type=int,
+            dest='repeat', default=5,
+            help="number of timings per benchmark.")
+        parser.add_argument('--number', action='store', type=int,
+            dest='number', default=None,
+            help="number of calls per timing (defaults to 1000 for"\
+" micro-benchmarks and 1 for macro-benchmarks).")
+        parser.add_argument('--output', action='store',
+            dest='output', default=None,
+            help="file to write the JSON results to (defaults to stdout).")
+        parser.add_argument('--compare', action='store',
+            dest='compare', default=None,
+            help="JSON results of a previous run to compare against.")
+        parser.add_argument('--threshold', action='store', type=float,
+            dest='threshold', default=0.1,
+            help="relative slow-down reported as a regression.")
+        parser.add_argument('--fail-on-regression', action='store_true',
+            dest='fail_on_regression', default=False,
+            help="exit with an error when a regression is found.")
+        parser.add_argument('names', metavar='names', nargs='*',
+            help="only run benchmarks whose name contains one of `names`.")
+
+    def handle(self, *args, **options):
+        kinds = []
+        if options['micro']:
+            kinds += [MICRO]
+        if options['macro']:
+            kinds += [MACRO]
+        if options['application']:
+            try:
+                application = Application.objects.select_related(
+                    'lihtc_property__county').get(
+                    slug=options['application'])
+            except Application.DoesNotExist:
+                raise CommandError(
+                    "cannot find application '%s'" % options['application'])
+        else:
+            application = get_largest_application()
+        results = run_benchmarks(application=application,
+            names=options['names'], kinds=kinds,
+            repeat=options['repeat'], number=options['number'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        elif not options['compare']:
+            self.stdout.write(json.dumps(results, indent=2) + "\n")
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                previous = json.load(previous_file)
+            nb_regressions = 0
+            for (name, before, after, ratio, queries_before, queries_after,
+                 is_regression) in compare_results(previous, results,
+                    threshold=options['threshold']):
+                if is_regression:
+                    nb_regressions += 1
+                self.stdout.write("%s %-45s %10.6fs %10.6fs %6.2fx"\
+                    " %4d %4d queries\n" % ("!" if is_regression else " ",
+                    name, before, after, ratio, queries_before, queries_after))
+            if nb_regressions and options['fail_on_regression']:
+                raise CommandError("%d regressions compared to %s" % (
+                    nb_regressions, options['compare']))
@@ -0,0 +1,184 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Checks the integer annualization kernel (``tcapp.annualize``) against
+the implementation in ``tcapp.models`` on randomly generated incomes.
+
+For every combination of income period and verification method,
+the command generates incomes with random amounts, hours, periods
+and dates. It then checks that:
+
+- each income annualizes within one cent of ``Income.annual_income``
+  (the difference being floating point errors in ``tcapp.models``),
+- aggregates (``greater_of_annualize``) are within one cent per income
+  of ``greater_of_annualize_income``,
+- scaling an amount by *k* scales its annual income by *k*, within
+  the truncation to a whole cent,
+- when NumPy is installed, the vectorized ``residents_total_income``
+  matches the pure Python implementation exactly.
+
+A failing case is printed with the seed to reproduce it.
+"""
+
+import datetime, random
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import utc
+
+from ... import annualize
+from ...models import Income, greater_of_annualize_income
+
+
+def random_income(rnd, verified, period, now):
+    ends_at = now - datetime.timedelta(days=rnd.randint(0, 3 * 365))
+    starts_at = ends_at - datetime.timedelta(days=rnd.randint(0, 400))
+    avg = rnd.choice([Income.WEEKLY, Income.BI_WEEKLY, Income.SEMI_MONTHLY,
+        Income.MONTHLY, Income.YEARLY, Income.OTHER])
+    return Income(verified=verified, period=period,
+        category=rnd.choice([Income.REGULAR, Income.OVERTIME, Income.TIPS]),
+        amount=rnd.randint(0, 20000000),
+        period_per_avg=rnd.randint(0, 8000),
+        avg=avg,
+        avg_per_year=rnd.choice([0, 0, rnd.randint(1, 36600)]),
+        starts_at=starts_at, ends_at=ends_at)
+
+
+def is_floored(income):
+    """
+    Returns `True` if intermediate results are floored when annualizing
+    *income* (see ``tcapp.annualize.FLOOR_DIVISION``).
+    """
+    return (annualize.FLOOR_DIVISION
+        and income.verified != Income.VERIFIED_TAX_RETURN
+        and income.period in (Income.HOURLY, Income.DAILY, Income.OTHER))
+
+
+def try_call(func, *args):
+    try:
+        return func(*args)
+    except ValueError:
+        return ValueError
+
+
+class Command(BaseCommand):
+
+    help = "Checks the integer annualization kernel against tcapp.models."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nb-cases', action='store', type=int,
+            dest='nb_cases', default=2000,
+            help="number of cases per period and verification method.")
+        parser.add_argument('--seed', action='store', type=int,
+            dest='seed', default=None,
+            help="seed for the random generator.")
+
+    def handle(self, *args, **options):
+        seed = options['seed']
+        if seed is None:
+            seed = random.randint(0, 2 ** 32)
+        rnd = random.Random(seed)
+        now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        failures = []
+        nb_checks = 0
+        nb_off_by_one = 0
+        incomes = []
+        for verified, _ in sorted(Income.VERIFIED):
+            for period, _ in sorted(Income.PERIOD):
+                for _ in range(0, options['nb_cases']):
+                    income = random_income(rnd, verified, period, now)
+                    incomes += [income]
+                    row = annualize.as_income_row(income)
+                    expected = try_call(lambda: income.annual_income)
+                    actual = try_call(annualize.annual_income, row)
+                    nb_checks += 1
+                    if expected is ValueError or actual is ValueError:
+                        if expected is not actual:
+                            failures += [("raises", income, expected, actual)]
+                        continue
+                    if abs(expected - actual) > 1:
+                        failures += [("annual_income", income,
+                            expected, actual)]
+                    elif expected != actual:
+                        nb_off_by_one += 1
+                    # Scaling property
+                    scale = rnd.randint(2, 100)
+                    scaled = try_call(annualize.annual_income,
+                        row._replace(amount=row.amount * scale))
+                    if is_floored(income):
+                        # Floored intermediate results only grow
+                        # with the amount.
+                        scales = actual * scale <= scaled
+                    else:
+                        scales = (actual * scale <= scaled
+                            < (actual + 1) * scale)
+                    if not scales:
+                        failures += [("scaling x%d" % scale, income,
+                            actual * scale, scaled)]
+
+        # Aggregates over random groups of incomes.
+        for _ in range(0, options['nb_cases']):
+            verifications = {}
+            rows = {}
+            for income in rnd.sample(incomes, rnd.randint(1, 12)):
+                verifications.setdefault(income.verified, []).append(income)
+                rows.setdefault(income.verified, []).append(
+                    annualize.as_income_row(income))
+            expected = greater_of_annualize_income(verifications)
+            actual = annualize.greater_of_annualize(rows)
+            nb_checks += 1
+            nb_incomes = sum([len(val) for val in rows.values()])
+            if abs(expected - actual) > nb_incomes:
+                failures += [("greater_of", verifications, expected, actual)]
+
+        # Vectorized totals per resident.
+        try:
+            from ... import annualize_numpy
+        except ImportError:
+            annualize_numpy = None
+        if annualize_numpy is not None:
+            rows = sorted([(rnd.randint(1, len(incomes) // 8 + 1),
+                rnd.randint(1, 16), rnd.choice([None, 1, 2, 3]))
+                + annualize.as_income_row(income) for income in incomes],
+                key=lambda row: (row[0], row[1], row[2] or 0, row[3],
+                    row[-1] or now))
+            expected = annualize.rows_total_income(rows)
+            start = default_timer()
+            actual = annualize_numpy.residents_total_income(rows)
+            vectorized_duration = default_timer() - start
+            nb_checks += 1
+            mismatches = [resident_id
+                for resident_id in set(expected) | set(actual)
+                if expected.get(resident_id) != actual.get(resident_id)]
+            if mismatches:
+                failures += [("residents_total_income", mismatches[:10],
+                    [expected.get(resident_id) for resident_id in mismatches],
+                    [actual.get(resident_id) for resident_id in mismatches])]
+
+        rows = [annualize.as_income_row(income) for income in incomes]
+        start = default_timer()
+        for income in incomes:
+            try_call(lambda: income.annual_income)
+        models_duration = default_timer() - start
+        start = default_timer()
+        for row in rows:
+            try_call(annualize.annual_income, row)
+        kernel_duration = default_timer() - start
+
+        for name, case, expected, actual in failures[:10]:
+            self.stdout.write("FAIL %s: expected %s, got %s for %s\n" % (
+                name, expected, actual, case.__dict__
+                if isinstance(case, Income) else case))
+        self.stdout.write("%d checks, %d failures, %d off by one cent"\
+            " (seed %d)\n" % (nb_checks, len(failures), nb_off_by_one, seed))
+        self.stdout.write("%d incomes: tcapp.models %.3fs,"\
+            " tcapp.annualize %.3fs\n" % (
+            len(incomes), models_duration, kernel_duration))
+        if annualize_numpy is not None:
+            self.stdout.write("%d incomes: tcapp.annualize_numpy %.3fs\n" % (
+                len(incomes), vectorized_duration))
+        if failures:
+            raise CommandError("%d checks failed." % len(failures))
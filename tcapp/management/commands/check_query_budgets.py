@@ -0,0 +1,138 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Renders every view with a ``query_budget`` against applications
+of various household sizes and reports the views that issue more SQL
+queries than their budget allows, or whose number of queries grows faster
+with the household size than the budget scaling.
+
+Example:
+   python manage.py generate_synthetic_data --seed 1 --household-size 8
+   python manage.py check_query_budgets
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import resolve
+
+from ...benchmarks import view_runner
+from ...budgets import CaptureAllQueries
+from ...models import Application, ApplicationResident
+from ...urlbuilders import get_view_class
+from ...utils import datetime_or_now
+
+
+def _application_args(application):
+    return (application.lihtc_property, application)
+
+
+def _adult(application):
+    return application.applicants.filter(date_of_birth__lte=(
+        datetime_or_now() - datetime.timedelta(days=18 * 366))).first()
+
+
+def _ticq_args(application):
+    resident = _adult(application)
+    return (application.lihtc_property, application, resident) if (
+        resident is not None) else None
+
+
+def _resident_args(application):
+    resident = _adult(application)
+    return (application.lihtc_property, resident) if (
+        resident is not None) else None
+
+
+def _application_scale(application):
+    return {'nb_residents': application.applicants.count()}
+
+
+def _resident_scale(application): #pylint:disable=unused-argument
+    return {'nb_residents': 1}
+
+
+def _report_scale(application):
+    queryset = Application.objects.filter(
+        lihtc_property=application.lihtc_property)
+    return {'nb_applications': queryset.count(),
+        'nb_residents': ApplicationResident.objects.filter(
+            application__in=queryset).count()}
+
+
+# url name, view arguments, budget scale, check scaling with household size
+BUDGETED_VIEWS = [
+    ('application_checklist', _application_args, _application_scale, True),
+    ('verification_tic', _application_args, _application_scale, True),
+    ('tenant_verification_ticq', _ticq_args, _resident_scale, False),
+    ('tenant_verification_under_5000_assets', _resident_args,
+        _resident_scale, False),
+    ('income_report', lambda application: (application.lihtc_property,),
+        _report_scale, False),
+]
+
+
+class Command(BaseCommand):
+
+    help = "Checks views issue no more SQL queries than their budget."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', action='store', type=int,
+            dest='nb_sizes', default=3,
+            help="number of distinct household sizes to render views with.")
+
+    def get_applications(self, nb_sizes):
+        """
+        Returns one application per household size, for up to *nb_sizes*
+        sizes, smallest and largest households first.
+        """
+        sizes = sorted(set(Application.objects.filter(
+            household_size__gt=0).values_list('household_size', flat=True)))
+        if len(sizes) > nb_sizes:
+            sizes = [sizes[0], sizes[-1]] + sizes[1:nb_sizes - 1]
+        return [Application.objects.select_related(
+            'lihtc_property__county').filter(household_size=size).first()
+            for size in sizes]
+
+    def handle(self, *args, **options):
+        applications = self.get_applications(max(2, options['nb_sizes']))
+        if not applications:
+            raise CommandError("no applications to render views with."\
+                " Run generate_synthetic_data first.")
+        nb_failures = 0
+        for url_name, get_args, get_scale, check_scaling in BUDGETED_VIEWS:
+            measures = []
+            for application in applications:
+                args = get_args(application)
+                if args is None:
+                    continue
+                run = view_runner(url_name, args, application.lihtc_property)
+                budget = get_view_class(
+                    resolve(run.path).func).query_budget
+                scale = get_scale(application)
+                with CaptureAllQueries() as queries:
+                    run()
+                nb_queries = len(queries)
+                limit = budget.limit(**scale)
+                self.stdout.write("%s %-40s household of %2d: %4d queries"\
+                    " (budget %d)\n" % ("!" if nb_queries > limit else " ",
+                    url_name, application.household_size, nb_queries, limit))
+                if nb_queries > limit:
+                    nb_failures += 1
+                measures += [(scale.get('nb_residents', 0), nb_queries)]
+            if check_scaling and len(measures) >= 2:
+                (small, small_queries), (large, large_queries) = (
+                    min(measures), max(measures))
+                if large > small:
+                    per_resident = (float(large_queries - small_queries)
+                        / (large - small))
+                    if per_resident > budget.per_resident:
+                        nb_failures += 1
+                        self.stdout.write("! %-40s %.1f queries per resident"\
+                            " (budget %d)\n" % (url_name, per_resident,
+                            budget.per_resident))
+        if nb_failures:
+            raise CommandError("%d query budgets exceeded" % nb_failures)
@@ -0,0 +1,48 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Checks the gross rent of each unit currently rented at properties
+against the Federal LIHTC rent limit for the unit.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...compliance import check_rents
+from ...humanize import as_money
+from ...models import Property
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = "Lists units whose gross rent is over the rent limit."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('properties', metavar='properties', nargs='*',
+            help="properties to check (defaults to all).")
+
+    def handle(self, *args, **options):
+        queryset = Property.objects.all().select_related('county')
+        if options['properties']:
+            queryset = queryset.filter(slug__in=options['properties'])
+        nb_units = 0
+        nb_over_limit = 0
+        for lihtc_property in queryset:
+            for unit in check_rents(lihtc_property):
+                nb_units += 1
+                if unit['is_over_limit']:
+                    nb_over_limit += 1
+                    self.stdout.write("%s unit %s (%s): gross rent %s"\
+                        " over limit %s\n" % (lihtc_property,
+                        unit['unit_number'], unit['application'],
+                        as_money(unit['gross_monthly_rent']),
+                        as_money(unit['rent_limit'])))
+        self.stdout.write("%d units checked, %d over the rent limit\n" % (
+            nb_units, nb_over_limit))
@@ -0,0 +1,29 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Deletes from storage the content of documents no longer attached
+to any application (see ``tcapp.blobs``).
+"""
+
+from django.core.management.base import BaseCommand
+
+from ...blobs import collect_blobs
+
+
+class Command(BaseCommand):
+
+    help = "Deletes unreferenced document blobs from storage."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+            dest='dry_run', default=False,
+            help="only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        nb_blobs, nb_bytes = collect_blobs(dry_run=options['dry_run'])
+        self.stdout.write("%s %d blobs (%d bytes)\n" % (
+            "would delete" if options['dry_run'] else "deleted",
+            nb_blobs, nb_bytes))
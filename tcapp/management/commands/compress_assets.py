@@ -0,0 +1,75 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Writes precompressed variants of the asset bundles.
+
+Runs after ``manage.py assets build``. For each bundle output in
+the manifest, a ``.gz`` variant is written next to it, along with a ``.br``
+variant when the ``brotli`` package is installed. Variants are served
+by ``tcapp.views.static.serve``.
+"""
+
+import gzip, json, os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None #pylint:disable=invalid-name
+
+
+def compress_gzip(content):
+    buf = BytesIO()
+    # ``mtime=0`` so the same content always compresses to the same bytes.
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9,
+                       mtime=0) as compressed:
+        compressed.write(content)
+    return buf.getvalue()
+
+
+class Command(BaseCommand):
+
+    help = "Writes gzip and brotli variants of asset bundles."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-size', action='store', type=int,
+            dest='min_size', default=256,
+            help="do not compress files smaller than this (in bytes).")
+
+    def handle(self, *args, **options):
+        manifest_path = os.path.join(settings.ASSETS_ROOT,
+            settings.ASSETS_MANIFEST.split(':', 1)[-1])
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except IOError:
+            raise CommandError("cannot read %s. Run `manage.py assets build`"\
+                " first." % manifest_path)
+        if brotli is None:
+            self.stdout.write("brotli is not installed,"\
+                " only writing gzip variants.\n")
+        for bundle_output, version in sorted(manifest.items()):
+            path = os.path.join(settings.ASSETS_ROOT,
+                bundle_output % {'version': version})
+            if not os.path.isfile(path):
+                self.stdout.write("warning: %s is missing\n" % path)
+                continue
+            with open(path, 'rb') as bundle_file:
+                content = bundle_file.read()
+            if len(content) < options['min_size']:
+                continue
+            variants = [('.gz', compress_gzip(content))]
+            if brotli is not None:
+                variants += [('.br', brotli.compress(content))]
+            for ext, compressed in variants:
+                with open(path + ext, 'wb') as compressed_file:
+                    compressed_file.write(compressed)
+                self.stdout.write("%s%s: %d -> %d bytes\n" % (
+                    os.path.basename(path), ext,
+                    len(content), len(compressed)))
@@ -0,0 +1,52 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Sends pending notifications recorded in the outbox.
+"""
+
+import logging, time
+
+from django.core.management.base import BaseCommand
+
+from ...outbox import dispatch_outbox
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = "Sends pending notifications (ex: application created)"\
+        " recorded in the outbox, retrying the ones that previously failed."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', action='store', type=int,
+            dest='batch_size', default=100,
+            help="maximum number of notifications sent per batch.")
+        parser.add_argument('--interval', action='store', type=int,
+            dest='interval', default=0,
+            help="keep running, checking the outbox every `interval`"\
+" seconds (defaults to a single pass).")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        interval = options['interval']
+        while True:
+            nb_sent = 0
+            nb_failed = 0
+            while True:
+                batch_sent, batch_failed = dispatch_outbox(
+                    batch_size=batch_size)
+                nb_sent += batch_sent
+                nb_failed += batch_failed
+                if batch_sent + batch_failed < batch_size:
+                    break
+            if nb_sent or nb_failed:
+                self.stdout.write("sent %d notifications, %d failed\n"
+                    % (nb_sent, nb_failed))
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,103 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Prints the query plan of the hot lookups on incomes, assets, answers,
+income and rent limits, and applications, and reports the ones that
+do not use an index, or that sort rows the index could return in order.
+
+The composite indexes are declared through ``index_together``
+in ``tcapp.models`` (the schema is created by ``migrate --run-syncdb``).
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import utc
+
+from ...models import (Answer, Application, Asset, Income, IncomeLimit,
+    RentLimit)
+
+
+def get_lookups():
+    """
+    Returns the (name, queryset) of lookups that must use an index.
+    """
+    at_time = datetime.datetime.utcnow().replace(tzinfo=utc)
+    return [
+        # As in ``Resident.income_by_source`` and ``CalculationMixin``.
+        ('Income by resident, ordered by question, source and verified',
+         Income.objects.filter(resident_id=1).select_related(
+            'source').order_by('question', 'source', 'verified')),
+        ('Asset by resident and question',
+         Asset.objects.filter(resident_id=1, question_id=1)),
+        ('Answer by resident and question',
+         Answer.objects.filter(resident_id=1, question_id=1)),
+        ('IncomeLimit by county and family size',
+         IncomeLimit.objects.filter(county_id=1, family_size=4,
+            created_at__lt=at_time).order_by('-created_at')[:1]),
+        ('RentLimit by county and bedrooms',
+         RentLimit.objects.filter(county_id=1, nb_bedrooms=2,
+            created_at__lt=at_time).order_by('-created_at')[:1]),
+        ('Application by property and status',
+         Application.objects.filter(lihtc_property_id=1,
+            status=Application.STATUS_LEASE).order_by('-created_at')),
+    ]
+
+
+def explain(queryset):
+    """
+    Returns the lines of the query plan for *queryset*.
+    """
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'sqlite':
+        statement = "EXPLAIN QUERY PLAN %s" % sql
+    else:
+        statement = "EXPLAIN %s" % sql
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        return [' '.join([str(col) for col in row])
+            for row in cursor.fetchall()]
+
+
+def uses_index(plan, table):
+    """
+    Returns `True` if *table* is only accessed through an index in *plan*
+    and the rows are returned in index order (no sort step).
+    """
+    for line in plan:
+        if connection.vendor == 'sqlite':
+            if 'SCAN' in line and table in line and 'INDEX' not in line:
+                return False
+            if 'TEMP B-TREE' in line and 'ORDER BY' in line:
+                return False
+        elif 'Seq Scan on %s' % table in line:
+            return False
+        elif line.lstrip(' ->').startswith('Sort '):
+            return False
+    return True
+
+
+class Command(BaseCommand):
+
+    help = "Prints the query plan of hot lookups and reports the ones"\
+        " that do not use an index."
+
+    requires_model_validation = False
+
+    def handle(self, *args, **options):
+        nb_failures = 0
+        for name, queryset in get_lookups():
+            plan = explain(queryset)
+            table = queryset.model._meta.db_table #pylint:disable=protected-access
+            ok = uses_index(plan, table)
+            if not ok:
+                nb_failures += 1
+            self.stdout.write("%s %s\n" % (" " if ok else "!", name))
+            for line in plan:
+                self.stdout.write("    %s\n" % line)
+        if nb_failures:
+            raise CommandError("%d lookups do not use an index in order"
+                " (on PostgreSQL, run ANALYZE on a populated database"
+                " first)" % nb_failures)
@@ -17,6 +17,7 @@ from django.utils.timezone import utc
 
 from ...models import County, RentLimit
 from ...humanize import as_money
+from ...routers import use_replica
 
 LOGGER = logging.getLogger(__name__)
 
@@ -30,6 +31,7 @@ class Command(BaseCommand):
             dest='effective', default=None,
             help='effective date.')
 
+    @use_replica()
     def handle(self, *args, **options):
         whole_dollars = False
         if options['effective']:
@@ -0,0 +1,391 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Generates synthetic properties, applications and households to reproduce
+production scale on a development database.
+
+Example:
+   python manage.py generate_synthetic_data --properties 50 \
+       --applications 2000 --household-size 6 --years 5
+
+All records are written through bulk inserts, property by property.
+The generated data is reproducible for a given ``--seed``. Each run gets
+its own slug prefix so it can be run repeatedly on the same database.
+The household income stored on the applications is an estimate.
+Run ``update_application_summaries`` to recompute it exactly.
+"""
+
+import datetime, random, uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import six
+from django.utils.timezone import utc
+
+from ...models import (Application, ApplicationResident, Answer, Asset,
+    County, Income, IncomeLimit, Property, Question, RentLimit, Resident,
+    Source)
+from ...search import rebuild_search_index
+
+
+FIRST_NAMES = ['Maria', 'James', 'Linh', 'Jose', 'Aisha', 'Robert', 'Mei',
+    'David', 'Fatima', 'Carlos', 'Emily', 'Tuan', 'Sofia', 'Michael', 'Priya',
+    'Daniel', 'Grace', 'Luis', 'Hana', 'Kevin']
+LAST_NAMES = ['Garcia', 'Nguyen', 'Smith', 'Hernandez', 'Lee', 'Johnson',
+    'Lopez', 'Kim', 'Martinez', 'Brown', 'Chen', 'Davis', 'Patel', 'Wilson',
+    'Rodriguez', 'Tran', 'Anderson', 'Flores', 'Wong', 'Taylor']
+LOCALITIES = ['Oakland', 'Fresno', 'Sacramento', 'San Jose', 'Stockton',
+    'Bakersfield', 'Riverside', 'Santa Rosa', 'Modesto', 'Salinas']
+PROPERTY_SUFFIXES = ['Apartments', 'Commons', 'Gardens', 'Village',
+    'Senior Housing', 'Terrace', 'Court', 'Place']
+
+# Per income period, hundredths of (hours or days) worked during
+# the averaging period, the averaging period and hundredths of
+# averaging periods per year.
+EMPLOYMENT_SCHEDULES = {
+    Income.HOURLY: (4000, Income.WEEKLY, 5200),
+    Income.DAILY: (500, Income.WEEKLY, 5200),
+    Income.WEEKLY: (0, Income.WEEKLY, 5200),
+    Income.BI_WEEKLY: (0, Income.BI_WEEKLY, 2600),
+    Income.SEMI_MONTHLY: (0, Income.SEMI_MONTHLY, 2400),
+    Income.MONTHLY: (0, Income.MONTHLY, 1200),
+    Income.YEARLY: (0, Income.YEARLY, 100),
+}
+
+
+class Command(BaseCommand):
+
+    help = "Generates synthetic properties, applications, households,"\
+        " incomes, assets, answers and multi-year income and rent limits."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', action='store', type=int,
+            dest='nb_properties', default=10,
+            help="number of properties to generate.")
+        parser.add_argument('--applications', action='store', type=int,
+            dest='nb_applications', default=100,
+            help="number of applications generated per property.")
+        parser.add_argument('--household-size', action='store', type=int,
+            dest='household_size', default=5,
+            help="maximum number of residents in a household.")
+        parser.add_argument('--years', action='store', type=int,
+            dest='nb_years', default=5,
+            help="number of years of applications and limits history.")
+        parser.add_argument('--batch-size', action='store', type=int,
+            dest='batch_size', default=1000,
+            help="number of records per bulk insert.")
+        parser.add_argument('--seed', action='store', type=int,
+            dest='seed', default=None,
+            help="seed for the random generator.")
+
+    def handle(self, *args, **options):
+        if options['household_size'] < 1:
+            raise CommandError("--household-size must be at least 1.")
+        generator = SyntheticDataGenerator(
+            household_size=options['household_size'],
+            nb_years=options['nb_years'],
+            batch_size=options['batch_size'],
+            seed=options['seed'])
+        if not generator.income_questions or not generator.asset_questions:
+            raise CommandError("income and asset questions are missing."\
+                " Load the default-db.json fixtures first.")
+        counties = generator.generate_counties(
+            max(1, options['nb_properties'] // 5))
+        self.stdout.write("generated %d counties with %d years of limits\n"
+            % (len(counties), options['nb_years']))
+        properties = []
+        for idx in range(0, options['nb_properties']):
+            with transaction.atomic():
+                lihtc_property = generator.generate_property(
+                    counties[idx % len(counties)])
+                nb_records = generator.generate_applications(
+                    lihtc_property, options['nb_applications'])
+            properties += [lihtc_property]
+            self.stdout.write("generated %s with %d records\n"
+                % (lihtc_property, nb_records))
+        rebuild_search_index(properties)
+
+
+class SyntheticDataGenerator(object):
+    """
+    Generates records for a single run, all prefixed by ``self.prefix``.
+    """
+
+    def __init__(self, household_size=5, nb_years=5, batch_size=1000,
+                 seed=None):
+        self.random = random.Random(seed)
+        self.household_size = household_size
+        self.nb_years = max(1, nb_years)
+        self.batch_size = batch_size
+        self.prefix = 'syn%05x' % self.random.getrandbits(20)
+        self.now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        self.income_questions = list(Question.objects.filter(
+            category=Question.INCOME).order_by('rank'))
+        self.asset_questions = list(Question.objects.filter(
+            category=Question.ASSETS).order_by('rank'))
+        self.questions = list(Question.objects.all())
+        # Cycling through all combinations such that each one is present
+        # in the generated dataset.
+        self.income_combinations = [(verified, period)
+            for verified in sorted(dict(Income.VERIFIED))
+            for period in sorted(dict(Income.PERIOD))]
+        self.asset_combinations = [(verified, category)
+            for verified in sorted(dict(Asset.VERIFIED))
+            for category in sorted(dict(Asset.CATEGORY))]
+        self.nb_incomes = 0
+        self.nb_assets = 0
+        self.nb_slugs = 0
+
+    def slug(self):
+        self.nb_slugs += 1
+        return '%s-%d' % (self.prefix, self.nb_slugs)
+
+    def full_name(self):
+        return "%s %s" % (self.random.choice(FIRST_NAMES),
+            self.random.choice(LAST_NAMES))
+
+    def bulk_create(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        return len(objs)
+
+    def by_slug(self, model, slugs, field='slug'):
+        """
+        Returns the primary keys of *model* records created through
+        a bulk insert (which does not return them on all databases).
+        """
+        pks = {}
+        slugs = list(slugs)
+        for idx in range(0, len(slugs), self.batch_size):
+            pks.update(dict(model.objects.filter(**{
+                '%s__in' % field: slugs[idx:idx + self.batch_size]
+            }).values_list(field, 'pk')))
+        return pks
+
+    def generate_counties(self, nb_counties):
+        counties = []
+        for idx in range(0, nb_counties):
+            counties += [County(fips_2010='%s%d' % (self.prefix[3:], idx),
+                name="%s County" % self.random.choice(LOCALITIES),
+                metro_area_name="Synthetic Metro Area",
+                cbsa_sub="", region='CA', is_metro=(idx % 2 == 0))]
+        self.bulk_create(County, counties)
+        counties = list(County.objects.filter(fips_2010__in=[
+            county.fips_2010 for county in counties]))
+        # Limits are published yearly, with a ~3% increase year over year.
+        income_limits = []
+        rent_limits = []
+        for county in counties:
+            median_income = self.random.randint(60000, 120000) * 100
+            for year in range(self.now.year - self.nb_years + 1,
+                              self.now.year + 1):
+                created_at = datetime.datetime(
+                    year=year, month=4, day=1, tzinfo=utc)
+                growth = 1.03 ** (year - self.now.year)
+                for family_size in range(1, 9):
+                    income_limits += [IncomeLimit(created_at=created_at,
+                        county=county, family_size=family_size,
+                        full_amount=int(median_income * growth
+                            * (0.7 + 0.1 * family_size)))]
+                for nb_bedrooms in range(0, 6):
+                    rent_limits += [RentLimit(created_at=created_at,
+                        county=county, nb_bedrooms=nb_bedrooms,
+                        full_amount=int(median_income * growth
+                            * (0.7 + 0.15 * nb_bedrooms) * 0.3 / 12))]
+        self.bulk_create(IncomeLimit, income_limits)
+        self.bulk_create(RentLimit, rent_limits)
+        return counties
+
+    def generate_property(self, county):
+        slug = self.slug()
+        locality = self.random.choice(LOCALITIES)
+        lihtc_property = Property(slug=slug, account=slug,
+            name="%s %s" % (self.random.choice(LAST_NAMES),
+                self.random.choice(PROPERTY_SUFFIXES)),
+            county=county,
+            tcac_number="CA-%d-%s" % (self.now.year, slug),
+            bin_number="CA-%s" % slug,
+            street_address="%d Main Street" % self.random.randint(1, 9999),
+            locality=locality,
+            postal_code="9%04d" % self.random.randint(0, 9999),
+            phone="555-%04d" % self.random.randint(0, 9999),
+            assessor_parcel_number="",
+            total_units=self.random.randint(20, 400))
+        lihtc_property.low_income_units = lihtc_property.total_units
+        lihtc_property.save()
+        return lihtc_property
+
+    def annual_income(self, age):
+        if age < 18 or self.random.random() < 0.15:
+            # Minors and zero income adults
+            return 0
+        return self.random.randint(5000, 90000) * 100
+
+    def generate_applications(self, lihtc_property, nb_applications):
+        """
+        Generates *nb_applications* for *lihtc_property*. Returns
+        the number of records created.
+        """
+        #pylint:disable=too-many-locals
+        applications = []
+        households = {}
+        created_ats = {}
+        nb_weeks = 52 * self.nb_years
+        for _ in range(0, nb_applications):
+            slug = self.slug()
+            created_at = (self.now - datetime.timedelta(
+                weeks=self.random.randint(0, nb_weeks))).replace(
+                hour=0, minute=0, second=0, microsecond=0)
+            ages = [self.random.randint(18, 80)] + [
+                self.random.randint(0, 60) for _ in range(
+                    1, self.random.randint(1, self.household_size))]
+            household = [(self.full_name(), age, self.annual_income(age))
+                for age in ages]
+            households[slug] = household
+            created_ats.setdefault(created_at, []).append(slug)
+            applications += [Application(slug=slug,
+                status=self.random.choice(list(dict(Application.STATUS))),
+                owner=self.prefix, lihtc_property=lihtc_property,
+                unit_number="%d" % self.random.randint(1, 400),
+                nb_bedrooms=self.random.randint(0, 4),
+                monthly_rent=self.random.randint(600, 2000) * 100,
+                head_name=household[0][0],
+                household_size=len(household),
+                annual_income=sum([member[2] for member in household]))]
+        nb_records = self.bulk_create(Application, applications)
+        # ``created_at`` is set to now on insert. We backdate applications
+        # one week at a time to spread them over the history.
+        for created_at, slugs in six.iteritems(created_ats):
+            Application.objects.filter(slug__in=slugs).update(
+                created_at=created_at, effective_date=created_at,
+                move_in_date=created_at)
+        application_pks = self.by_slug(Application, list(households))
+
+        residents = []
+        relations = []
+        annual_incomes = {}
+        for application_slug, household in six.iteritems(households):
+            for rank, (full_name, age, annual_income) in enumerate(household):
+                slug = self.slug()
+                first_name, last_name = full_name.split(' ')
+                residents += [Resident(slug=slug, full_name=full_name,
+                    first_name=first_name, last_name=last_name,
+                    date_of_birth=self.now - datetime.timedelta(
+                        days=365 * age + self.random.randint(0, 364)),
+                    marital_status=0)]
+                if rank == 0:
+                    relation_to_head = ApplicationResident.HEAD_OF_HOUSEHOLD
+                else:
+                    relation_to_head = 2 if age >= 18 else 8
+                relations += [
+                    (application_slug, slug, relation_to_head, age)]
+                annual_incomes[slug] = annual_income
+        nb_records += self.bulk_create(Resident, residents)
+        resident_pks = self.by_slug(Resident, [
+            resident.slug for resident in residents])
+        nb_records += self.bulk_create(ApplicationResident, [
+            ApplicationResident(
+                application_id=application_pks[application_slug],
+                resident_id=resident_pks[resident_slug],
+                relation_to_head=relation_to_head)
+            for application_slug, resident_slug, relation_to_head, _
+            in relations])
+        nb_records += self.generate_answers(list(resident_pks.values()))
+        nb_records += self.generate_incomes_and_assets({
+            resident_pks[resident_slug]: annual_incomes[resident_slug]
+            for _, resident_slug, _, age in relations if age >= 18})
+        return nb_records
+
+    def generate_answers(self, resident_ids):
+        return self.bulk_create(Answer, [
+            Answer(question=question, resident_id=resident_id,
+                present=(self.random.random() < 0.3))
+            for resident_id in resident_ids for question in self.questions])
+
+    def generate_incomes_and_assets(self, annual_incomes):
+        """
+        Generates incomes adding up to *annual_incomes* and assets
+        for the residents in *annual_incomes* (``{resident_id: amount}``).
+        """
+        sources = []
+        source_residents = {}
+        for resident_id, annual_income in six.iteritems(annual_incomes):
+            if not annual_income:
+                continue
+            slug = self.slug()
+            sources += [Source(slug=slug, resident_id=resident_id,
+                name="%s Inc." % self.random.choice(LAST_NAMES),
+                position="Associate", region='CA', country='US')]
+            source_residents[slug] = resident_id
+        nb_records = self.bulk_create(Source, sources)
+        source_pks = self.by_slug(Source, list(source_residents))
+
+        incomes = []
+        for source_slug, resident_id in six.iteritems(source_residents):
+            # Two verification methods per source, to exercise
+            # the greater of annualized incomes.
+            for _ in range(0, 2):
+                verified, period = self.income_combinations[
+                    self.nb_incomes % len(self.income_combinations)]
+                self.nb_incomes += 1
+                incomes += [self.make_income(resident_id,
+                    source_pks[source_slug], verified, period,
+                    int(annual_incomes[resident_id]
+                        * self.random.uniform(0.95, 1.05)))]
+        nb_records += self.bulk_create(Income, incomes)
+
+        assets = []
+        for resident_id in annual_incomes:
+            for _ in range(0, self.random.randint(0, 2)):
+                verified, category = self.asset_combinations[
+                    self.nb_assets % len(self.asset_combinations)]
+                self.nb_assets += 1
+                assets += [Asset(slug=self.slug(),
+                    question=self.random.choice(self.asset_questions),
+                    resident_id=resident_id, category=category,
+                    verified=verified,
+                    amount=self.random.randint(0, 20000) * 100,
+                    interest_rate=self.random.randint(0, 300))]
+        nb_records += self.bulk_create(Asset, assets)
+        return nb_records
+
+    def make_income(self, resident_id, source_id, verified, period,
+                    annual_income):
+        #pylint:disable=too-many-arguments
+        income = Income(group=uuid.UUID(int=self.random.getrandbits(128)).hex,
+            question=self.random.choice(self.income_questions),
+            resident_id=resident_id, source_id=source_id,
+            verified=verified, period=period)
+        if verified == Income.VERIFIED_TAX_RETURN:
+            income.period = Income.YEARLY
+            income.amount = annual_income
+            return income
+        if verified == Income.VERIFIED_PERIOD_TO_DATE:
+            # Period-to-date is computed from the number of days covered.
+            income.period = Income.OTHER
+        if (income.period == Income.OTHER
+            or verified == Income.VERIFIED_YEAR_TO_DATE):
+            # Pay-stubs covering from the start of the year (YTD)
+            # or the last month.
+            income.ends_at = self.now - datetime.timedelta(
+                days=self.random.randint(1, 60))
+            if verified == Income.VERIFIED_YEAR_TO_DATE:
+                income.starts_at = income.ends_at.replace(month=1, day=1)
+            else:
+                income.starts_at = income.ends_at - datetime.timedelta(
+                    days=29)
+        if income.period == Income.OTHER:
+            income.amount = annual_income * income.nb_days // 365
+            return income
+        period_per_avg, avg, avg_per_year = EMPLOYMENT_SCHEDULES[
+            income.period]
+        nb_periods = avg_per_year
+        if period_per_avg:
+            nb_periods = nb_periods * period_per_avg // 100
+        income.amount = annual_income * 100 // nb_periods
+        income.avg = avg
+        income.period_per_avg = period_per_avg
+        income.avg_per_year = avg_per_year
+        return income
@@ -31,6 +31,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils.timezone import utc
 
+from ...caches import bump_limits_version
 from ...models import County, IncomeLimit
 
 
@@ -63,6 +64,7 @@ class Command(BaseCommand):
                 reader = csv.reader(dataset_file)
                 with transaction.atomic():
                     self.load_max_income_levels(reader, created_at)
+        bump_limits_version()
 
 
     def load_max_income_levels(self, reader, created_at):
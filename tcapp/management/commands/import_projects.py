@@ -9,6 +9,8 @@ To import projects:
 2. Convert the MS EXCEL in CSV format
 3. Run:
    python manage.py import_projects --effective 2017-11-27 projects.csv
+
+The project search index is rebuilt once all files have been imported.
 """
 
 import csv, datetime, decimal, sys
@@ -20,6 +22,7 @@ from django.template.defaultfilters import slugify
 from django.utils.timezone import utc
 
 from ...models import County, Property, UtilityAllowance, PropertyAMIUnits
+from ...search import defer_search_index, rebuild_search_index
 
 
 class Command(BaseCommand):
@@ -46,13 +49,17 @@ class Command(BaseCommand):
             created_at = datetime.datetime.utcnow()
         created_at = created_at.replace(tzinfo=utc)
         self.stderr.write("effective at: %s\n" % created_at.isoformat())
-        for dataset_path in options['csvfiles']:
-            with open(dataset_path) as dataset_file:
-                reader = csv.reader(dataset_file)
-                with transaction.atomic():
-                    load_projects(reader, created_at,
-                        default_email=options['default_email'],
-                        output=sys.stdout)
+        # The index is rebuilt once at the end rather than on each save.
+        with defer_search_index():
+            for dataset_path in options['csvfiles']:
+                with open(dataset_path) as dataset_file:
+                    reader = csv.reader(dataset_file)
+                    with transaction.atomic():
+                        load_projects(reader, created_at,
+                            default_email=options['default_email'],
+                            output=sys.stdout)
+        nb_properties = rebuild_search_index()
+        self.stderr.write("indexed %d properties for search\n" % nb_properties)
 
 
 def read_project(row):
@@ -24,6 +24,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils.timezone import utc
 
+from ...caches import bump_limits_version
 from ...models import County, RentLimit
 
 
@@ -60,6 +61,7 @@ class Command(BaseCommand):
                 with transaction.atomic():
                     load_max_rent_levels(reader, created_at,
                         compute_limits=options['compute_limits'])
+        bump_limits_version()
 
 
 def load_max_rent_levels(reader, created_at, compute_limits=False):
@@ -0,0 +1,136 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Reports the time spent importing each module when a worker starts.
+
+The target modules are imported after ``django.setup()`` in a fresh
+interpreter in which ``__import__`` is wrapped to time the imports that
+load new modules. This works on all Python versions supported by Django,
+unlike ``python -X importtime`` (Python 3.7+). Modules are listed
+by cumulative import time, that is including the modules they import
+themselves, so the most expensive top-level imports stand out.
+The wrapper adds its own overhead to each import such that times
+are best compared with each other rather than taken as absolute values.
+"""
+
+import os, subprocess, sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+IMPORT_SCRIPT = """
+import importlib, sys
+from timeit import default_timer
+try:
+    import builtins
+except ImportError: # Python 2
+    import __builtin__ as builtins
+
+_recorded = set(sys.modules)
+# Time spent in nested imports that loaded new modules.
+_nested = [0.0]
+
+def _timed(func):
+    def _timed_import(name, *args, **kwargs):
+        fromlist = args[2] if len(args) > 2 else kwargs.get('fromlist')
+        if name in sys.modules and not fromlist:
+            return func(name, *args, **kwargs)
+        before = set(sys.modules)
+        outer = _nested[0]
+        _nested[0] = 0.0
+        started_at = default_timer()
+        try:
+            return func(name, *args, **kwargs)
+        finally:
+            elapsed = default_timer() - started_at
+            loaded = [module for module in sys.modules
+                if module not in before and module not in _recorded
+                and sys.modules[module] is not None]
+            if loaded:
+                _recorded.update(loaded)
+                # relative imports load `package.name`.
+                candidates = [module for module in loaded
+                    if module == name or module.endswith('.' + name)]
+                sys.stderr.write("import time: %%9d | %%10d | %%s\\n" %% (
+                    int((elapsed - _nested[0]) * 1000000),
+                    int(elapsed * 1000000),
+                    min(candidates or loaded, key=len)))
+                _nested[0] = outer + elapsed
+            else:
+                _nested[0] = outer + _nested[0]
+    return _timed_import
+
+builtins.__import__ = _timed(builtins.__import__)
+# Django loads apps and urlconfs through `import_module`.
+importlib.import_module = _timed(importlib.import_module)
+
+import django
+django.setup()
+import %(modules)s
+"""
+
+
+def parse_importtime(output):
+    """
+    Returns a list of (module, self time in us, cumulative time in us)
+    from the output of ``IMPORT_SCRIPT`` (same format as
+    ``python -X importtime``).
+    """
+    results = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            self_time = int(fields[0])
+            cumulative = int(fields[1])
+        except ValueError:
+            # header line
+            continue
+        results += [(fields[2].strip(), self_time, cumulative)]
+    return results
+
+
+class Command(BaseCommand):
+
+    help = "Reports per-module import times at worker startup."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', metavar='module', nargs='*',
+            default=['tcapp.urls', 'tcapp.wsgi'],
+            help="modules to import (defaults to urls and wsgi)")
+        parser.add_argument('--limit', action='store', type=int,
+            dest='limit', default=30,
+            help="number of modules to report.")
+        parser.add_argument('--prefix', action='store',
+            dest='prefix', default=None,
+            help="only report modules starting with prefix (ex: tcapp).")
+
+    def handle(self, *args, **options):
+        cmdline = [sys.executable, '-c',
+            IMPORT_SCRIPT % {'modules': ', '.join(options['modules'])}]
+        process = subprocess.Popen(cmdline, env=os.environ.copy(),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = process.communicate()
+        stderr = stderr.decode('utf-8', 'replace')
+        if process.returncode != 0:
+            raise CommandError("cannot import %s:\n%s" % (
+                ', '.join(options['modules']), stderr[-2000:]))
+        results = parse_importtime(stderr)
+        if options['prefix']:
+            results = [result for result in results
+                if result[0].startswith(options['prefix'])]
+        total = max([result[2] for result in results] or [0])
+        self.stdout.write("%-50s %10s %10s\n" % (
+            'module', 'self (ms)', 'cumul (ms)'))
+        for module, self_time, cumulative in sorted(results,
+                key=lambda result: result[2], reverse=True)[:options['limit']]:
+            self.stdout.write("%-50s %10.1f %10.1f\n" % (
+                module, self_time / 1000.0, cumulative / 1000.0))
+        self.stdout.write("%d modules imported, %.1fms for the slowest"\
+            " top-level import.\n" % (len(results), total / 1000.0))
@@ -0,0 +1,72 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Links documents uploaded before blobs were introduced to a ``DocumentBlob``.
+
+Keys of those documents look like ``<application-slug>/<sha256><ext>``,
+so the digest is read from the document URL. All documents with the same
+digest are linked to the same blob, stored at the key of the first one.
+Documents whose URL does not embed a digest are left untouched.
+"""
+
+import posixpath, re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...blobs import create_blob, get_blobs
+from ...models import UploadedDocument
+from ...signed_urls import parse_location
+
+#pylint:disable=no-name-in-module,import-error
+from django.utils.six.moves.urllib.parse import urlparse
+
+
+DIGEST_RE = re.compile(r'^([0-9a-f]{64})(\.\w+)?$')
+
+
+def get_storage_key(url):
+    path = urlparse(url).path
+    if settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
+        return path[len(settings.MEDIA_URL):]
+    return parse_location(url)[1]
+
+
+class Command(BaseCommand):
+
+    help = "Links existing documents to content-addressed blobs."
+
+    requires_model_validation = False
+
+    def handle(self, *args, **options):
+        by_digests = {}
+        for document in UploadedDocument.objects.filter(
+                blob__isnull=True).only('pk', 'url').iterator():
+            look = DIGEST_RE.match(posixpath.basename(urlparse(
+                document.url).path))
+            if look:
+                by_digests.setdefault(look.group(1), []).append(document)
+        blobs = get_blobs(list(by_digests.keys()))
+        nb_documents = 0
+        for digest, documents in by_digests.items():
+            with transaction.atomic():
+                blob = blobs.get(digest)
+                if blob is None:
+                    storage_key = get_storage_key(documents[0].url)
+                    try:
+                        size = default_storage.size(storage_key)
+                    except Exception: #pylint:disable=broad-except
+                        size = 0
+                    blob = create_blob(digest, storage_key, size, storage_key)
+                UploadedDocument.objects.filter(
+                    pk__in=[document.pk for document in documents]).update(
+                    blob=blob)
+                blob.refcount = UploadedDocument.objects.filter(
+                    blob=blob).count()
+                blob.save(update_fields=['refcount'])
+            nb_documents += len(documents)
+        self.stdout.write("linked %d documents to %d blobs\n" % (
+            nb_documents, len(by_digests)))
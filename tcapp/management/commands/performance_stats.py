@@ -0,0 +1,55 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Prints the performance aggregates recorded by
+``tcapp.middleware.RequestPerformanceMiddleware`` on sampled requests.
+
+The aggregates are stored in the cache. They are only shared
+between processes when ``CACHES`` is a shared backend (ex: memcached).
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from ...middleware import clear_stats, get_stats
+
+
+class Command(BaseCommand):
+
+    help = "Prints average wall time, SQL queries, PDF rendering time"\
+        " and response size per view, for sampled requests."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true',
+            dest='json', default=False,
+            help="print aggregates as JSON.")
+        parser.add_argument('--clear', action='store_true',
+            dest='clear', default=False,
+            help="reset aggregates after printing them.")
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2) + "\n")
+        else:
+            self.stdout.write("%-45s %8s %10s %10s %8s %8s %8s %10s\n" % (
+                'view', 'requests', 'avg (ms)', 'max (ms)', 'queries',
+                'dups', 'pdf (ms)', 'size'))
+            for view_name, values in sorted(stats.items(),
+                    key=lambda item: -item[1]['wall_duration_ms']):
+                nb_requests = values['nb_requests'] or 1
+                self.stdout.write(
+                    "%-45s %8d %10d %10d %8.1f %8.1f %8d %10d\n" % (
+                    view_name[:45], values['nb_requests'],
+                    values['wall_duration_ms'] // nb_requests,
+                    values['max_wall_duration_ms'],
+                    float(values['nb_queries']) / nb_requests,
+                    float(values['nb_duplicate_queries']) / nb_requests,
+                    values['pdf_duration_ms'] // nb_requests,
+                    values['response_size'] // nb_requests))
+        if options['clear']:
+            clear_stats()
@@ -0,0 +1,35 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Rebuilds the in-app search index of properties (see ``tcapp.search``).
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...models import Property
+from ...search import rebuild_search_index
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = "Rebuilds the search terms of properties."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('properties', metavar='properties', nargs='*',
+            help="properties to index (defaults to all).")
+
+    def handle(self, *args, **options):
+        properties = None
+        if options['properties']:
+            properties = Property.objects.filter(
+                slug__in=options['properties'])
+        nb_properties = rebuild_search_index(properties)
+        self.stdout.write("indexed %d properties\n" % nb_properties)
@@ -0,0 +1,70 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Records the households due for their annual recertification
+in the ``Recertification`` worklist, along with their income
+and the 140% limit, and optionally creates the recertification
+applications.
+"""
+
+import datetime, logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from ...models import Application
+from ...recertifications import RECERTIFICATION_WINDOW, sweep
+from ...utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = "Finds households due for recertification and evaluates"\
+        " the 140% rule."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('properties', metavar='properties', nargs='*',
+            help="properties to sweep (defaults to all).")
+        parser.add_argument('--at', action='store', dest='at_time',
+            default=None, help="start of the window (defaults to now).")
+        parser.add_argument('--days', action='store', type=int,
+            dest='days', default=RECERTIFICATION_WINDOW.days,
+            help="number of days in the window.")
+        parser.add_argument('--clone', action='store_true',
+            dest='clone', default=False,
+            help="create the recertification applications.")
+
+    def handle(self, *args, **options):
+        start_at = None
+        if options['at_time']:
+            start_at = parse_datetime(options['at_time'])
+            if start_at is None:
+                raise CommandError(
+                    "invalid date/time '%s'" % options['at_time'])
+        start_at = datetime_or_now(start_at)
+        ends_at = start_at + datetime.timedelta(days=options['days'])
+        queryset = Application.objects.all()
+        if options['properties']:
+            queryset = queryset.filter(
+                lihtc_property__slug__in=options['properties'])
+        recertifications = sweep(queryset, start_at=start_at,
+            ends_at=ends_at, clone=options['clone'])
+        over_140 = [recertification
+            for recertification in recertifications
+            if not recertification.is_eligible_140]
+        for recertification in over_140:
+            self.stdout.write("%s due %s: %d over 140%% limit %d\n" % (
+                recertification.application_id,
+                recertification.due_date.date(),
+                recertification.annual_income,
+                recertification.income_limit_140))
+        self.stdout.write("%d households due between %s and %s,"\
+            " %d over the 140%% limit%s\n" % (len(recertifications),
+            start_at.date(), ends_at.date(), len(over_140),
+            " (cloned)" if options['clone'] else ""))
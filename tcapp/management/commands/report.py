@@ -9,9 +9,10 @@ import logging
 
 from django.core.management.base import BaseCommand
 
-from ...humanize import as_money
+from ...annualize import applications_total_income
+from ...humanize import DATETIME_FORMAT, as_money
 from ...models import Application
-from ...views.verification import DATETIME_FORMAT
+from ...routers import use_replica
 
 
 LOGGER = logging.getLogger(__name__)
@@ -27,13 +28,16 @@ class Command(BaseCommand):
         parser.add_argument('properties', metavar='properties', nargs='+',
             help="properties to run reports against.")
 
+    @use_replica()
     def handle(self, *args, **options):
         for lihtc_property in options['properties']:
             self.stdout.write("Created at\tFull name\tFamily size"\
                 "\tAnnual income\tIncome limit 60% AMI\tIncome limit 50% AMI\t"\
                 "status\n")
-            for application in Application.objects.filter(
-                    lihtc_property__slug=lihtc_property):
+            applications = Application.objects.filter(
+                lihtc_property__slug=lihtc_property)
+            total_incomes = applications_total_income(applications)
+            for application in applications:
                 limit = application.lihtc_property.county.income_limits.filter(
                     family_size=application.family_size,
                     created_at__lt=application.effective_date).order_by(
@@ -43,7 +47,8 @@ class Command(BaseCommand):
                     application.created_at.strftime(DATETIME_FORMAT),
                     application.printable_name,
                     application.family_size,
-                    as_money(application.total_annual_income,
+                    as_money(total_incomes.get(application.pk, 0)
+                        + application.total_income_from_assets,
                         whole_dollars=True),
                     as_money(limit.sixty_percent, whole_dollars=True),
                     as_money(limit.fifty_percent, whole_dollars=True),
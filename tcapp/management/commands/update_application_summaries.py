@@ -0,0 +1,41 @@
+# Copyright (c) 2018, TeaCapp LLC
+# All rights reserved.
+
+"""
+Recomputes the denormalized household summary of applications.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import Application
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = "Recomputes the head of household name, household size"\
+        " and annual income stored on applications."
+
+    requires_model_validation = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('properties', metavar='properties', nargs='*',
+            help="properties to update (defaults to all).")
+
+    def handle(self, *args, **options):
+        queryset = Application.objects.all().select_related(
+            'lihtc_property__county')
+        if options['properties']:
+            queryset = queryset.filter(
+                lihtc_property__slug__in=options['properties'])
+        nb_applications = 0
+        with transaction.atomic():
+            for application in queryset:
+                application.update_summary()
+                nb_applications += 1
+        self.stdout.write("updated %d applications\n" % nb_applications)
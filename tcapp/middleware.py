@@ -0,0 +1,191 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Request-level performance instrumentation.
+
+``RequestPerformanceMiddleware`` records for each request the wall time,
+the time spent rendering PDFs (see ``record_duration``) and the size of
+the response. On a sample of requests (``PERFORMANCE_SAMPLE_RATE``),
+it also records the number of SQL queries, the time spent in them,
+and the fingerprints of queries executed more than once (a sign
+of an N+1 query pattern).
+
+Measures are emitted as structured fields of a log record on the
+``tcapp.performance`` logger. Aggregates per view for sampled requests
+are kept in the cache and printed by the ``performance_stats`` command.
+The middleware is switched on through ``PERFORMANCE_INSTRUMENTATION``.
+"""
+from __future__ import unicode_literals
+
+import hashlib, logging, random, re
+from timeit import default_timer
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+
+LOGGER = logging.getLogger('tcapp.performance')
+
+PERFORMANCE_INSTRUMENTATION = getattr(
+    settings, 'PERFORMANCE_INSTRUMENTATION', False)
+PERFORMANCE_SAMPLE_RATE = getattr(settings, 'PERFORMANCE_SAMPLE_RATE', 0.1)
+PERFORMANCE_STATS_TIMEOUT = getattr(
+    settings, 'PERFORMANCE_STATS_TIMEOUT', 7 * 24 * 3600)
+
+STATS_VIEWS_KEY = 'performance-views'
+STATS_FIELDS = ('nb_requests', 'wall_duration_ms', 'max_wall_duration_ms',
+    'nb_queries', 'queries_duration_ms', 'nb_duplicate_queries',
+    'pdf_duration_ms', 'response_size')
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'IN \((?:\?, )*\?\)')
+
+
+def fingerprint(sql):
+    """
+    Returns the *sql* statement with all literals replaced by '?', such
+    that the same query with different parameters has the same fingerprint.
+    """
+    sql = _STRING_LITERAL_RE.sub('?', sql)
+    sql = _NUMBER_LITERAL_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def record_duration(request, name, seconds):
+    """
+    Adds *seconds* to the duration *name* (ex: 'pdf_duration')
+    recorded for *request*.
+    """
+    durations = getattr(request, '_performance_durations', None)
+    if durations is not None:
+        durations[name] = durations.get(name, 0) + seconds
+
+
+def get_stats_key(view_name, field):
+    return 'performance-%s-%s' % (
+        hashlib.md5(view_name.encode('utf-8')).hexdigest(), field)
+
+
+def update_stats(view_name, measures):
+    """
+    Adds the *measures* of a sampled request to the aggregates for
+    *view_name*.
+    """
+    views = cache.get(STATS_VIEWS_KEY) or set([])
+    if view_name not in views:
+        views.add(view_name)
+        cache.set(STATS_VIEWS_KEY, views, PERFORMANCE_STATS_TIMEOUT)
+    wall_duration_ms = int(measures['wall_duration'] * 1000)
+    increments = {
+        'nb_requests': 1,
+        'wall_duration_ms': wall_duration_ms,
+        'nb_queries': measures.get('nb_queries', 0),
+        'queries_duration_ms': int(
+            measures.get('queries_duration', 0) * 1000),
+        'nb_duplicate_queries': measures.get('nb_duplicate_queries', 0),
+        'pdf_duration_ms': int(measures.get('pdf_duration', 0) * 1000),
+        'response_size': measures.get('response_size', 0),
+    }
+    for field, increment in increments.items():
+        key = get_stats_key(view_name, field)
+        # ``add`` is a no-op when the key exists, then ``incr`` is atomic
+        # on shared caches (ex: memcached).
+        cache.add(key, 0, PERFORMANCE_STATS_TIMEOUT)
+        try:
+            cache.incr(key, increment)
+        except ValueError:
+            # The key expired between ``add`` and ``incr``.
+            cache.set(key, increment, PERFORMANCE_STATS_TIMEOUT)
+    key = get_stats_key(view_name, 'max_wall_duration_ms')
+    if wall_duration_ms > (cache.get(key) or 0):
+        cache.set(key, wall_duration_ms, PERFORMANCE_STATS_TIMEOUT)
+
+
+def get_stats():
+    """
+    Returns the aggregates recorded for sampled requests, keyed by view.
+    """
+    stats = {}
+    for view_name in sorted(cache.get(STATS_VIEWS_KEY) or []):
+        values = cache.get_many([get_stats_key(view_name, field)
+            for field in STATS_FIELDS])
+        stats[view_name] = {field: values.get(
+            get_stats_key(view_name, field), 0) for field in STATS_FIELDS}
+    return stats
+
+
+def clear_stats():
+    keys = [STATS_VIEWS_KEY]
+    for view_name in cache.get(STATS_VIEWS_KEY) or []:
+        keys += [get_stats_key(view_name, field) for field in STATS_FIELDS]
+    cache.delete_many(keys)
+
+
+class RequestPerformanceMiddleware(object):
+    """
+    Records wall time, SQL queries, PDF rendering time and response size
+    of requests.
+    """
+
+    def process_request(self, request):
+        if not PERFORMANCE_INSTRUMENTATION:
+            return None
+        #pylint:disable=protected-access
+        request._performance_durations = {}
+        request._performance_sampled = (
+            random.random() < PERFORMANCE_SAMPLE_RATE)
+        if request._performance_sampled:
+            request._performance_force_debug_cursor = (
+                connection.force_debug_cursor)
+            request._performance_nb_queries = len(connection.queries_log)
+            connection.force_debug_cursor = True
+        request._performance_started_at = default_timer()
+        return None
+
+    def process_response(self, request, response):
+        #pylint:disable=protected-access
+        started_at = getattr(request, '_performance_started_at', None)
+        if started_at is None:
+            return response
+        measures = {'wall_duration': default_timer() - started_at}
+        measures.update(request._performance_durations)
+        if not response.streaming:
+            measures['response_size'] = len(response.content)
+        if request._performance_sampled:
+            connection.force_debug_cursor = (
+                request._performance_force_debug_cursor)
+            queries = list(connection.queries_log)[
+                request._performance_nb_queries:]
+            measures['nb_queries'] = len(queries)
+            measures['queries_duration'] = sum(
+                [float(query['time']) for query in queries])
+            counts = {}
+            for query in queries:
+                key = fingerprint(query['sql'])
+                counts[key] = counts.get(key, 0) + 1
+            duplicates = sorted([(count, key)
+                for key, count in counts.items() if count > 1], reverse=True)
+            measures['nb_duplicate_queries'] = sum(
+                [count - 1 for count, _ in duplicates])
+            measures['duplicate_queries'] = [
+                {'fingerprint': hashlib.md5(
+                    key.encode('utf-8')).hexdigest()[:12],
+                 'count': count, 'sql': key[:200]}
+                for count, key in duplicates[:5]]
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = (resolver_match.view_name
+            if resolver_match is not None else request.path)
+        extra = {'request': request, 'view_name': view_name,
+            'status_code': response.status_code}
+        extra.update(measures)
+        LOGGER.info("%s %s %.3fs", request.method, request.path,
+            measures['wall_duration'], extra=extra)
+        if request._performance_sampled:
+            try:
+                update_stats(view_name, measures)
+            except Exception as err: #pylint:disable=broad-except
+                # Instrumentation must never break a request.
+                LOGGER.warning("cannot update performance stats: %s", err)
+        return response
@@ -2,13 +2,17 @@
 #   All rights reserved.
 from __future__ import unicode_literals
 
-import json
+import calendar, hashlib, json
 
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
+from django.http import HttpResponseNotModified
 from django.shortcuts import get_object_or_404
 from django.utils import six
+from django.utils.cache import patch_cache_control
 from django.utils.dateparse import parse_datetime
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+    quote_etag)
 from deployutils.apps.django.redirects import redirect_or_denied
 from deployutils.apps.django import mixins as deployutils_mixins
 from deployutils.apps.django.templatetags.deployutils_prefixtags import (
@@ -126,6 +130,72 @@ class ApplicationMixin(ApplicationBaseMixin):
         return super(ApplicationMixin, self).dispatch(*args, **kwargs)
 
 
+class ConditionalGetMixin(object):
+    """
+    Adds ETag and Last-Modified validators to GET responses, and answers
+    304 Not Modified, without rendering the response, when the validators
+    sent by the client still match.
+
+    By default, validators are derived from ``application.updated_at``.
+    Views whose response depends on more than the application override
+    ``get_etag_key``. Views call ``get_not_modified_response`` before doing
+    any work, then ``set_validators`` on the response.
+    """
+
+    def get_last_modified(self):
+        application = self.application
+        return application.updated_at if application else None
+
+    def get_etag_key(self):
+        """
+        Returns a string which changes whenever the response would.
+        """
+        last_modified = self.get_last_modified()
+        return '%s|%s|%s' % (self.request.path,
+            self.request.META.get('HTTP_ACCEPT', ''),
+            last_modified.isoformat() if last_modified else '')
+
+    def get_validators(self):
+        if not hasattr(self, '_validators'):
+            self._validators = (
+                hashlib.md5(self.get_etag_key().encode('utf-8')).hexdigest(),
+                self.get_last_modified())
+        return self._validators
+
+    def set_validators(self, response):
+        etag, last_modified = self.get_validators()
+        if response.status_code in (200, 304):
+            response['ETag'] = quote_etag(etag)
+            if last_modified:
+                response['Last-Modified'] = http_date(
+                    calendar.timegm(last_modified.utctimetuple()))
+        # Browsers must revalidate instead of using heuristic freshness.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_not_modified_response(self, request):
+        """
+        Returns a 304 Not Modified response if the client copy
+        is up-to-date, otherwise `None`.
+        """
+        etag, last_modified = self.get_validators()
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # If-None-Match takes precedence over If-Modified-Since.
+            etags = parse_etags(if_none_match)
+            if etag not in etags and '*' not in etags:
+                return None
+        else:
+            if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+            if_modified_since = (parse_http_date_safe(if_modified_since)
+                if if_modified_since else None)
+            if not (if_modified_since and last_modified
+                and calendar.timegm(last_modified.utctimetuple())
+                    <= if_modified_since):
+                return None
+        return self.set_validators(HttpResponseNotModified())
+
+
 class PropertyMixin(ManagerMixin):
 
     model = Property
@@ -85,6 +85,9 @@ class RentLimit(models.Model):
 
     class Meta:
         unique_together = ('created_at', 'county', 'nb_bedrooms')
+        # Latest limit for a number of bedrooms in a county
+        # (``filter(county, nb_bedrooms).order_by('-created_at')``).
+        index_together = ('county', 'nb_bedrooms', 'created_at')
 
     def __str__(self):
         return "%s_%s_%d" % (
@@ -159,6 +162,9 @@ class IncomeLimit(models.Model):
 
     class Meta:
         unique_together = ('created_at', 'county', 'family_size')
+        # Latest limit for a family size in a county
+        # (``filter(county, family_size).order_by('-created_at')``).
+        index_together = ('county', 'family_size', 'created_at')
 
     def __str__(self):
         return "%s_%s_%d" % (
@@ -255,6 +261,44 @@ class Property(models.Model):
         return self.name
 
 
+@python_2_unicode_compatible
+class PropertySearchTerm(models.Model):
+    """
+    Normalized term used to look up a ``Property`` by TCAC number,
+    name or locality (see ``tcapp.search``).
+    """
+    KIND_WORD = 1
+    KIND_PREFIX = 2
+    KIND_TRIGRAM = 3
+
+    KIND = (
+        (KIND_WORD, "word"),
+        (KIND_PREFIX, "prefix"),
+        (KIND_TRIGRAM, "trigram"),
+    )
+
+    FIELD_TCAC_NUMBER = 1
+    FIELD_NAME = 2
+    FIELD_LOCALITY = 3
+
+    FIELD = (
+        (FIELD_TCAC_NUMBER, "tcac_number"),
+        (FIELD_NAME, "name"),
+        (FIELD_LOCALITY, "locality"),
+    )
+
+    term = models.CharField(max_length=50, db_index=True)
+    kind = models.PositiveSmallIntegerField(choices=KIND)
+    field = models.PositiveSmallIntegerField(choices=FIELD)
+    lihtc_property = models.ForeignKey(Property, related_name='search_terms')
+
+    class Meta:
+        unique_together = ('term', 'kind', 'field', 'lihtc_property')
+
+    def __str__(self):
+        return '%s<%s>' % (self.term, self.lihtc_property_id)
+
+
 @python_2_unicode_compatible
 class PropertyAMIUnits(models.Model):
     """
@@ -335,6 +379,9 @@ class Application(models.Model):
         (0, "0. Missing"))
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also updated when a resident, income, asset, answer or document
+    # of the household changes (see ``tcapp.signals``).
+    updated_at = models.DateTimeField(auto_now=True)
     slug = models.SlugField(unique=True)
     status = models.PositiveSmallIntegerField(choices=STATUS, default=0)
     owner = models.SlugField() # user
@@ -386,6 +433,21 @@ class Application(models.Model):
     applicants = models.ManyToManyField('tcapp.Resident',
         related_name='applications', through='tcapp.ApplicationResident')
 
+    # Household summary denormalized from the residents and their income
+    # such that lists of applications can be searched and sorted in SQL.
+    # (see ``update_summary``)
+    head_name = models.CharField(max_length=60, db_index=True, default="",
+        blank=True)
+    household_size = models.PositiveSmallIntegerField(default=0,
+        db_index=True)
+    annual_income = models.BigIntegerField(default=0, db_index=True,
+        help_text='in cents')
+
+    class Meta:
+        # Applications of a property by status, most recent first
+        # (application lists, status facets and reports).
+        index_together = ('lihtc_property', 'status', 'created_at')
+
     def __str__(self):
         return self.slug
 
@@ -401,8 +463,42 @@ class Application(models.Model):
                 'relation_to_head', 'id').select_related('resident')
         return self._residents
 
+    @property
+    def applicant_residents(self):
+        """
+        ``Resident`` in the household, loaded once such that totals reuse
+        the income and assets computed for each resident.
+
+        The incomes and assets of all residents are loaded in one query each
+        (see ``Resident.income_by_source`` and ``Resident.assets_by_source``).
+        """
+        #pylint:disable=protected-access
+        if not hasattr(self, '_applicant_residents'):
+            residents = list(self.applicants.all())
+            questions = list(Question.objects.filter(
+                category=Question.INCOME).order_by('id'))
+            incomes = {}
+            for income in Income.objects.filter(
+                    resident__in=residents).select_related('source').order_by(
+                    'resident', *INCOMES_ORDER):
+                incomes.setdefault(income.resident_id, []).append(income)
+            assets = {}
+            for asset in Asset.objects.filter(
+                    resident__in=residents).select_related(
+                    'question', 'source').order_by('resident', *ASSETS_ORDER):
+                assets.setdefault(asset.resident_id, []).append(asset)
+            for resident in residents:
+                resident._income_by_source = group_income_by_source(
+                    incomes.get(resident.pk, []), questions)
+                resident._assets_by_source = group_assets_by_source(
+                    assets.get(resident.pk, []))
+            self._applicant_residents = residents
+        return self._applicant_residents
+
     @property
     def printable_name(self):
+        if self.head_name:
+            return self.head_name
         head_of_household = self.head
         if head_of_household:
             return head_of_household.printable_name
@@ -420,28 +516,28 @@ class Application(models.Model):
     @property
     def earned_income(self):
         result = 0
-        for applicant in self.applicants.all():
+        for applicant in self.applicant_residents:
             result += applicant.earned_income
         return result
 
     @property
     def social_security_and_pensions(self):
         result = 0
-        for applicant in self.applicants.all():
+        for applicant in self.applicant_residents:
             result += applicant.social_security_and_pensions
         return result
 
     @property
     def public_assistance(self):
         result = 0
-        for applicant in self.applicants.all():
+        for applicant in self.applicant_residents:
             result += applicant.public_assistance
         return result
 
     @property
     def other_income(self):
         result = 0
-        for applicant in self.applicants.all():
+        for applicant in self.applicant_residents:
             result += applicant.other_income
         return result
 
@@ -455,7 +551,7 @@ class Application(models.Model):
     @property
     def cash_value_of_assets(self):
         result = 0
-        for applicant in self.applicants.all():
+        for applicant in self.applicant_residents:
             result += applicant.cash_value_of_assets
         return result
 
@@ -466,7 +562,7 @@ class Application(models.Model):
     @property
     def annual_income_from_assets(self):
         result = 0
-        for applicant in self.applicants.all():
+        for applicant in self.applicant_residents:
             result += applicant.annual_income_from_assets
         return result
 
@@ -605,6 +701,29 @@ class Application(models.Model):
                 - Question.STUDENT_EXPLANATION[0] + 1]
         return result
 
+    def update_summary(self):
+        """
+        Recomputes the denormalized ``head_name``, ``household_size``
+        and ``annual_income``.
+        """
+        head_of_household = self.head
+        if head_of_household:
+            head_name = head_of_household.printable_name[:60]
+        else:
+            head_name = ""
+        household_size = self.family_size
+        annual_income = self.total_annual_income
+        if (head_name != self.head_name
+            or household_size != self.household_size
+            or annual_income != self.annual_income):
+            self.head_name = head_name
+            self.household_size = household_size
+            self.annual_income = annual_income
+            # We use ``update`` so no ``post_save`` signal is triggered.
+            Application.objects.filter(pk=self.pk).update(
+                head_name=head_name, household_size=household_size,
+                annual_income=annual_income)
+
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
         if not self.slug:
@@ -667,6 +786,7 @@ class Resident(models.Model):
     ]
 
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
     # Part II Household Composition
     # The ``full_name`` is as entered by the resident. ``first_name``,
     # ``last_name`` and ``middle_initial`` are derived from the ``full_name``
@@ -738,12 +858,18 @@ class Resident(models.Model):
 
     @property
     def full_time_student(self):
-        #pylint:disable=no-member
-        result = False
-        for student_answer in Answer.objects.filter(
-                resident=self, question__in=Question.FULL_TIME_STUDENT):
-            result |= student_answer.present
-        return result
+        return self.has_answered_yes(Question.FULL_TIME_STUDENT)
+
+    def has_answered_yes(self, questions):
+        """
+        Returns ``True`` if the resident has answered "Yes" to any
+        of *questions*. All answers are loaded in a single query.
+        """
+        if not hasattr(self, '_present_question_ids'):
+            self._present_question_ids = set(Answer.objects.filter(
+                resident=self, present=True).values_list(
+                'question_id', flat=True))
+        return bool(self._present_question_ids & set(questions))
 
     @property
     def printable_name(self):
@@ -765,46 +891,27 @@ class Resident(models.Model):
     def assets_by_source(self):
         """
         Returns a dictionnary by source, by verification type of ``Asset``.
+        The result is computed once per instance and must not be modified.
         """
-        group_by = {}
-        for asset in Asset.objects.filter(resident=self).order_by(
-                'question', 'source', 'category', 'verified'):
-            # If not source, make one up.
-            source = asset.source if asset.source else 'no-source'
-            if source not in group_by:
-                group_by[source] = {}
-            if asset.category not in group_by[source]:
-                group_by[source][asset.category] = []
-            group_by[source][asset.category] += [asset]
-        return group_by
+        if not hasattr(self, '_assets_by_source'):
+            self._assets_by_source = group_assets_by_source(
+                Asset.objects.filter(resident=self).select_related(
+                'question', 'source').order_by(*ASSETS_ORDER))
+        return self._assets_by_source
 
     def income_by_source(self):
         """
         Returns a dictionnary by questions, by source, by verification type
         of ``Income``.
+        The result is computed once per instance and must not be modified.
         """
-        group_by = {}
-        income_iter = Income.objects.filter(resident=self).order_by(
-            'question', 'source', 'verified').iterator()
-        questions = Question.objects.filter(category=Question.INCOME).order_by(
-            'id')
-        for question in questions:
-            group_by[question] = {}
-        try:
-            income = next(income_iter)
-            for question in group_by:
-                while income.question_id <= question.id:
-                    # If not source, make one up.
-                    source = income.source if income.source else 'no-source'
-                    if source not in group_by[question]:
-                        group_by[question][source] = {}
-                    if income.verified not in group_by[question][source]:
-                        group_by[question][source][income.verified] = []
-                    group_by[question][source][income.verified] += [income]
-                    income = next(income_iter)
-        except StopIteration:
-            pass
-        return group_by
+        if not hasattr(self, '_income_by_source'):
+            self._income_by_source = group_income_by_source(
+                Income.objects.filter(resident=self).select_related(
+                'source').order_by(*INCOMES_ORDER),
+                Question.objects.filter(category=Question.INCOME).order_by(
+                'id'))
+        return self._income_by_source
 
     # Part III Gross Annual Income
     @property
@@ -872,16 +979,12 @@ class Resident(models.Model):
                 if question.pk == question_id:
                     # We have to loop through the sources because of the same
                     # source can be used accross multiple questions (ex: N/A).
+                    # Lists are copied so ``income_by_source`` is unchanged.
                     for source, verifications in six.iteritems(group):
-                        if source in results:
-                            for verified, incomes in six.iteritems(
-                                    verifications):
-                                if verified in results[source]:
-                                    results[source][verified] += incomes
-                                else:
-                                    results[source].update({verified: incomes})
-                        else:
-                            results.update({source: verifications})
+                        results.setdefault(source, {})
+                        for verified, incomes in six.iteritems(verifications):
+                            results[source].setdefault(verified, [])
+                            results[source][verified] += incomes
         return sum_greater_of_annualize_income(results)
 
     # Part IV Income From Assets
@@ -932,27 +1035,21 @@ class Resident(models.Model):
         Returns ``True`` if the resident has answered "Yes"
         on the TIC Questionnaire #9
         """
-        return Answer.objects.filter(resident=self,
-            question__in=Question.INCOME_DISABILITY,
-            present=True).exists()
+        return self.has_answered_yes(Question.INCOME_DISABILITY)
 
     def is_single_parent(self):
         """
         Returns ``True`` if the resident has answered "Yes"
         on the TIC Questionnaire #32
         """
-        return Answer.objects.filter(resident=self,
-            question__in=Question.SINGLE_PARENT,
-            present=True).exists()
+        return self.has_answered_yes(Question.SINGLE_PARENT)
 
     def is_foster_care(self):
         """
         Returns ``True`` if the resident has answered "Yes"
         on the TIC Questionnaire #33.
         """
-        return Answer.objects.filter(resident=self,
-            question__in=Question.FOSTER_CARE,
-            present=True).exists()
+        return self.has_answered_yes(Question.FOSTER_CARE)
 
     def employee_sources(self):
         """
@@ -1339,8 +1436,13 @@ class Asset(models.Model):
 
     # for audits
     descr = models.TextField(default="", blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 #XXX    author = models.ForeignKey(settings.AUTH_USER_MODEL)
 
+    class Meta:
+        # Assets of a resident declared in answer to a question.
+        index_together = ('resident', 'question')
+
     def __str__(self):
         return self.slug
 
@@ -1515,8 +1617,14 @@ class Income(models.Model):
 
     # for audits
     descr = models.TextField(default="", blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 #XXX    author = models.ForeignKey(settings.AUTH_USER_MODEL)
 
+    class Meta:
+        # Incomes of a resident grouped by (question, source, verified)
+        # (``filter(resident).order_by('question', 'source', 'verified')``).
+        index_together = ('resident', 'question', 'source', 'verified')
+
     def __str__(self):
         return self.group
 
@@ -1651,6 +1759,29 @@ class Income(models.Model):
         return "%.2f %s" % (avg_per_year, noum)
 
 
+@python_2_unicode_compatible
+class DocumentBlob(models.Model):
+    """
+    Content of uploaded documents, stored once no matter how many
+    applications it is attached to (see ``tcapp.blobs``).
+
+    ``refcount`` is the number of ``UploadedDocument`` pointing
+    to the blob. Blobs no longer referenced are deleted from storage
+    by the ``collect_blobs`` command.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last time an upload looked up the blob or its refcount changed.
+    last_used_at = models.DateTimeField(auto_now_add=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+    storage_key = models.CharField(max_length=1024)
+    refcount = models.PositiveIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return self.sha256
+
+
 @python_2_unicode_compatible
 class UploadedDocument(models.Model):
     """
@@ -1718,6 +1849,8 @@ class UploadedDocument(models.Model):
     url = models.URLField()
     category = models.PositiveSmallIntegerField(choices=CATEGORY)
     source = models.ForeignKey(Source, null=True)
+    blob = models.ForeignKey(DocumentBlob, null=True,
+        related_name='documents')
 
     def __str__(self):
         return self.url
@@ -1729,6 +1862,66 @@ class UploadedDocument(models.Model):
         return self.created_at.strftime("%Y-%m-%d")
 
 
+@python_2_unicode_compatible
+class OutboxMessage(models.Model):
+    """
+    Notification recorded in the same transaction as the event that
+    triggered it, and sent later on by ``tcapp.outbox.dispatch_outbox``.
+
+    Messages outlive the application they refer to so that notices
+    for deleted applications are discarded and kept as a record.
+    """
+    APPLICATION_CREATED = 'application_created'
+
+    EVENT = (
+        (APPLICATION_CREATED, "Application created"),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    event = models.SlugField(choices=EVENT)
+    application = models.ForeignKey(Application, null=True,
+        on_delete=models.SET_NULL, related_name='outbox_messages')
+    url = models.URLField(max_length=1024, blank=True)
+    nb_attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(db_index=True)
+    sent_at = models.DateTimeField(null=True, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return "%s-%d" % (self.event, self.pk)
+
+
+@python_2_unicode_compatible
+class Recertification(models.Model):
+    """
+    Household due for its annual recertification, as found
+    by ``tcapp.recertifications.sweep``, with the income and the 140%
+    limit computed at the time.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    lihtc_property = models.ForeignKey(Property)
+    application = models.ForeignKey(Application,
+        related_name='recertifications')
+    due_date = models.DateTimeField()
+    family_size = models.PositiveSmallIntegerField(default=0)
+    annual_income = models.BigIntegerField(default=0, help_text='in cents')
+    income_restriction = models.PositiveSmallIntegerField(default=0)
+    income_limit = models.BigIntegerField(default=0, help_text='in cents')
+    income_limit_140 = models.BigIntegerField(default=0, help_text='in cents')
+    is_eligible_140 = models.BooleanField(default=False)
+    # Application created to recertify the household, if any.
+    recertified_by = models.ForeignKey(Application, null=True,
+        related_name='+')
+
+    class Meta:
+        unique_together = ('application', 'due_date')
+        # Worklist of a property, by due date.
+        index_together = ('lihtc_property', 'due_date')
+
+    def __str__(self):
+        return "%s-%s" % (self.application, self.due_date.date())
+
+
 def annualize_income_employer(incomes):
     annual_income = 0
     for income in incomes:
@@ -1831,6 +2024,55 @@ def sum_greater_of_annualize_income(verif_by_sources):
     return result
 
 
+# Order in which ``group_income_by_source`` and ``group_assets_by_source``
+# expect the records of a resident.
+INCOMES_ORDER = ('question', 'source', 'verified')
+ASSETS_ORDER = ('question', 'source', 'category', 'verified')
+
+
+def group_income_by_source(incomes, questions):
+    """
+    Returns a dictionnary by *questions*, by source, by verification type
+    of *incomes* (ordered by ``INCOMES_ORDER``).
+    """
+    group_by = {}
+    income_iter = iter(incomes)
+    for question in questions:
+        group_by[question] = {}
+    try:
+        income = next(income_iter)
+        for question in group_by:
+            while income.question_id <= question.id:
+                # If not source, make one up.
+                source = income.source if income.source else 'no-source'
+                if source not in group_by[question]:
+                    group_by[question][source] = {}
+                if income.verified not in group_by[question][source]:
+                    group_by[question][source][income.verified] = []
+                group_by[question][source][income.verified] += [income]
+                income = next(income_iter)
+    except StopIteration:
+        pass
+    return group_by
+
+
+def group_assets_by_source(assets):
+    """
+    Returns a dictionnary by source, by category of *assets*
+    (ordered by ``ASSETS_ORDER``).
+    """
+    group_by = {}
+    for asset in assets:
+        # If not source, make one up.
+        source = asset.source if asset.source else 'no-source'
+        if source not in group_by:
+            group_by[source] = {}
+        if asset.category not in group_by[source]:
+            group_by[source][asset.category] = []
+        group_by[source][asset.category] += [asset]
+    return group_by
+
+
 def greater_of_assets(assets):
     """
     Greater of from a list of `Assets`.
@@ -0,0 +1,128 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Transactional outbox for notifications.
+
+Notifications are recorded as ``OutboxMessage`` in the same transaction
+as the event that triggered them (ex: an ``Application`` is created),
+then sent by ``dispatch_outbox``, typically run periodically through
+the ``dispatch_outbox`` management command. Sends that fail are retried
+with an exponential backoff, up to ``OUTBOX_MAX_ATTEMPTS`` times.
+
+Nothing is sent unless the command runs. Deployments install
+the ``<APP_NAME>-outbox`` systemd service (etc/outbox.service),
+which keeps it running.
+"""
+from __future__ import unicode_literals
+
+import datetime, logging
+
+from django.conf import settings
+
+from .contacts import get_property_contacts
+from .models import OutboxMessage
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+OUTBOX_RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 60) # seconds
+
+# Time a dispatcher has to send a claimed message before another
+# dispatcher considers it abandoned.
+LEASE_DURATION = datetime.timedelta(minutes=5)
+
+
+def enqueue_application_created(application, url):
+    """
+    Records an ``application_created`` notification to be sent once
+    the current transaction commits.
+    """
+    return OutboxMessage.objects.create(
+        event=OutboxMessage.APPLICATION_CREATED,
+        application=application, url=url,
+        next_attempt_at=datetime_or_now())
+
+
+def send_application_created(message, recipients):
+    # Imported here so workers that never send e-mails do not load
+    # the templates machinery.
+    from extended_templates.backends import get_email_backend
+    application = message.application
+    get_email_backend().send(
+        recipients=recipients,
+        reply_to=settings.DEFAULT_FROM_EMAIL,
+        template='notification/application_created.eml',
+        context={'site': application.lihtc_property,
+            'provider': {
+                'email': settings.DEFAULT_FROM_EMAIL,
+                'phone': "17084622842"},
+            'application': application,
+            'back_url': message.url})
+
+
+SENDERS = {
+    OutboxMessage.APPLICATION_CREATED: send_application_created,
+}
+
+
+def _claim(message, now):
+    """
+    Returns `True` if *message* could be leased by this dispatcher.
+    """
+    claimed = OutboxMessage.objects.filter(
+        pk=message.pk, sent_at__isnull=True,
+        next_attempt_at=message.next_attempt_at).update(
+        next_attempt_at=now + LEASE_DURATION)
+    return claimed > 0
+
+
+def dispatch_outbox(batch_size=100, now=None):
+    """
+    Sends up to *batch_size* pending notifications. Returns a tuple
+    (number of messages sent, number of messages that failed).
+    """
+    now = datetime_or_now(now)
+    messages = list(OutboxMessage.objects.filter(
+        sent_at__isnull=True, next_attempt_at__lte=now,
+        nb_attempts__lt=OUTBOX_MAX_ATTEMPTS).select_related(
+        'application__lihtc_property').order_by(
+        'next_attempt_at')[:batch_size])
+    # Resolves the recipients for all properties in a batch at once.
+    contacts = get_property_contacts(set([message.application.lihtc_property
+        for message in messages if message.application is not None]))
+    nb_sent = 0
+    nb_failed = 0
+    for message in messages:
+        if not _claim(message, now):
+            continue
+        if message.application is None:
+            # The application was deleted before the notice was sent.
+            # There is no one to send it to so we do not retry.
+            LOGGER.warning("discarding %s: no application", message)
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                nb_attempts=OUTBOX_MAX_ATTEMPTS,
+                last_error="application was deleted")
+            nb_failed += 1
+            continue
+        sender = SENDERS.get(message.event)
+        try:
+            if sender is None:
+                raise ValueError("no sender for event '%s'" % message.event)
+            sender(message, contacts.get(
+                message.application.lihtc_property.slug, []))
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                sent_at=datetime_or_now(), nb_attempts=message.nb_attempts + 1,
+                last_error="")
+            nb_sent += 1
+        except Exception as err: #pylint:disable=broad-except
+            nb_attempts = message.nb_attempts + 1
+            LOGGER.warning("sending %s (attempt %d) failed: %s",
+                message, nb_attempts, err)
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                nb_attempts=nb_attempts, last_error=str(err),
+                next_attempt_at=now + datetime.timedelta(
+                    seconds=OUTBOX_RETRY_DELAY * 2 ** (nb_attempts - 1)))
+            nb_failed += 1
+    return nb_sent, nb_failed
@@ -0,0 +1,156 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+
+from __future__ import unicode_literals
+
+import base64, hashlib, logging
+from collections import OrderedDict
+from functools import partial
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.utils import six
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import Application
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CountedPaginator(Paginator):
+    """
+    Django ``Paginator`` which is given the total number of items up-front
+    instead of issuing a ``COUNT(*)``.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super(CountedPaginator, self).__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # ``Paginator.count`` is a read-only property backed
+            # by ``_count``.
+            self._count = count
+
+
+class ApplicationPagination(PageNumberPagination):
+    """
+    Paginates a list of ``Application``.
+
+    By default, pages are selected by number (``page=N``). When a ``cursor``
+    parameter is passed (empty for the first page) and the list is ordered
+    by ``created_at``, pages are selected through a keyset on
+    (``created_at``, ``id``) so that scrolling through years of
+    certifications costs the same for every page. Only the ``next`` link
+    is provided in that mode.
+
+    In both modes, the total count is derived from the number
+    of applications per status (``facets``), computed in a single grouped
+    query and cached for ``count_cache_timeout`` seconds.
+    """
+    cursor_query_param = 'cursor'
+    count_cache_timeout = 60
+
+    def __init__(self):
+        self.request = None
+        self.facets = {}
+        self.cursor = None
+        self.next_cursor = None
+
+    def get_facets(self, queryset):
+        cache_key = 'application-facets-%s' % hashlib.md5(
+            six.text_type(queryset.query).encode('utf-8')).hexdigest()
+        facets = cache.get(cache_key)
+        if facets is None:
+            statuses = dict(Application.STATUS)
+            facets = {status: 0 for status in six.itervalues(statuses)}
+            for row in queryset.order_by().values('status').annotate(
+                    nb_applications=Count('id')):
+                facets[statuses[row['status']]] = row['nb_applications']
+            cache.set(cache_key, facets, self.count_cache_timeout)
+        return facets
+
+    @staticmethod
+    def is_keyset_ordering(request):
+        return request.query_params.get('o', 'created_at') == 'created_at'
+
+    @staticmethod
+    def encode_cursor(application):
+        return base64.urlsafe_b64encode(("%s|%d" % (
+            application.created_at.isoformat(),
+            application.pk)).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(
+                cursor.encode('ascii')).decode('utf-8').split('|')
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            created_at = None
+        if created_at is None:
+            raise NotFound("Invalid cursor '%s'" % cursor)
+        return created_at, pk
+
+    def paginate_keyset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        # Same default as the ``SortableListMixin`` used in offset mode.
+        descending = (request.query_params.get('ot', 'asc') == 'desc')
+        self.cursor = request.query_params.get(self.cursor_query_param)
+        if self.cursor:
+            created_at, pk = self.decode_cursor(self.cursor)
+            if descending:
+                queryset = queryset.filter(Q(created_at__lt=created_at)
+                    | Q(created_at=created_at, pk__lt=pk))
+            else:
+                queryset = queryset.filter(Q(created_at__gt=created_at)
+                    | Q(created_at=created_at, pk__gt=pk))
+        if descending:
+            queryset = queryset.order_by('-created_at', '-pk')
+        else:
+            queryset = queryset.order_by('created_at', 'pk')
+        results = list(queryset[:page_size + 1])
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.facets = self.get_facets(queryset)
+        if (self.cursor_query_param in request.query_params
+            and self.is_keyset_ordering(request)):
+            return self.paginate_keyset(queryset, request)
+        self.django_paginator_class = partial(CountedPaginator,
+            count=sum(six.itervalues(self.facets)))
+        return super(ApplicationPagination, self).paginate_queryset(
+            queryset, request, view=view)
+
+    def get_next_link(self):
+        if self.cursor is None and self.next_cursor is None:
+            return super(ApplicationPagination, self).get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor)
+
+    def get_previous_link(self):
+        if self.cursor is None and self.next_cursor is None:
+            return super(ApplicationPagination, self).get_previous_link()
+        return None
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', sum(six.itervalues(self.facets))),
+            ('facets', self.facets),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
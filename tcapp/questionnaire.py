@@ -0,0 +1,126 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Maps the income and asset sources of a resident questionnaire
+(i.e. ``ResidentSerializer`` validated data) to TIC questions and sources.
+
+``ResidentSerializer.create`` records ``Income`` and ``Asset`` rows
+from these mappings, and ``tcapp.eligibility.estimate_application``
+annualizes the same payload without creating any record, so the estimate
+shown to prospects follows the rules of a submitted application.
+"""
+from __future__ import unicode_literals
+
+from .models import Income, Question, total_natural_periods_per_year
+
+
+# Question answered by each list of income sources. Sources listed
+# under ``others`` answer a question picked by the category of each income
+# (see ``income_question_id``), and ``support_payments`` a question picked
+# by the category of the source (see ``support_question_id``).
+INCOME_SOURCES_QUESTIONS = (
+    ('selfemployed', Question.INCOME_SELF_EMPLOYED[0]),
+    ('employee', Question.INCOME_EMPLOYEE[0]),
+    ('disability', Question.INCOME_DISABILITY[0]),
+    ('publicassistance', Question.INCOME_PUBLIC_ASSISTANCE[0]),
+    ('socialsecurity', Question.INCOME_SOCIAL_BENEFITS[0]),
+    ('supplemental', Question.INCOME_SUPPLEMENTAL_BENEFITS[0]),
+    ('unemployment', Question.INCOME_UNEMPLOYMENT_BENEFITS[0]),
+    ('veteran', Question.INCOME_VETERAN_BENEFITS[0]),
+    ('others', None),
+    ('support_payments', None),
+)
+
+ASSET_SOURCES_FIELDS = ('fiduciaries', 'properties', 'life_insurances')
+
+
+def income_question_id(question_id, income):
+    """
+    Returns the question answered by *income* in a source
+    for *question_id*, picked by category when *question_id* is `None`.
+    """
+    if question_id is not None:
+        return question_id
+    category = income.get('category', Income.OTHER)
+    if category in (Income.TRUSTS, Income.ANNUITIES, Income.INHERITANCE,
+            Income.RETIREMENT_FUNDS, Income.PENSIONS,
+            Income.INSURANCE_POLICIES, Income.LOTTERY_WINNINGS):
+        return Question.INCOME_TRUSTS[0]
+    if category == Income.UNEARNED:
+        return Question.INCOME_UNEARNED_INCOME[0]
+    # category == Income.GIFTS or Income.OTHER
+    return Question.INCOME_GIFTS[0]
+
+
+def support_question_id(source):
+    """
+    Returns the question answered by a source of support payments.
+    """
+    if source.get('category', Income.CHILD_SUPPORT) == Income.SPOUSAL_SUPPORT:
+        return Question.INCOME_ALIMONY_SUPPORT[0]
+    return Question.INCOME_CHILD_SUPPORT_ENTITLED[0]
+
+
+def pop_income_sources(data):
+    """
+    Removes the lists of income sources from *data* and returns
+    them as a list of (question_id, source) in the order they are recorded.
+
+    *question_id* is `None` when the question depends on the category
+    of each income (see ``income_question_id``). Benefits are not looked up
+    by payer so their sources are all named "N/A".
+    """
+    results = []
+    for field_name, question_id in INCOME_SOURCES_QUESTIONS:
+        for source in data.pop(field_name, []):
+            if field_name == 'support_payments':
+                source_question_id = support_question_id(source)
+            else:
+                source_question_id = question_id
+            if source_question_id in Question.INCOME_BENEFITS:
+                source = dict(source, name="N/A", position=None)
+            results += [(source_question_id, source)]
+    return results
+
+
+def pop_asset_sources(data):
+    """
+    Removes the lists of asset sources and cash on hand from *data*
+    and returns them as a tuple (sources, cash_on_hand).
+
+    Sources with the same name (ex: two checking accounts at the same
+    institution) are told apart by a position.
+    """
+    sources = [dict(source) for field_name in ASSET_SOURCES_FIELDS
+        for source in data.pop(field_name, [])]
+    counts = {}
+    for source in sources:
+        source_name = source.get('name', None)
+        if source_name and source_name in counts:
+            counts[source_name] += 1
+            source['position'] = str(counts[source_name])
+        else:
+            counts[source_name] = 1
+    return sources, data.pop('cash_on_hand', None)
+
+
+def income_periods(income):
+    """
+    Returns the (period, avg, avg_per_year) recorded for *income*,
+    constrained such that annual income can be extrapolated.
+    """
+    verified = income.get('verified', Income.VERIFIED_TENANT)
+    period = income.get('period', Income.MONTHLY)
+    if verified in (Income.VERIFIED_PERIOD_TO_DATE,
+                    Income.VERIFIED_YEAR_TO_DATE):
+        period = Income.OTHER
+    # Automatically constraint avg to YEARLY
+    # if period is enough to extrapolate annual income.
+    avg = income.get('avg', Income.WEEKLY)
+    if period not in (Income.HOURLY, Income.DAILY):
+        avg = period
+    # Automatically constraint avg_per_year when out-of-range.
+    periods_per_year = total_natural_periods_per_year(avg)
+    avg_per_year = min(income.get('avg_per_year', periods_per_year),
+        periods_per_year)
+    return period, avg, avg_per_year
@@ -0,0 +1,303 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Annual recertification of households.
+
+``sweep`` finds the applications due for recertification within a window,
+computes the household income and 140% limit of all of them in a fixed
+number of queries (see ``tcapp.annualize.applications_total_income``
+and ``tcapp.eligibility.LimitsTable``), and records the results
+as a ``Recertification`` worklist. ``clone_households`` then creates
+the recertification applications for a worklist with bulk inserts.
+
+A household is due on the anniversary of its move-in date that follows
+the effective date of its latest certification, i.e. the most recent
+application for its unit.
+"""
+from __future__ import unicode_literals
+
+import datetime, logging, uuid
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.template.defaultfilters import slugify
+
+from .annualize import applications_total_income
+from .caches import bump_rents_version
+from .eligibility import evaluate, get_limits_table
+from .models import (Application, ApplicationResident, Asset, County,
+    Recertification, Resident)
+from .utils import datetime_or_now
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of days ahead of time households due for recertification
+# are looked for.
+RECERTIFICATION_WINDOW = datetime.timedelta(
+    days=getattr(settings, 'RECERTIFICATION_WINDOW_DAYS', 120))
+
+# Fields that are not copied from an application onto the application
+# created to recertify its household.
+APPLICATION_RESET_FIELDS = ('id', 'slug', 'created_at', 'updated_at',
+    'status', 'certification_type', 'effective_date', 'move_in_date',
+    'household_size', 'annual_income')
+
+RESIDENT_RESET_FIELDS = ('id', 'slug', 'updated_at')
+
+
+def get_due_date(effective_date, move_in_date):
+    """
+    Returns the first anniversary of *move_in_date* after *effective_date*.
+    """
+    if move_in_date >= effective_date:
+        return move_in_date + relativedelta(years=1)
+    due_date = move_in_date + relativedelta(
+        years=effective_date.year - move_in_date.year)
+    if due_date <= effective_date:
+        due_date += relativedelta(years=1)
+    return due_date
+
+
+def find_due(applications, start_at, ends_at):
+    """
+    Returns ``{application_id: due_date}`` for *applications* due for
+    recertification in [*start_at*, *ends_at*[.
+
+    Archived applications and applications whose household was already
+    recertified are skipped. So are applications for a unit that has
+    a later application (ex: the household was recertified
+    without ``clone_households``). Only the latest certification
+    of a unit counts.
+    """
+    # The due date is less than a year after the effective date.
+    candidates = list(applications.filter(
+        effective_date__gte=start_at - relativedelta(years=1),
+        effective_date__lt=ends_at).exclude(
+        status=Application.STATUS_ARCHIVED).exclude(
+        recertifications__recertified_by__isnull=False).values_list(
+        'pk', 'lihtc_property', 'unit_number', 'effective_date',
+        'move_in_date'))
+    latest_by_units = {(property_id, unit_number): effective_date
+        for property_id, unit_number, effective_date in
+        Application.objects.filter(
+            lihtc_property__in=set([row[1] for row in candidates]),
+            unit_number__in=set([row[2] for row in candidates if row[2]])
+        ).exclude(status=Application.STATUS_ARCHIVED).values(
+            'lihtc_property', 'unit_number').annotate(
+            latest=models.Max('effective_date')).values_list(
+            'lihtc_property', 'unit_number', 'latest')}
+    results = {}
+    for application_id, property_id, unit_number, effective_date, \
+            move_in_date in candidates:
+        if unit_number and effective_date < latest_by_units.get(
+                (property_id, unit_number), effective_date):
+            continue
+        due_date = get_due_date(effective_date, move_in_date)
+        if start_at <= due_date < ends_at:
+            results[application_id] = due_date
+    return results
+
+
+def applications_income_from_assets(applications):
+    """
+    Returns the income from assets in cents, as
+    ``Application.total_income_from_assets``, of *applications*
+    (a queryset of ``Application``) as ``{application_id: amount}``.
+    """
+    applicants = ApplicationResident.objects.filter(
+        application__in=applications)
+    # Greater of each (resident, source, category), picked in the same
+    # order as ``Resident.assets_by_source``.
+    greater_of = {}
+    for resident_id, source_id, category, amount, interest_rate in \
+            Asset.objects.filter(
+                resident__in=applicants.values('resident')).order_by(
+                'question', 'source', 'category', 'verified').values_list(
+                'resident', 'source', 'category', 'amount', 'interest_rate'):
+        key = (resident_id, source_id, category)
+        if key not in greater_of or amount > greater_of[key][0]:
+            greater_of[key] = (amount, interest_rate)
+    by_residents = {}
+    for (resident_id, _, _), (amount, interest_rate) in greater_of.items():
+        cash_value, annual_income = by_residents.get(resident_id, (0, 0))
+        by_residents[resident_id] = (cash_value + amount,
+            annual_income + (amount * interest_rate) // 10000)
+    totals = {}
+    for application_id, resident_id in applicants.values_list(
+            'application', 'resident'):
+        cash_value, annual_income = totals.get(application_id, (0, 0))
+        resident_cash_value, resident_annual_income = by_residents.get(
+            resident_id, (0, 0))
+        totals[application_id] = (cash_value + resident_cash_value,
+            annual_income + resident_annual_income)
+    results = {}
+    for application_id, (cash_value, annual_income) in totals.items():
+        # See ``Application.imputed_income_from_assets``.
+        imputed_income = (cash_value * 6) // 10000 \
+            if cash_value >= 500000 else 0
+        results[application_id] = max(annual_income, imputed_income)
+    return results
+
+
+def applications_family_size(applications):
+    """
+    Returns the family size, as ``Application.family_size``,
+    of *applications* as ``{application_id: family_size}``.
+    """
+    return dict(ApplicationResident.objects.filter(
+        application__in=applications).values('application').annotate(
+        family_size=models.Count('resident')).values_list(
+        'application', 'family_size'))
+
+
+def sweep(applications, start_at=None, ends_at=None, clone=False):
+    """
+    Records a ``Recertification`` for each of *applications*
+    due in [*start_at*, *ends_at*[ (by default within
+    ``RECERTIFICATION_WINDOW`` from now) and returns them.
+
+    The 140% limit is the one in effect at the due date. Worklist items
+    for the same applications that were not recertified yet are replaced.
+    When *clone* is `True`, households are also cloned into new
+    recertification applications (see ``clone_households``).
+    """
+    #pylint:disable=too-many-locals
+    start_at = datetime_or_now(start_at)
+    if ends_at is None:
+        ends_at = start_at + RECERTIFICATION_WINDOW
+    due_dates = find_due(applications, start_at, ends_at)
+    if not due_dates:
+        return []
+    queryset = Application.objects.filter(pk__in=list(due_dates))
+    total_incomes = applications_total_income(queryset)
+    incomes_from_assets = applications_income_from_assets(queryset)
+    family_sizes = applications_family_size(queryset)
+    rows = list(queryset.values_list('pk', 'lihtc_property',
+        'lihtc_property__county', 'federal_income_restriction'))
+    tables = {county_id: get_limits_table(county)
+        for county_id, county in County.objects.in_bulk(
+            set([row[2] for row in rows])).items()}
+    recertifications = []
+    for application_id, property_id, county_id, restriction in rows:
+        result = evaluate(tables[county_id],
+            family_sizes.get(application_id, 0),
+            total_incomes.get(application_id, 0)
+            + incomes_from_assets.get(application_id, 0),
+            restriction or 0, at_time=due_dates[application_id])
+        recertifications += [Recertification(
+            lihtc_property_id=property_id,
+            application_id=application_id,
+            due_date=due_dates[application_id],
+            family_size=result['family_size'],
+            annual_income=result['annual_income'],
+            income_restriction=result['income_restriction'],
+            income_limit=result['income_limit'],
+            income_limit_140=result['income_limit_140'],
+            is_eligible_140=result['is_eligible_140'])]
+    with transaction.atomic():
+        Recertification.objects.filter(application__in=list(due_dates),
+            recertified_by__isnull=True).delete()
+        Recertification.objects.bulk_create(recertifications)
+        if clone:
+            clone_households(Recertification.objects.filter(
+                application__in=list(due_dates), recertified_by__isnull=True))
+    return recertifications
+
+
+def _copy(instance, reset_fields, **kwargs):
+    #pylint:disable=protected-access
+    values = {field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field.name not in reset_fields}
+    values.update(kwargs)
+    return instance.__class__(slug=slugify(uuid.uuid4().hex), **values)
+
+
+def _case(values, output_field):
+    """
+    Returns an expression that evaluates to ``values[pk]`` for each row.
+    """
+    return models.Case(*[models.When(pk=pk, then=models.Value(value))
+        for pk, value in values.items()], output_field=output_field)
+
+
+def clone_households(recertifications):
+    """
+    Creates a new ``certification_type='recertification'`` application
+    for each of *recertifications* (a queryset of ``Recertification``)
+    with a copy of the unit, rent and residents of the household,
+    effective at the due date.
+
+    Incomes, assets and answers are not copied. They must be verified
+    anew for the recertification.
+    """
+    #pylint:disable=too-many-locals
+    recertifications = list(recertifications.select_related(
+        'application', 'lihtc_property'))
+    if not recertifications:
+        return []
+    with transaction.atomic():
+        # ``auto_now_add`` dates are overwritten on insert so we set
+        # the dates of the new applications afterwards.
+        new_applications = [_copy(recertification.application,
+            APPLICATION_RESET_FIELDS,
+            certification_type='recertification',
+            status=Application.STATUS_RE_CERTIFICATION,
+            # Household summary as found by the sweep, until incomes
+            # are verified for the recertification.
+            household_size=recertification.family_size,
+            annual_income=recertification.annual_income)
+            for recertification in recertifications]
+        Application.objects.bulk_create(new_applications)
+        new_application_ids = dict(Application.objects.filter(
+            slug__in=[application.slug for application in new_applications]
+            ).values_list('slug', 'pk'))
+        recertified_by = {}
+        effective_dates = {}
+        move_in_dates = {}
+        for recertification, application in zip(
+                recertifications, new_applications):
+            application.pk = new_application_ids[application.slug]
+            recertified_by[recertification.pk] = application.pk
+            effective_dates[application.pk] = recertification.due_date
+            move_in_dates[application.pk] = \
+                recertification.application.move_in_date
+        Application.objects.filter(pk__in=list(effective_dates)).update(
+            effective_date=_case(effective_dates, models.DateTimeField()),
+            move_in_date=_case(move_in_dates, models.DateTimeField()))
+
+        # Residents
+        applicants = list(ApplicationResident.objects.filter(
+            application__in=[recertification.application_id
+                for recertification in recertifications]).order_by('pk'))
+        residents = Resident.objects.in_bulk(
+            [applicant.resident_id for applicant in applicants])
+        new_residents = {resident_id: _copy(resident, RESIDENT_RESET_FIELDS)
+            for resident_id, resident in residents.items()}
+        Resident.objects.bulk_create(list(new_residents.values()))
+        new_resident_ids = dict(Resident.objects.filter(
+            slug__in=[resident.slug for resident in new_residents.values()]
+            ).values_list('slug', 'pk'))
+        new_applications_by_originals = {
+            recertification.application_id: application.pk
+            for recertification, application in zip(
+                recertifications, new_applications)}
+        ApplicationResident.objects.bulk_create([ApplicationResident(
+            application_id=new_applications_by_originals[
+                applicant.application_id],
+            resident_id=new_resident_ids[
+                new_residents[applicant.resident_id].slug],
+            relation_to_head=applicant.relation_to_head)
+            for applicant in applicants])
+
+        Recertification.objects.filter(pk__in=list(recertified_by)).update(
+            recertified_by=_case(recertified_by, models.IntegerField()))
+    # Bulk inserts do not send signals.
+    for lihtc_property in set([recertification.lihtc_property
+            for recertification in recertifications]):
+        bump_rents_version(lihtc_property)
+    LOGGER.info("cloned %d households for recertification",
+        len(new_applications))
+    return new_applications
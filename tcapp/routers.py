@@ -0,0 +1,87 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Optional routing of read-only code paths to a database replica.
+
+Reports, exports and PDF forms read through ``use_replica`` (a context
+manager and decorator). ``ReplicaRouter`` sends their reads
+to the ``REPLICA_DATABASE`` alias, while all writes, and all reads outside
+``use_replica``, go to the ``default`` (primary) database. As soon as
+a write happens within ``use_replica``, following reads in the same thread
+go to the primary so that read-after-write flows see their own writes.
+
+The router is installed when a replica is configured in site.conf
+(see ``DB_REPLICA_*`` in ``settings.py``).
+"""
+from __future__ import unicode_literals
+
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+
+REPLICA_DATABASE = 'replica'
+
+_state = threading.local() #pylint:disable=invalid-name
+
+
+def _replica_available():
+    return REPLICA_DATABASE in settings.DATABASES
+
+
+class use_replica(object): #pylint:disable=invalid-name
+    """
+    Reads issued within this context (or decorated function) go
+    to the replica database, when one is configured.
+    """
+
+    def __enter__(self):
+        _state.depth = getattr(_state, 'depth', 0) + 1
+        if _state.depth == 1:
+            _state.has_written = False
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _state.depth -= 1
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.__class__():
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def reads_from_replica():
+    return (getattr(_state, 'depth', 0) > 0
+        and not getattr(_state, 'has_written', False)
+        and _replica_available())
+
+
+class ReplicaRouter(object):
+    """
+    Routes reads within ``use_replica`` to the replica database.
+    """
+
+    @staticmethod
+    def db_for_read(model, **hints): #pylint:disable=unused-argument
+        if reads_from_replica():
+            return REPLICA_DATABASE
+        return 'default'
+
+    @staticmethod
+    def db_for_write(model, **hints): #pylint:disable=unused-argument
+        if getattr(_state, 'depth', 0) > 0:
+            _state.has_written = True
+        return 'default'
+
+    @staticmethod
+    def allow_relation(obj1, obj2, **hints): #pylint:disable=unused-argument
+        # Both databases hold the same data.
+        return True
+
+    @staticmethod
+    def allow_migrate(db, app_label, model_name=None, **hints):
+        #pylint:disable=unused-argument
+        return db == 'default'
@@ -0,0 +1,271 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+In-app search index for ``Property``.
+
+Each property is broken down into ``PropertySearchTerm`` records:
+
+  - the TCAC number compacted to its alphanumeric characters
+    (ex: CA-2017-741 -> ca2017741) along with all its prefixes
+    such that "CA-2017-7" keeps the original ``startswith`` behavior,
+  - the words in the name and locality along with their prefixes,
+  - the trigrams of the words in the name and locality, used
+    to match queries with typos.
+
+A search is done in (at most) two indexed lookups on ``term``: first
+on words and prefixes, then, only when nothing matched, on trigrams.
+Short TCAC number prefixes (ex: "ca") would match most properties so
+they are only matched as whole numbers, and each lookup is limited
+to ``SEARCH_MAX_MATCHED_TERMS`` rows before matches are ranked.
+
+The terms of a property are rebuilt whenever it is saved (see
+``tcapp.signals``), unless saved inside ``defer_search_index``.
+The ``rebuild_search_index`` command rebuilds the whole index.
+"""
+from __future__ import unicode_literals
+
+import logging, re, threading, unicodedata
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import six
+
+from .caches import (PROJECT_CACHE_TIMEOUT, bump_search_index_version,
+    get_search_cache_key)
+from .models import Property, PropertySearchTerm
+
+
+LOGGER = logging.getLogger(__name__)
+
+MIN_PREFIX_LENGTH = 2
+# Shorter TCAC number prefixes only match whole TCAC numbers.
+MIN_TCAC_NUMBER_PREFIX_LENGTH = 4
+MIN_TRIGRAM_SIMILARITY = 0.5
+# Maximum number of index rows loaded per lookup, words before prefixes.
+SEARCH_MAX_MATCHED_TERMS = getattr(settings, 'SEARCH_MAX_MATCHED_TERMS', 1000)
+
+# Relative weight of a match, by kind and field.
+TCAC_NUMBER_WORD_SCORE = 1000
+TCAC_NUMBER_PREFIX_SCORE = 800
+FIELD_WEIGHTS = {
+    PropertySearchTerm.FIELD_NAME: 10,
+    PropertySearchTerm.FIELD_LOCALITY: 8,
+}
+KIND_WEIGHTS = {
+    PropertySearchTerm.KIND_WORD: 1.0,
+    PropertySearchTerm.KIND_PREFIX: 0.6,
+}
+
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_TERM_MAX_LENGTH = PropertySearchTerm._meta.get_field('term').max_length
+
+_deferred = threading.local() #pylint:disable=invalid-name
+
+
+def normalize(text):
+    """
+    Lower case, strip accents and replace all non alphanumeric characters
+    (including '+' as in "San+Francisco") by a space.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKD', six.text_type(text))
+    text = ''.join([char for char in text if not unicodedata.combining(char)])
+    return _NON_ALNUM_RE.sub(' ', text.lower()).strip()
+
+
+def tokenize(text):
+    return [word[:_TERM_MAX_LENGTH] for word in normalize(text).split()]
+
+
+def compact(text):
+    return normalize(text).replace(' ', '')[:_TERM_MAX_LENGTH]
+
+
+def prefixes(word):
+    return [word[:length]
+        for length in range(MIN_PREFIX_LENGTH, len(word))]
+
+
+def trigrams(word):
+    padded = '$%s$' % word
+    return set([padded[idx:idx + 3] for idx in range(0, len(padded) - 2)])
+
+
+def get_property_terms(tcac_number, name, locality):
+    """
+    Returns the set of (term, kind, field) tuples to index a property with.
+    """
+    terms = set([])
+    tcac_compact = compact(tcac_number)
+    if tcac_compact:
+        terms.add((tcac_compact, PropertySearchTerm.KIND_WORD,
+            PropertySearchTerm.FIELD_TCAC_NUMBER))
+        for prefix in prefixes(tcac_compact):
+            terms.add((prefix, PropertySearchTerm.KIND_PREFIX,
+                PropertySearchTerm.FIELD_TCAC_NUMBER))
+    for field, text in [(PropertySearchTerm.FIELD_NAME, name),
+                        (PropertySearchTerm.FIELD_LOCALITY, locality)]:
+        for word in tokenize(text):
+            terms.add((word, PropertySearchTerm.KIND_WORD, field))
+            for prefix in prefixes(word):
+                terms.add((prefix, PropertySearchTerm.KIND_PREFIX, field))
+            for trigram in trigrams(word):
+                terms.add((trigram, PropertySearchTerm.KIND_TRIGRAM, field))
+    return terms
+
+
+def rebuild_search_index(properties=None, batch_size=1000):
+    """
+    Rebuilds the search terms for *properties* (defaults to all
+    ``Property``).
+    """
+    if properties is None:
+        queryset = Property.objects.all()
+    else:
+        queryset = Property.objects.filter(
+            pk__in=[lihtc_property.pk for lihtc_property in properties])
+    with transaction.atomic():
+        if properties is None:
+            PropertySearchTerm.objects.all().delete()
+        else:
+            PropertySearchTerm.objects.filter(
+                lihtc_property__in=queryset).delete()
+        search_terms = []
+        nb_properties = 0
+        for pk, tcac_number, name, locality in queryset.values_list(
+                'pk', 'tcac_number', 'name', 'locality').iterator():
+            nb_properties += 1
+            for term, kind, field in get_property_terms(
+                    tcac_number, name, locality):
+                search_terms += [PropertySearchTerm(lihtc_property_id=pk,
+                    term=term, kind=kind, field=field)]
+            if len(search_terms) >= batch_size:
+                PropertySearchTerm.objects.bulk_create(search_terms)
+                search_terms = []
+        if search_terms:
+            PropertySearchTerm.objects.bulk_create(search_terms)
+    bump_search_index_version()
+    LOGGER.info("indexed %d properties for search", nb_properties)
+    return nb_properties
+
+
+@contextmanager
+def defer_search_index():
+    """
+    Skips rebuilding the terms of each ``Property`` saved inside the block
+    (ex: a bulk import). The caller rebuilds the index afterwards.
+    """
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = False
+
+
+def is_search_index_deferred():
+    return getattr(_deferred, 'active', False)
+
+
+def _score_words(query_words, tcac_compact):
+    """
+    Scores properties on exact words and prefixes.
+    """
+    filter_args = Q(term__in=query_words, field__in=list(FIELD_WEIGHTS))
+    if tcac_compact:
+        tcac_filter = Q(term=tcac_compact,
+            field=PropertySearchTerm.FIELD_TCAC_NUMBER)
+        if len(tcac_compact) < MIN_TCAC_NUMBER_PREFIX_LENGTH:
+            tcac_filter &= Q(kind=PropertySearchTerm.KIND_WORD)
+        filter_args |= tcac_filter
+    scores = {}
+    matched_words = {}
+    for pk, term, kind, field in PropertySearchTerm.objects.filter(
+            filter_args,
+            kind__in=[PropertySearchTerm.KIND_WORD,
+                      PropertySearchTerm.KIND_PREFIX]).order_by(
+            'kind').values_list(
+            'lihtc_property_id', 'term', 'kind', 'field')[
+            :SEARCH_MAX_MATCHED_TERMS]:
+        if field == PropertySearchTerm.FIELD_TCAC_NUMBER:
+            score = (TCAC_NUMBER_WORD_SCORE
+                if kind == PropertySearchTerm.KIND_WORD
+                else TCAC_NUMBER_PREFIX_SCORE)
+            # A TCAC number match stands on its own.
+            matched_words.setdefault(pk, set([])).update(query_words)
+        else:
+            score = FIELD_WEIGHTS[field] * KIND_WEIGHTS[kind]
+            matched_words.setdefault(pk, set([])).add(term)
+        scores[pk] = scores.get(pk, 0) + score
+    # All words in the query must match.
+    nb_query_words = len(set(query_words))
+    return {pk: score for pk, score in six.iteritems(scores)
+        if len(matched_words[pk]) >= nb_query_words}
+
+
+def _score_trigrams(query_words):
+    """
+    Scores properties on trigrams similarity, to match queries with typos.
+    """
+    word_trigrams = {word: trigrams(word) for word in query_words}
+    lookup_terms = set([])
+    for word_trigram in six.itervalues(word_trigrams):
+        lookup_terms |= word_trigram
+    found = {}
+    for pk, term, field in PropertySearchTerm.objects.filter(
+            term__in=lookup_terms,
+            kind=PropertySearchTerm.KIND_TRIGRAM).values_list(
+            'lihtc_property_id', 'term', 'field')[:SEARCH_MAX_MATCHED_TERMS]:
+        found.setdefault(pk, {}).setdefault(field, set([])).add(term)
+    scores = {}
+    for pk, by_fields in six.iteritems(found):
+        score = 0
+        for word, word_trigram in six.iteritems(word_trigrams):
+            best = 0
+            for field, terms in six.iteritems(by_fields):
+                similarity = float(len(word_trigram & terms)) / len(
+                    word_trigram)
+                if similarity >= MIN_TRIGRAM_SIMILARITY:
+                    best = max(best, FIELD_WEIGHTS[field] * similarity)
+            if not best:
+                # All words in the query must (approximately) match.
+                score = 0
+                break
+            score += best
+        if score:
+            scores[pk] = score
+    return scores
+
+
+def search_properties(query):
+    """
+    Returns a list of ``Property`` matching *query*, best matches first.
+
+    The ranked primary keys are cached until the index is rebuilt.
+    """
+    query_words = tokenize(query)
+    tcac_compact = compact(query)
+    if not (query_words or tcac_compact):
+        return []
+    cache_key = get_search_cache_key(
+        "%s|%s" % (' '.join(query_words), tcac_compact))
+    ranked_pks = cache.get(cache_key)
+    if ranked_pks is not None:
+        by_pk = Property.objects.select_related('county').in_bulk(ranked_pks)
+        return [by_pk[pk] for pk in ranked_pks if pk in by_pk]
+    scores = _score_words(query_words, tcac_compact)
+    if not scores and query_words:
+        scores = _score_trigrams(query_words)
+    if not scores:
+        cache.set(cache_key, [], PROJECT_CACHE_TIMEOUT)
+        return []
+    by_pk = Property.objects.select_related('county').in_bulk(list(scores))
+    results = sorted(six.itervalues(by_pk),
+        key=lambda lihtc_property: (
+            -scores[lihtc_property.pk], lihtc_property.name))
+    cache.set(cache_key, [lihtc_property.pk for lihtc_property in results],
+        PROJECT_CACHE_TIMEOUT)
+    return results
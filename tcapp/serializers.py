@@ -8,14 +8,13 @@ from django.template.defaultfilters import slugify
 from django.utils import six
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from storages.backends.s3boto import S3BotoStorage
 
 from .models import (Application, ApplicationResident, Answer, Asset,
     HousingHistory, Income, Property, Question, Resident, Source,
-    UploadedDocument, full_name_natural_split, total_natural_periods_per_year)
-
-#pylint:disable=no-name-in-module,import-error
-from django.utils.six.moves.urllib.parse import urlparse
+    UploadedDocument, full_name_natural_split)
+from .questionnaire import (income_periods, income_question_id,
+    pop_asset_sources, pop_income_sources)
+from .signed_urls import as_signed_url, as_signed_urls
 
 
 LOGGER = logging.getLogger(__name__)
@@ -333,12 +332,11 @@ class ResidentSerializer(serializers.ModelSerializer):
                 income.delete()
         else:
             verified = validated_data.get('verified', Income.VERIFIED_TENANT)
-            period = validated_data.get('period', Income.MONTHLY)
+            period, avg, avg_per_year = income_periods(validated_data)
             starts_at = validated_data.get('starts_at', None)
             ends_at = validated_data.get('ends_at', None)
             if verified in [Income.VERIFIED_PERIOD_TO_DATE,
                             Income.VERIFIED_YEAR_TO_DATE]:
-                period = Income.OTHER
                 if not (starts_at and ends_at):
                     raise ValidationError("For PTD and YTD calculations,"\
         " the `From` and `To` date must be valid and at least one day apart.")
@@ -346,16 +344,6 @@ class ResidentSerializer(serializers.ModelSerializer):
                     raise ValidationError("For PTD and YTD calculations,"\
         " the `From` and `To` date must be valid and at least one day apart.")
             period_per_avg = validated_data.get('period_per_avg', 0)
-            # Automatically constraint avg to YEARLY
-            # if period is enough to extrapolate annual income.
-            avg = validated_data.get('avg', Income.WEEKLY)
-            if period not in (Income.HOURLY, Income.DAILY):
-                avg = period
-            # Automatically constraint avg_per_year when out-of-range.
-            periods_per_year = total_natural_periods_per_year(avg)
-            avg_per_year = validated_data.get('avg_per_year', periods_per_year)
-            if avg_per_year > periods_per_year:
-                avg_per_year = periods_per_year
             descr = validated_data.get('descr', "")
             cash_wages = validated_data.get('cash_wages', False)
             court_award = validated_data.get(
@@ -418,28 +406,17 @@ class ResidentSerializer(serializers.ModelSerializer):
                         self.context.get('application'), extra=extra)
         return source
 
-    def _create_group(self, source, question, resident):
-        no_question = (question is None)
-        if question and question.pk in Question.INCOME_BENEFITS:
-            # question will be `None` when we are dealing with pensions, etc.
-            source.update({'name': "N/A", 'position': None})
+    def _create_group(self, source, question_id, resident, questions):
+        # question_id will be `None` when we are dealing with pensions, etc.
         src_obj = self._create_source(resident, source)
         default_group = slugify(uuid.uuid4().hex)
         for income in source.get('incomes', []):
-            category = income.get('category', Income.OTHER)
-            if no_question:
-                if category in(Income.TRUSTS, Income.ANNUITIES,
-                        Income.INHERITANCE, Income.RETIREMENT_FUNDS,
-                        Income.PENSIONS, Income.INSURANCE_POLICIES,
-                        Income.LOTTERY_WINNINGS):
-                    question_pk = Question.INCOME_TRUSTS[0]
-                elif category == Income.UNEARNED:
-                    question_pk = Question.INCOME_UNEARNED_INCOME[0]
-                else: # category == Income.GIFTS or Income.OTHER
-                    question_pk = Question.INCOME_GIFTS[0]
-                question = Question.objects.get(pk=question_pk)
-            self._create_income(question, src_obj, income,
-                default_group=default_group)
+            income_question_pk = income_question_id(question_id, income)
+            if income_question_pk not in questions:
+                questions[income_question_pk] = Question.objects.get(
+                    pk=income_question_pk)
+            self._create_income(questions[income_question_pk], src_obj,
+                income, default_group=default_group)
 
     def create(self, validated_data):
         #pylint:disable=too-many-locals,too-many-statements
@@ -449,22 +426,8 @@ class ResidentSerializer(serializers.ModelSerializer):
         past_addresses = validated_data.pop('past_addresses', [])
         student_status = validated_data.pop('student_status')
 
-        self_employed = validated_data.pop('selfemployed', [])
-        employee = validated_data.pop('employee', [])
-        disability_benefits = validated_data.pop('disability', [])
-        public_assistance_benefits = validated_data.pop(
-            'publicassistance', [])
-        social_benefits = validated_data.pop('socialsecurity', [])
-        supplemental_benefits = validated_data.pop('supplemental', [])
-        unemployment_benefits = validated_data.pop('unemployment', [])
-        veteran_benefits = validated_data.pop('veteran', [])
-        others = validated_data.pop('others', [])
-        support_payments = validated_data.pop('support_payments', [])
-
-        fiduciaries = validated_data.pop('fiduciaries', [])
-        properties = validated_data.pop('properties', [])
-        life_insurances = validated_data.pop('life_insurances', [])
-        cash_on_hand = validated_data.pop('cash_on_hand', None)
+        income_sources = pop_income_sources(validated_data)
+        asset_sources, cash_on_hand = pop_asset_sources(validated_data)
 
         full_name = validated_data.pop('full_name')
         first_name, middle_initial, last_name = full_name_natural_split(
@@ -475,78 +438,11 @@ class ResidentSerializer(serializers.ModelSerializer):
             middle_initial=middle_initial, **validated_data)
         self._create_past_addresses(resident, past_addresses)
 
-        if self_employed:
-            question = Question.objects.get(pk=Question.INCOME_SELF_EMPLOYED[0])
-            for source in self_employed:
-                self._create_group(source, question, resident)
-
-        if employee:
-            question = Question.objects.get(pk=Question.INCOME_EMPLOYEE[0])
-            for source in employee:
-                self._create_group(source, question, resident)
-
-        if disability_benefits:
-            question = Question.objects.get(pk=Question.INCOME_DISABILITY[0])
-            for source in disability_benefits:
-                self._create_group(source, question, resident)
-
-        if public_assistance_benefits:
-            question = Question.objects.get(
-                pk=Question.INCOME_PUBLIC_ASSISTANCE[0])
-            for source in public_assistance_benefits:
-                self._create_group(source, question, resident)
-
-        if social_benefits:
-            question = Question.objects.get(
-                pk=Question.INCOME_SOCIAL_BENEFITS[0])
-            for source in social_benefits:
-                self._create_group(source, question, resident)
-
-        if supplemental_benefits:
-            question = Question.objects.get(
-                pk=Question.INCOME_SUPPLEMENTAL_BENEFITS[0])
-            for source in supplemental_benefits:
-                self._create_group(source, question, resident)
+        questions = {}
+        for question_id, source in income_sources:
+            self._create_group(source, question_id, resident, questions)
 
-        if unemployment_benefits:
-            question = Question.objects.get(
-                pk=Question.INCOME_UNEMPLOYMENT_BENEFITS[0])
-            for source in unemployment_benefits:
-                self._create_group(source, question, resident)
-
-        if veteran_benefits:
-            question = Question.objects.get(
-                pk=Question.INCOME_VETERAN_BENEFITS[0])
-            for source in veteran_benefits:
-                self._create_group(source, question, resident)
-
-        if others:
-            for source in others:
-                self._create_group(source, None, resident)
-
-        if support_payments:
-            child_support_question = Question.objects.get(
-                    pk=Question.INCOME_CHILD_SUPPORT_ENTITLED[0])
-            spousal_support_question = Question.objects.get(
-                    pk=Question.INCOME_ALIMONY_SUPPORT[0])
-            for source in support_payments:
-                category = source.get('category', Income.CHILD_SUPPORT)
-                if category == Income.SPOUSAL_SUPPORT:
-                    question = spousal_support_question
-                else:
-                    question = child_support_question
-                self._create_group(source, question, resident)
-
-        # Workaround when we have two checking accounts at the same institution.
-        sources = {}
-        for source in fiduciaries + properties + life_insurances:
-            source_name = source.get('name', None)
-            if source_name and source_name in sources:
-                sources[source_name] += 1
-                source['position'] = str(sources[source_name])
-            else:
-                sources[source_name] = 1
-        for source in fiduciaries + properties + life_insurances:
+        for source in asset_sources:
             src_obj = self._create_source(resident, source)
             for asset in source.get('assets', []):
                 self._create_asset(src_obj, asset)
@@ -620,18 +516,9 @@ class ResidentSerializer(serializers.ModelSerializer):
         if not default_group:
             default_group = slugify(uuid.uuid4().hex)
         for income in source.get('incomes', []):
-            category = income.get('category', Income.OTHER)
             if no_question:
-                if category in(Income.TRUSTS, Income.ANNUITIES,
-                        Income.INHERITANCE, Income.RETIREMENT_FUNDS,
-                        Income.PENSIONS, Income.INSURANCE_POLICIES,
-                        Income.LOTTERY_WINNINGS):
-                    question_pk = Question.INCOME_TRUSTS[0]
-                elif category == Income.UNEARNED:
-                    question_pk = Question.INCOME_UNEARNED_INCOME[0]
-                else: # category == Income.GIFTS or Income.OTHER
-                    question_pk = Question.INCOME_GIFTS[0]
-                question = Question.objects.get(pk=question_pk)
+                question = Question.objects.get(
+                    pk=income_question_id(None, income))
             self._create_income(question, src_obj, income,
                 default_group=default_group)
 
@@ -772,29 +659,17 @@ class ResidentSerializer(serializers.ModelSerializer):
         return instance
 
 
-def as_signed_url(location, request):
-    parts = urlparse(location)
-    bucket_name = parts.netloc.split('.')[0]
-    key_name = parts.path
-    if bucket_name.startswith('s3-'):
-        name_parts = key_name.split('/')
-        if name_parts and not name_parts[0]:
-            name_parts.pop(0)
-        bucket_name = name_parts[0]
-        key_name = '/'.join(name_parts[1:])
-    if key_name.startswith('/'):
-        # we rename leading '/' otherwise S3 copy triggers a 404
-        # because it creates an URL with '//'.
-        key_name = key_name[1:]
-    kwargs = {}
-    for key in ['access_key', 'secret_key', 'security_token']:
-        if key in request.session:
-            kwargs[key] = request.session[key]
-    if not kwargs:
-        LOGGER.error("called `as_signed_url(bucket_name=%s, key_name=%s)`"\
-            " with no credentials.", bucket_name, key_name)
-    s3_storage = S3BotoStorage(bucket=bucket_name, **kwargs)
-    return s3_storage.url(key_name)
+class UploadedDocumentListSerializer(serializers.ListSerializer):
+    """
+    Signs the URLs of all documents in a list at once.
+    """
+
+    def to_representation(self, data):
+        documents = list(data.all() if hasattr(data, 'all') else data)
+        self.context['signed_urls'] = as_signed_urls(
+            [document.url for document in documents], self.context['request'])
+        return super(UploadedDocumentListSerializer, self).to_representation(
+            documents)
 
 
 class UploadedDocumentSerializer(serializers.ModelSerializer):
@@ -804,6 +679,7 @@ class UploadedDocumentSerializer(serializers.ModelSerializer):
 
     class Meta: #pylint:disable=old-style-class,no-init
         model = UploadedDocument
+        list_serializer_class = UploadedDocumentListSerializer
         fields = ('created_at', 'title', 'url', 'printable_name')
         read_only_fields = ('printable_name', 'url')
 
@@ -812,7 +688,10 @@ class UploadedDocumentSerializer(serializers.ModelSerializer):
         return obj.printable_name
 
     def get_url(self, obj):
-        return as_signed_url(obj.url, self.context['request'])
+        signed_url = self.context.get('signed_urls', {}).get(obj.url)
+        if signed_url is None:
+            signed_url = as_signed_url(obj.url, self.context['request'])
+        return signed_url
 
 
 class ApplicationDetailSerializer(serializers.ModelSerializer):
@@ -897,6 +776,8 @@ class ApplicationSummarySerializer(serializers.ModelSerializer):
     class Meta: #pylint:disable=old-style-class,no-init
         model = Application
         fields = ('created_at', 'slug', 'printable_name', 'status',
-            'lihtc_property', 'unit_number')
+            'lihtc_property', 'unit_number', 'household_size',
+            'annual_income')
         read_only_fields = ('created_at', 'slug',
-            'lihtc_property', 'unit_number')
+            'lihtc_property', 'unit_number', 'household_size',
+            'annual_income')
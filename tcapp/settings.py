@@ -4,6 +4,7 @@
 import logging, os.path, sys
 
 from django.contrib.messages import constants as messages
+from django.core.exceptions import ImproperlyConfigured
 from django.core.urlresolvers import reverse_lazy
 
 from deployutils.configs import load_config, update_settings
@@ -37,6 +38,22 @@ DATABASES = {
     }
 }
 
+# Optional read-only replica for reports, exports and PDF forms
+# (see ``tcapp.routers``). Connection parameters default to the primary's.
+if getattr(sys.modules[__name__], 'DB_REPLICA_NAME', None):
+    DATABASES['replica'] = {
+        'ENGINE': getattr(sys.modules[__name__],
+            'DB_REPLICA_ENGINE', DB_ENGINE),
+        'NAME': DB_REPLICA_NAME,
+        'USER': getattr(sys.modules[__name__], 'DB_REPLICA_USER', DB_USER),
+        'PASSWORD': getattr(sys.modules[__name__],
+            'DB_REPLICA_PASSWORD', DB_PASSWORD),
+        'HOST': getattr(sys.modules[__name__], 'DB_REPLICA_HOST', DB_HOST),
+        'PORT': getattr(sys.modules[__name__], 'DB_REPLICA_PORT', DB_PORT),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['tcapp.routers.ReplicaRouter']
+
 # Installed apps
 # --------------
 if DEBUG:
@@ -77,6 +94,7 @@ else:
     MIDDLEWARE_CLASSES = ()
 
 MIDDLEWARE_CLASSES += (
+    'tcapp.middleware.RequestPerformanceMiddleware',
     'django.middleware.common.CommonMiddleware',
     'deployutils.apps.django.middleware.RequestLoggingMiddleware',
     'deployutils.apps.django.middleware.SessionMiddleware',
@@ -89,6 +107,49 @@ MIDDLEWARE_CLASSES += (
 
 ROOT_URLCONF = 'tcapp.urls'
 
+# Records wall time, SQL queries, PDF rendering time and response size
+# of requests (see ``tcapp.middleware``). SQL queries are only recorded
+# on a sample of requests.
+if not hasattr(sys.modules[__name__], 'PERFORMANCE_INSTRUMENTATION'):
+    PERFORMANCE_INSTRUMENTATION = DEBUG
+if not hasattr(sys.modules[__name__], 'PERFORMANCE_SAMPLE_RATE'):
+    PERFORMANCE_SAMPLE_RATE = 0.1
+
+# Cache shared by the public project pages, cached API responses
+# and performance statistics. The versions that invalidate cached entries
+# (see ``tcapp.caches``) are stored in the cache itself, so all processes
+# must share it. 'locmem' is per-process, hence only allowed with DEBUG.
+# 'file' is shared by the workers of a single host. Use 'memcached'
+# when several hosts serve the site.
+if not hasattr(sys.modules[__name__], 'CACHE_BACKEND'):
+    CACHE_BACKEND = 'locmem' if DEBUG else 'file'
+if not hasattr(sys.modules[__name__], 'CACHE_LOCATION'):
+    CACHE_LOCATION = ''
+if CACHE_BACKEND not in ('memcached', 'file') and not DEBUG:
+    raise ImproperlyConfigured("CACHE_BACKEND '%s' is not shared between"
+        " processes. Use 'memcached' or 'file'." % CACHE_BACKEND)
+if CACHE_BACKEND == 'memcached':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': CACHE_LOCATION or '127.0.0.1:11211',
+        'KEY_PREFIX': APP_NAME,
+    }}
+elif CACHE_BACKEND == 'file':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or os.path.join(
+            APP_ROOT, 'var', 'cache', APP_NAME),
+        'KEY_PREFIX': APP_NAME,
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_LOCATION or APP_NAME,
+        'KEY_PREFIX': APP_NAME,
+    }}
+if not hasattr(sys.modules[__name__], 'PROJECT_CACHE_TIMEOUT'):
+    PROJECT_CACHE_TIMEOUT = 3600
+
 MANAGERS = ADMINS
 
 EMAIL_SUBJECT_PREFIX = '[%s] ' % APP_NAME
@@ -149,6 +210,9 @@ LOGGING = {
             'whitelists': {
                 'record': [
                     'nb_queries', 'queries_duration',
+                    'view_name', 'status_code', 'wall_duration',
+                    'pdf_duration', 'response_size', 'nb_duplicate_queries',
+                    'duplicate_queries',
                     'charge', 'amount', 'unit', 'modified',
                     'customer', 'organization', 'provider'],
             }
@@ -270,6 +334,15 @@ TIME_ZONE = 'UTC'
 ASSETS_DEBUG = DEBUG
 ASSETS_AUTO_BUILD = DEBUG
 ASSETS_ROOT = APP_ROOT + '/htdocs/static'
+# Bundles are written with a content hash in their filename. The manifest
+# records the current hash of each bundle so templates can link to it
+# without rebuilding bundles in production.
+ASSETS_VERSIONS = 'hash'
+ASSETS_MANIFEST = 'json:cache/manifest.json'
+ASSETS_URL_EXPIRE = False
+# Fingerprinted files never change, so they are cached for a year.
+if not hasattr(sys.modules[__name__], 'STATIC_FINGERPRINTED_MAX_AGE'):
+    STATIC_FINGERPRINTED_MAX_AGE = 365 * 24 * 3600
 
 # Absolute filesystem path to the directory that will hold user-uploaded files.
 # Example: "/var/www/example.com/media/"
@@ -1,27 +1,105 @@
 # Copyright (c) 2017, TeaCapp LLC
 #   All rights reserved.
 
-from django.conf import settings
-from django.db import connection
-from django.db.utils import OperationalError
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import Signal, receiver
-from extended_templates.backends import get_email_backend
+
+from .blobs import add_references
+from .caches import (bump_property_version, bump_rents_version,
+    bump_search_index_version)
+from .contacts import (CONTACTS_TABLES, get_property_contact,
+    invalidate_property_contacts)
+from .models import (Answer, Application, ApplicationResident, Asset,
+    HousingHistory, Income, Property, PropertyAMIUnits, Resident, Source,
+    UploadedDocument, UtilityAllowance)
+from .outbox import enqueue_application_created
+from .search import is_search_index_deferred, rebuild_search_index
+from .utils import datetime_or_now
 
 
 #pylint: disable=invalid-name
 application_created = Signal(providing_args=["application", "url"])
 
+_pending_summaries = threading.local()
+_pending_touches = threading.local()
+
+
 def get_lihtc_property_email(lihtc_property):
-    to_emails = [settings.DEFAULT_FROM_EMAIL]
-    try:
-        # XXX Hack to read a property e-mail address that can be updated
-        #     through an organization profile page.
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT auth_user.email FROM auth_user INNER JOIN saas_role ON auth_user.id = saas_role.user_id INNER JOIN saas_organization ON saas_role.organization_id = saas_organization.id WHERE saas_role.role_description_id = 1 AND slug='%s'" % lihtc_property.slug) #pylint:disable=line-too-long
-            to_emails = [row[0] for row in cursor.fetchall()]
-    except OperationalError:
-        pass
-    return to_emails
+    return get_property_contact(lihtc_property)
+
+
+def update_application_summaries():
+    """
+    Recomputes the denormalized household summary of all applications
+    scheduled through ``schedule_application_summaries``.
+    """
+    application_ids = getattr(_pending_summaries, 'application_ids', None)
+    if not application_ids:
+        return
+    _pending_summaries.application_ids = set([])
+    for application in Application.objects.filter(
+            pk__in=application_ids).select_related(
+            'lihtc_property__county'):
+        application.update_summary()
+
+
+def schedule_application_summaries(application_ids):
+    """
+    Schedules the household summary of *application_ids* to be recomputed
+    once the current transaction commits, so that a household created
+    or updated in a single transaction is only summarized once.
+    """
+    application_ids = set(application_ids)
+    if not application_ids:
+        return
+    pending = getattr(_pending_summaries, 'application_ids', None)
+    if pending is None:
+        pending = set([])
+        _pending_summaries.application_ids = pending
+    pending.update(application_ids)
+    # Implementation Note: Only the first callback that runs does any work.
+    # If the transaction is rolled back, the ids stay pending and are
+    # harmlessly recomputed on the next commit.
+    transaction.on_commit(update_application_summaries)
+
+
+def touch_applications():
+    """
+    Sets ``updated_at`` of all applications scheduled through
+    ``schedule_application_touches``, in a single statement.
+    """
+    application_ids = getattr(_pending_touches, 'application_ids', None)
+    if not application_ids:
+        return
+    _pending_touches.application_ids = set([])
+    # We use ``update`` so no ``post_save`` signal is triggered.
+    Application.objects.filter(pk__in=application_ids).update(
+        updated_at=datetime_or_now())
+
+
+def schedule_application_touches(application_ids):
+    """
+    Schedules ``updated_at`` of *application_ids* to be set once
+    the current transaction commits, such that the HTTP validators
+    of an application change when any record of its household does.
+    """
+    application_ids = set(application_ids)
+    if not application_ids:
+        return
+    pending = getattr(_pending_touches, 'application_ids', None)
+    if pending is None:
+        pending = set([])
+        _pending_touches.application_ids = pending
+    pending.update(application_ids)
+    transaction.on_commit(touch_applications)
+
+
+def _resident_application_ids(resident_id):
+    return list(ApplicationResident.objects.filter(
+        resident_id=resident_id).values_list('application_id', flat=True))
 
 
 # We insure the method is only bounded once no matter how many times
@@ -29,14 +107,143 @@ def get_lihtc_property_email(lihtc_property):
 #   https://docs.djangoproject.com/en/dev/topics/signals/
 @receiver(application_created, dispatch_uid="application_created_notice")
 def application_created_notice(sender, application, url, **kwargs):
+    """
+    Records the notice in the outbox. It is sent out of the request path
+    by the ``dispatch_outbox`` command.
+    """
+    #pylint:disable=unused-argument
+    enqueue_application_created(application, url)
+
+
+@receiver(post_save, sender=ApplicationResident,
+    dispatch_uid="application_resident_saved_summary")
+@receiver(post_delete, sender=ApplicationResident,
+    dispatch_uid="application_resident_deleted_summary")
+def application_resident_summary(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    schedule_application_summaries([instance.application_id])
+    schedule_application_touches([instance.application_id])
+
+
+@receiver(post_save, sender=Resident, dispatch_uid="resident_saved_summary")
+def resident_summary(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    application_ids = _resident_application_ids(instance.pk)
+    schedule_application_summaries(application_ids)
+    schedule_application_touches(application_ids)
+
+
+@receiver(post_save, sender=Income, dispatch_uid="income_saved_summary")
+@receiver(post_delete, sender=Income, dispatch_uid="income_deleted_summary")
+@receiver(post_save, sender=Asset, dispatch_uid="asset_saved_summary")
+@receiver(post_delete, sender=Asset, dispatch_uid="asset_deleted_summary")
+def income_summary(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    application_ids = _resident_application_ids(instance.resident_id)
+    schedule_application_summaries(application_ids)
+    schedule_application_touches(application_ids)
+
+
+@receiver(post_save, sender=Answer, dispatch_uid="answer_saved_touch")
+@receiver(post_delete, sender=Answer, dispatch_uid="answer_deleted_touch")
+@receiver(post_save, sender=Source, dispatch_uid="source_saved_touch")
+@receiver(post_delete, sender=Source, dispatch_uid="source_deleted_touch")
+@receiver(post_save, sender=HousingHistory,
+    dispatch_uid="housing_history_saved_touch")
+@receiver(post_delete, sender=HousingHistory,
+    dispatch_uid="housing_history_deleted_touch")
+def resident_record_touch(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    schedule_application_touches(
+        _resident_application_ids(instance.resident_id))
+
+
+@receiver(post_save, sender=UploadedDocument,
+    dispatch_uid="uploaded_document_saved_touch")
+@receiver(post_delete, sender=UploadedDocument,
+    dispatch_uid="uploaded_document_deleted_touch")
+def uploaded_document_touch(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    schedule_application_touches([instance.application_id])
+
+
+@receiver(post_save, sender=Property, dispatch_uid="property_saved_contacts")
+@receiver(post_delete, sender=Property,
+    dispatch_uid="property_deleted_contacts")
+def property_contacts(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    invalidate_property_contacts([instance])
+
+
+@receiver(post_save, dispatch_uid="contacts_saved")
+@receiver(post_delete, dispatch_uid="contacts_deleted")
+def saas_contacts(sender, **kwargs):
+    #pylint:disable=protected-access
+    # The saas models are not imported by tcapp, so we match on tables.
+    if sender._meta.db_table not in CONTACTS_TABLES:
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) == set(['last_login']):
+        # Sent on every login.
+        return
+    invalidate_property_contacts()
+
+
+@receiver(post_save, sender=Property, dispatch_uid="property_saved_cache")
+@receiver(post_delete, sender=Property, dispatch_uid="property_deleted_cache")
+def property_cache(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    bump_property_version(instance)
+
+
+@receiver(post_save, sender=Property, dispatch_uid="property_saved_search")
+def property_search_index(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    # Also sent for properties loaded from fixtures (``raw=True``).
+    if not is_search_index_deferred():
+        rebuild_search_index([instance])
+
+
+@receiver(post_delete, sender=Property, dispatch_uid="property_deleted_search")
+def property_search_index_deleted(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    # Search terms are deleted along with the property.
+    bump_search_index_version()
+
+
+@receiver(post_save, sender=PropertyAMIUnits,
+    dispatch_uid="property_ami_units_saved_cache")
+@receiver(post_delete, sender=PropertyAMIUnits,
+    dispatch_uid="property_ami_units_deleted_cache")
+def property_ami_units_cache(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    bump_property_version(instance.lihtc_property)
+
+
+@receiver(post_save, sender=Application,
+    dispatch_uid="application_saved_rents")
+@receiver(post_delete, sender=Application,
+    dispatch_uid="application_deleted_rents")
+@receiver(post_save, sender=UtilityAllowance,
+    dispatch_uid="utility_allowance_saved_rents")
+@receiver(post_delete, sender=UtilityAllowance,
+    dispatch_uid="utility_allowance_deleted_rents")
+def rents_cache(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    bump_rents_version(instance.lihtc_property)
+
+
+@receiver(post_save, sender=UploadedDocument,
+    dispatch_uid="uploaded_document_saved_blob")
+def uploaded_document_blob_saved(sender, instance, created, **kwargs):
+    #pylint:disable=unused-argument
+    if created and instance.blob_id:
+        add_references({instance.blob_id: 1})
+
+
+@receiver(post_delete, sender=UploadedDocument,
+    dispatch_uid="uploaded_document_deleted_blob")
+def uploaded_document_blob_deleted(sender, instance, **kwargs):
     #pylint:disable=unused-argument
-    get_email_backend().send(
-        recipients=get_lihtc_property_email(application.lihtc_property),
-        reply_to=settings.DEFAULT_FROM_EMAIL,
-        template='notification/application_created.eml',
-        context={'site': application.lihtc_property,
-            'provider': {
-                'email': settings.DEFAULT_FROM_EMAIL,
-                'phone': "17084622842"},
-            'application': application,
-            'back_url': url})
+    if instance.blob_id:
+        add_references({instance.blob_id: -1})
@@ -0,0 +1,167 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Signed URLs to uploaded documents.
+
+Documents are stored in S3 and handed to browsers as pre-signed URLs,
+signed with the credentials found in the session. A signed URL is valid
+for ``AWS_QUERYSTRING_EXPIRE`` seconds. It is cached, keyed by document
+and credentials, and reused for the first half of that period. Reusing
+URLs also lets browsers reuse their cached copy of a document.
+
+Connections to S3 (``S3BotoStorage``) are kept per bucket and credentials
+in a bounded, process-local cache so signing a list of documents does not
+re-create one connection per document.
+"""
+from __future__ import unicode_literals
+
+import hashlib, logging, threading, time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import six
+
+#pylint:disable=no-name-in-module,import-error
+from django.utils.six.moves.urllib.parse import urlparse
+
+
+LOGGER = logging.getLogger(__name__)
+
+SIGNED_URL_EXPIRE = getattr(settings, 'AWS_QUERYSTRING_EXPIRE', 3600)
+# A signed URL is reused while at least half its validity period remains,
+# so a URL handed out is always valid for ``SIGNED_URL_REUSE_PERIOD``.
+SIGNED_URL_REUSE_PERIOD = SIGNED_URL_EXPIRE // 2
+
+CREDENTIALS_KEYS = ('access_key', 'secret_key', 'security_token')
+
+
+class TTLCache(object):
+    """
+    Thread-safe cache whose entries expire after *timeout* seconds.
+    When more than *max_entries* are stored, the least recently
+    inserted entries are evicted first.
+    """
+
+    def __init__(self, timeout, max_entries):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    expires_at, value = entry
+                    if expires_at > now:
+                        found[key] = value
+                    else:
+                        del self._entries[key]
+        return found
+
+    def set_many(self, values):
+        expires_at = time.time() + self.timeout
+        with self._lock:
+            for key, value in six.iteritems(values):
+                self._entries.pop(key, None)
+                self._entries[key] = (expires_at, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys=None):
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+
+_storages = TTLCache(300, 100) #pylint:disable=invalid-name
+
+
+def parse_location(location):
+    """
+    Returns the bucket name and key name of a document at *location*.
+    """
+    parts = urlparse(location)
+    bucket_name = parts.netloc.split('.')[0]
+    key_name = parts.path
+    if bucket_name.startswith('s3-'):
+        name_parts = key_name.split('/')
+        if name_parts and not name_parts[0]:
+            name_parts.pop(0)
+        bucket_name = name_parts[0]
+        key_name = '/'.join(name_parts[1:])
+    if key_name.startswith('/'):
+        # we rename leading '/' otherwise S3 copy triggers a 404
+        # because it creates an URL with '//'.
+        key_name = key_name[1:]
+    return bucket_name, key_name
+
+
+def get_credentials(request):
+    return {key: request.session[key]
+        for key in CREDENTIALS_KEYS if key in request.session}
+
+
+def get_credentials_identity(credentials):
+    """
+    Returns a digest identifying *credentials* without revealing them.
+    """
+    return hashlib.sha256('|'.join([credentials.get(key, '')
+        for key in CREDENTIALS_KEYS]).encode('utf-8')).hexdigest()[:32]
+
+
+def get_storage(bucket_name, credentials, identity):
+    # boto is slow to import and only needed here, so we defer importing
+    # it until a document URL is signed.
+    from storages.backends.s3boto import S3BotoStorage
+    key = (bucket_name, identity)
+    storage = _storages.get_many([key]).get(key)
+    if storage is None:
+        storage = S3BotoStorage(bucket=bucket_name, **credentials)
+        _storages.set_many({key: storage})
+    return storage
+
+
+def _signed_url_cache_key(location, identity):
+    return 'signed-url-%s' % hashlib.md5(
+        ('%s|%s' % (location, identity)).encode('utf-8')).hexdigest()
+
+
+def as_signed_urls(locations, request):
+    """
+    Returns a dictionnary of signed URLs keyed by location, for all
+    *locations*, signed with the credentials in *request* session.
+    """
+    credentials = get_credentials(request)
+    identity = get_credentials_identity(credentials)
+    cache_keys = {location: _signed_url_cache_key(location, identity)
+        for location in set(locations)}
+    cached = cache.get_many(list(six.itervalues(cache_keys)))
+    signed_urls = {}
+    new_signed_urls = {}
+    for location, cache_key in six.iteritems(cache_keys):
+        signed_url = cached.get(cache_key)
+        if signed_url is None:
+            bucket_name, key_name = parse_location(location)
+            if not credentials:
+                LOGGER.error("called `as_signed_url(bucket_name=%s,"\
+                    " key_name=%s)` with no credentials.",
+                    bucket_name, key_name)
+            signed_url = get_storage(
+                bucket_name, credentials, identity).url(key_name)
+            new_signed_urls[cache_key] = signed_url
+        signed_urls[location] = signed_url
+    if new_signed_urls:
+        cache.set_many(new_signed_urls, SIGNED_URL_REUSE_PERIOD)
+    return signed_urls
+
+
+def as_signed_url(location, request):
+    return as_signed_urls([location], request)[location]
@@ -3,6 +3,7 @@
 
 from django.conf import settings
 from django.conf.urls import url
+from django.utils.module_loading import import_string
 
 if settings.DEBUG:
     # In debug mode we add a path_prefix such that we can test
@@ -17,3 +18,33 @@ def url_prefixed(regex, view, name=None):
     """
     return url(r'^%(app_prefix)s%(regex)s' % {
         'app_prefix': APP_PREFIX, 'regex': regex}, view, name=name)
+
+
+def lazy_view(dotted_path, **initkwargs):
+    """
+    Returns a view function that imports the class-based view
+    at *dotted_path* the first time it is called.
+
+    This keeps large, rarely used, view modules (ex: PDF forms) out
+    of worker and management command startup.
+    """
+    views = []
+    def view(request, *args, **kwargs):
+        if not views:
+            views.append(import_string(dotted_path).as_view(**initkwargs))
+        return views[0](request, *args, **kwargs)
+    view.__name__ = str(dotted_path.split('.')[-1])
+    view.__module__ = str(dotted_path.rsplit('.', 1)[0])
+    view.view_class_path = dotted_path
+    return view
+
+
+def get_view_class(view):
+    """
+    Returns the class-based view behind *view*, as returned
+    by ``as_view`` or ``lazy_view``.
+    """
+    view_class_path = getattr(view, 'view_class_path', None)
+    if view_class_path:
+        return import_string(view_class_path)
+    return view.view_class
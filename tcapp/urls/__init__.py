@@ -6,10 +6,11 @@ from django.conf.urls import include, url
 from django.views.generic import TemplateView
 from django.views.static import serve as static_serve
 
-from ..urlbuilders import url_prefixed
+from ..urlbuilders import lazy_view, url_prefixed
 from ..views.application import (ApplicationView, ApplicationBaseView,
     ApplicationChecklistView, ApplicationDetailView, ApplicationDocumentsView)
 from ..views.project import ProjectDetailView, ProjectSearchView
+from ..views.static import serve as serve_precompressed
 from ..views.resident import (DemographicProfileView, ResidentCreateView,
     ResidentUpdateView)
 from ..views.tenant import (
@@ -28,13 +29,6 @@ from ..views.tenant import (
     SudentFinancialAidIncomeCreateView,
     UpdateIncomeSourceView, TenantContactView)
 from ..views.calculation import HouseholdCalculation
-from ..views.downloads import IncomeReportCSVView
-from ..views.verification import (InitialApplicationView,
-    LeaseView, LeaseRiderView, VerificationEmploymentView,
-    ZeroIncomeView, ChildOrSpousalSupportView, ChildOrSpousalAffidavitView,
-    FosterCareView, LiveInAidView, MaritalSeparationView, SingleParentView,
-    StudentFinancialAidView, StudentStatusView, TICView, TICQView,
-    Under5000AssetsView)
 
 if settings.DEBUG: #pylint: disable=no-member
     from django.contrib import admin
@@ -56,7 +50,7 @@ if settings.DEBUG: #pylint: disable=no-member
 else:
     urlpatterns = [
         url(r'^%s(?P<path>.*)$' % settings.STATIC_URL[1:], # remove leading '/'
-            static_serve, {'document_root': settings.STATIC_ROOT}),
+            serve_precompressed, {'document_root': settings.STATIC_ROOT}),
         url(r'^media/(?P<path>.*)$',
             static_serve, {'document_root': settings.MEDIA_ROOT}),
     ]
@@ -167,63 +161,64 @@ r'app/(?P<project>%s)/verification/(?P<resident>%s)/income/'\
     url_prefixed(
 r'app/(?P<project>%s)/verification/(?P<resident>%s)/employment/(?P<source>%s)/'
         % (settings.SLUG_RE, settings.SLUG_RE, settings.SLUG_RE),
-        VerificationEmploymentView.as_view(),
+        lazy_view('tcapp.views.verification.VerificationEmploymentView'),
         name='tenant_verification_employment'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/employment/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        VerificationEmploymentView.as_view(),
+        lazy_view('tcapp.views.verification.VerificationEmploymentView'),
         name='tenant_verification_employment_base'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/zero-income/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        ZeroIncomeView.as_view(),
+        lazy_view('tcapp.views.verification.ZeroIncomeView'),
         name='tenant_verification_zero_income'),
     url_prefixed(
 r'app/(?P<project>%s)/verification/(?P<resident>%s)/support/'\
 '(?P<source>%s)/affidavit/'
         % (settings.SLUG_RE, settings.SLUG_RE, settings.SLUG_RE),
-        ChildOrSpousalAffidavitView.as_view(),
+        lazy_view('tcapp.views.verification.ChildOrSpousalAffidavitView'),
         name='tenant_verification_child_or_spousal_affidavit'),
     url_prefixed(
     r'app/(?P<project>%s)/verification/(?P<resident>%s)/support/(?P<source>%s)/'
         % (settings.SLUG_RE, settings.SLUG_RE, settings.SLUG_RE),
-        ChildOrSpousalSupportView.as_view(),
+        lazy_view('tcapp.views.verification.ChildOrSpousalSupportView'),
         name='tenant_verification_child_or_spousal_support'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/foster-care/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        FosterCareView.as_view(),
+        lazy_view('tcapp.views.verification.FosterCareView'),
         name='tenant_verification_foster_care'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/live-in-aid/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        LiveInAidView.as_view(),
+        lazy_view('tcapp.views.verification.LiveInAidView'),
         name='tenant_verification_live_in_aid'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/marital-separation/'
         % (settings.SLUG_RE, settings.SLUG_RE),
-        MaritalSeparationView.as_view(),
+        lazy_view('tcapp.views.verification.MaritalSeparationView'),
         name='tenant_verification_marital_separation'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/single-parent/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        SingleParentView.as_view(),
+        lazy_view('tcapp.views.verification.SingleParentView'),
         name='tenant_verification_single_parent'),
     url_prefixed(
     r'app/(?P<project>%s)/verification/(?P<resident>%s)/student-financial-aid/'
         % (settings.SLUG_RE, settings.SLUG_RE),
-        StudentFinancialAidView.as_view(),
+        lazy_view('tcapp.views.verification.StudentFinancialAidView'),
         name='tenant_verification_student_financial_aid'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<resident>%s)/student-status/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        StudentStatusView.as_view(),
+        lazy_view('tcapp.views.verification.StudentStatusView'),
         name='tenant_verification_student_status'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<application>%s)/tic/download/'
         % (settings.SLUG_RE, settings.SLUG_RE),
-        TICView.as_view(), name='verification_tic'),
+        lazy_view('tcapp.views.verification.TICView'),
+        name='verification_tic'),
     url_prefixed(r'app/(?P<project>%s)/verification/(?P<application>%s)/tic/'
         % (settings.SLUG_RE, settings.SLUG_RE),
         ApplicationDetailView.as_view(), name='application_detail'),
@@ -236,19 +231,21 @@ r'app/(?P<project>%s)/verification/(?P<resident>%s)/support/'\
     url_prefixed(
     r'app/(?P<project>%s)/verification/(?P<application>%s)/initial-application/'
         % (settings.SLUG_RE, settings.SLUG_RE),
-        InitialApplicationView.as_view(),
+        lazy_view('tcapp.views.verification.InitialApplicationView'),
         name='verification_initial_application'),
     url_prefixed(
         r'app/(?P<project>%s)/verification/(?P<application>%s)/lease-rider/'
         % (settings.SLUG_RE, settings.SLUG_RE),
-        LeaseRiderView.as_view(), name='verification_lease_rider'),
+        lazy_view('tcapp.views.verification.LeaseRiderView'),
+        name='verification_lease_rider'),
     url_prefixed(r'app/(?P<project>%s)/verification/(?P<application>%s)/lease/'
         % (settings.SLUG_RE, settings.SLUG_RE),
-        LeaseView.as_view(), name='verification_lease'),
+        lazy_view('tcapp.views.verification.LeaseView'),
+        name='verification_lease'),
     url_prefixed(
     r'app/(?P<project>%s)/verification/(?P<resident>%s)/under-5000-assets/' %
         (settings.SLUG_RE, settings.SLUG_RE),
-        Under5000AssetsView.as_view(),
+        lazy_view('tcapp.views.verification.Under5000AssetsView'),
         name='tenant_verification_under_5000_assets'),
   url_prefixed(r'app/(?P<project>%s)/verification/(?P<resident>%s)/demoprofile/'
         % (settings.SLUG_RE, settings.SLUG_RE),
@@ -261,11 +258,13 @@ r'app/(?P<project>%s)/verification/(?P<resident>%s)/support/'\
         ResidentUpdateView.as_view(), name='resident_update'),
     url_prefixed(r'app/(?P<project>%s)/report/' %
         settings.SLUG_RE,
-        IncomeReportCSVView.as_view(), name='income_report'),
+        lazy_view('tcapp.views.downloads.IncomeReportCSVView'),
+        name='income_report'),
     url_prefixed(r'app/(?P<project>%s)/(?P<application>%s)/'\
         'calculation/(?P<resident>%s)/ticq/' % (
             settings.SLUG_RE, settings.SLUG_RE, settings.SLUG_RE),
-        TICQView.as_view(), name='tenant_verification_ticq'),
+        lazy_view('tcapp.views.verification.TICQView'),
+        name='tenant_verification_ticq'),
     url_prefixed(r'app/(?P<project>%s)/(?P<application>%s)/calculation/'
         % (settings.SLUG_RE, settings.SLUG_RE),
         HouseholdCalculation.as_view(), name='calculation'),
@@ -6,9 +6,11 @@ from django.conf.urls import url
 
 from ..api.applications import (ApplicationAPIView, ApplicationCreateAPIView,
     ApplicationDetailAPIView)
+from ..api.compliance import RentComplianceAPIView
 from ..api.residents import ApplicationResidentAPIView
+from ..api.simulations import EligibilitySimulationAPIView
 from ..api.trials import RequestDemoAPIView
-from ..api.documents import DocumentUploadView
+from ..api.documents import BulkDocumentUploadView, DocumentUploadView
 
 urlpatterns = [
     url(r'^projects/(?P<project>%s)/request/' % settings.SLUG_RE,
@@ -16,6 +18,13 @@ urlpatterns = [
         name='api_request_demo'),
     url(r'^projects/(?P<project>%s)/application/' % settings.SLUG_RE,
         ApplicationCreateAPIView.as_view(), name='api_application_create'),
+    url(r'^properties/(?P<project>%s)/simulate/' % settings.SLUG_RE,
+        EligibilitySimulationAPIView.as_view(), name='api_simulate'),
+    url(r'^properties/(?P<project>%s)/compliance/rents/' % settings.SLUG_RE,
+        RentComplianceAPIView.as_view(), name='api_rent_compliance'),
+    url(r'^properties/(?P<project>%s)/applications/(?P<application>%s)'\
+        '/upload/bulk/' % (settings.SLUG_RE, settings.SLUG_RE),
+        BulkDocumentUploadView.as_view(), name='api_document_bulk_upload'),
     url(r'^properties/(?P<project>%s)/applications/(?P<application>%s)/upload/'
         % (settings.SLUG_RE, settings.SLUG_RE),
         DocumentUploadView.as_view(), name='api_document_upload'),
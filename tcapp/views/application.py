@@ -1,11 +1,12 @@
 # Copyright (c) 2017, TeaCapp LLC
 #   All rights reserved.
 
-import datetime, json, logging
+import datetime, hashlib, json, logging
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.contrib import messages
+from django.core.cache import cache
 from django.http import HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.utils.timezone import utc
@@ -15,6 +16,7 @@ from deployutils.apps.django.templatetags.deployutils_prefixtags import (
     site_prefixed)
 
 from ..api.applications import ApplicationCreateAPIView
+from ..budgets import QueryBudget, QueryBudgetMixin
 from ..forms import ApplicationForm, ApplicationCreateForm
 from ..mixins import ApplicationMixin, CalculationMixin, ManagerMixin
 from ..models import (Application, Property, Resident, RentLimit,
@@ -87,10 +89,12 @@ class DocumentReference(object):
         return result
 
 
-class ApplicationChecklistView(ApplicationMixin, DetailView):
+class ApplicationChecklistView(QueryBudgetMixin, ApplicationMixin,
+                               DetailView):
 
     template_name = 'tcapp/application_checklist.html'
     model = Application
+    query_budget = QueryBudget(base=6, per_resident=8)
 
     def get_object(self, queryset=None):
         return self.application
@@ -105,10 +109,13 @@ class ApplicationChecklistView(ApplicationMixin, DetailView):
                 tzinfo=utc)
         for tenant in self.application.applicants.filter(
             date_of_birth__lte=adult_born_before):
+            # Each list of sources is loaded once for the documents and forms.
+            employee_sources = list(tenant.employee_sources())
+            support_sources = list(tenant.child_spousal_support_sources())
             # Supporting documentation required to be in the file.
             documents = []
-            if tenant.employee_sources().count() > 0:
-                for source in tenant.employee_sources():
+            if employee_sources:
+                for source in employee_sources:
                     documents += [DocumentReference(
                         UploadedDocument.CONSECUTIVE_PAYSTUBS,
                         self.application, tenant=tenant, source=source)
@@ -123,8 +130,9 @@ class ApplicationChecklistView(ApplicationMixin, DetailView):
                     UploadedDocument.LEGAL_SEPARATION_AGREEMENT,
                     self.application, tenant=tenant)
                 ]
-            if tenant.support_awards_sources().count() > 0:
-                for source in tenant.support_awards_sources():
+            support_awards_sources = list(tenant.support_awards_sources())
+            if support_awards_sources:
+                for source in support_awards_sources:
                     documents += [DocumentReference(
                         UploadedDocument.COURT_AWARD,
                         self.application, tenant=tenant, source=source)]
@@ -141,8 +149,8 @@ class ApplicationChecklistView(ApplicationMixin, DetailView):
                               self.application, tenant,))
                 ),
             ]
-            if tenant.employee_sources().count() > 0:
-                for source in tenant.employee_sources():
+            if employee_sources:
+                for source in employee_sources:
                     forms += [DocumentReference(
                         UploadedDocument.VERIFICATION_OF_EMPLOYMENT,
                         self.application,
@@ -157,8 +165,8 @@ class ApplicationChecklistView(ApplicationMixin, DetailView):
                     tenant=tenant,
                     link=reverse('tenant_verification_marital_separation',
                         args=(self.application.lihtc_property, tenant,)))]
-            if tenant.child_spousal_support_sources().count() > 0:
-                for source in tenant.child_spousal_support_sources():
+            if support_sources:
+                for source in support_sources:
                     forms += [DocumentReference(
                         UploadedDocument.DEPENDANT_SUPPORT_AFFIDAVIT,
                         self.application,
@@ -167,7 +175,7 @@ class ApplicationChecklistView(ApplicationMixin, DetailView):
                         'tenant_verification_child_or_spousal_affidavit',
                         args=(self.application.lihtc_property,
                               tenant, str(source.slug))))]
-                for source in tenant.child_spousal_support_sources():
+                for source in support_sources:
                     forms += [DocumentReference(
                         UploadedDocument.DEPENDANT_SUPPORT_VERIFICATION,
                         self.application,
@@ -325,31 +333,48 @@ class ApplicationDocumentsView(ApplicationMixin, DetailView):
 
 
 class ApplicationBaseView(ManagerMixin, ListView):
+    """
+    Lists the LIHTC properties managed by ``request.user``.
 
+    The properties are loaded in a single query then cached
+    for ``cache_timeout`` seconds per user. Applications are loaded
+    by the page through the API.
+    """
     template_name = 'tcapp/application_list.html'
+    cache_timeout = 30
 
     def get_queryset(self):
         queryset = Application.objects.filter(
             lihtc_property__account__in=self.managed_accounts)
         return queryset
 
-    def get_context_data(self, **kwargs):
-        context = super(ApplicationBaseView, self).get_context_data(**kwargs)
-        by_accounts = {}
-        for account in self.managed_accounts:
-            try:
-                project = Property.objects.get(slug=account)
+    def get_by_accounts(self):
+        """
+        Returns the projects managed by ``request.user`` by account.
+        """
+        managed_accounts = sorted(self.managed_accounts)
+        cache_key = 'application-base-%s-%s' % (self.request.user.pk,
+            hashlib.md5(','.join(managed_accounts).encode('utf-8')).hexdigest())
+        by_accounts = cache.get(cache_key)
+        if by_accounts is None:
+            # ``request.user`` could be a manager for tcapp proper,
+            # in which case there is no ``Property`` for the account.
+            by_accounts = {}
+            for project in Property.objects.filter(
+                    slug__in=managed_accounts).select_related('county'):
                 project.urls = {'api': {'applications': reverse(
                     'api_applications', args=(project,))}}
-                by_accounts[account] = {'project': project}
-            except Property.DoesNotExist:
-                # ``request.user`` could be a manager for tcapp proper.
-                pass
+                by_accounts[project.slug] = {'project': project}
+            cache.set(cache_key, by_accounts, self.cache_timeout)
+        return by_accounts
+
+    def get_context_data(self, **kwargs):
+        context = super(ApplicationBaseView, self).get_context_data(**kwargs)
         url_projects = reverse('project_search')
         if not self.manages(settings.APP_NAME):
             url_projects = "%s?next=%s" % (
                 site_prefixed('logout/'), url_projects)
-        context.update({'by_accounts': by_accounts,
+        context.update({'by_accounts': self.get_by_accounts(),
             'statuses': [
                 (str(status[1]), Application.HUMANIZED_STATUS[status[0]][1])
                 for status in Application.STATUS],
@@ -394,6 +419,17 @@ class ApplicationView(CalculationMixin, TemplateResponseMixin,
         response = super(ApplicationView, self).post(request, *args, **kwargs)
         if response.status_code not in (200, 201):
             return response
+        if self.is_estimate:
+            # Nothing was saved. The prospect will have to submit
+            # the application to be contacted by the property staff.
+            context = self.get_context_data(**self.kwargs)
+            context.update({'estimate': response.data})
+            return TemplateResponse(
+                request=self.request,
+                template='tcapp/application_estimate.html',
+                context=context,
+                using=self.template_engine,
+                content_type=self.content_type)
         self._application = Application.objects.get(slug=response.data['slug'])
         context = self.get_context_data(**self.kwargs)
         if self.manages(self.application.lihtc_property.slug):
@@ -10,9 +10,11 @@ from django.http import HttpResponse
 from django.views.generic import View
 from deployutils.helpers import datetime_or_now
 
-from .verification import DATETIME_FORMAT
-from ..models import Application
-from ..humanize import as_money
+from ..annualize import applications_total_income
+from ..budgets import QueryBudget, QueryBudgetMixin
+from ..models import Application, ApplicationResident
+from ..humanize import DATETIME_FORMAT, as_money
+from ..routers import use_replica
 from .. import mixins
 
 
@@ -24,6 +26,7 @@ class CSVDownloadView(View):
     basename = 'download'
     headings = []
 
+    @use_replica()
     def get(self, *args, **kwargs): #pylint: disable=unused-argument
         content = BytesIO()
         csv_writer = csv.writer(content)
@@ -53,20 +56,41 @@ class CSVDownloadView(View):
         raise NotImplementedError
 
 
-class IncomeReportCSVView(mixins.PropertyMixin, CSVDownloadView):
+class IncomeReportCSVView(QueryBudgetMixin, mixins.PropertyMixin,
+                          CSVDownloadView):
 
     basename = 'income-report'
     headings = ['Created at', 'Full name', 'Family size', 'Annual income',
         'Income limit 60% AMI', 'Income limit 50% AMI', 'status', 'Unit']
+    query_budget = QueryBudget(base=10, per_application=5)
+
+    def get_query_budget_scale(self):
+        queryset = self.get_queryset()
+        return {'nb_applications': queryset.count(),
+            'nb_residents': ApplicationResident.objects.filter(
+                application__in=queryset).count()}
 
     def get_queryset(self):
         return Application.objects.filter(
-            lihtc_property__slug=self.project).order_by('-created_at')
+            lihtc_property__slug=self.project).select_related(
+            'lihtc_property__county').order_by('-created_at')
+
+    @property
+    def total_incomes(self):
+        # Incomes of all applications are annualized in a single pass.
+        if not hasattr(self, '_total_incomes'):
+            self._total_incomes = applications_total_income(
+                self.get_queryset())
+        return self._total_incomes
 
     def queryrow_to_columns(self, record):
         application = record
+        annual_income = (self.total_incomes.get(application.pk, 0)
+            + application.total_income_from_assets)
+        # Residents were loaded to compute income from assets.
+        family_size = len(application.applicant_residents)
         limit = application.lihtc_property.county.income_limits.filter(
-            family_size=application.family_size,
+            family_size=family_size,
             created_at__lt=application.effective_date).order_by(
                 '-created_at').first()
         if limit is not None:
@@ -78,9 +102,8 @@ class IncomeReportCSVView(mixins.PropertyMixin, CSVDownloadView):
         return (
             application.created_at.strftime(DATETIME_FORMAT),
             application.printable_name,
-            application.family_size,
-            as_money(application.total_annual_income,
-                     whole_dollars=True),
+            family_size,
+            as_money(annual_income, whole_dollars=True),
             limit_60, limit_50,
             dict(Application.HUMANIZED_STATUS)[application.status],
             application.unit_number)
@@ -4,14 +4,17 @@
 import logging
 from collections import OrderedDict
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect
 from django.views.generic import DetailView, ListView
-from extra_views.contrib.mixins import SearchableListMixin
 
+from ..caches import (PROJECT_CACHE_TIMEOUT, get_project_cache_key,
+    get_project_cache_version)
 from ..forms import ProjectSearchForm
 from ..mixins import PropertyMixin
 from ..models import Property, PropertyAMIUnits
+from ..search import search_properties
 
 
 LOGGER = logging.getLogger(__name__)
@@ -20,12 +23,30 @@ LOGGER = logging.getLogger(__name__)
 class ProjectDetailView(PropertyMixin, DetailView):
     """
     Public information about a LIHTC property.
+
+    The limits tables are cached until the property is updated or new
+    limits are imported (see ``tcapp.caches``).
     """
 
     template_name = 'tcapp/project/project.html'
 
-    def get_context_data(self, **kwargs):
-        context = super(ProjectDetailView, self).get_context_data(**kwargs)
+    def get_limits(self):
+        """
+        Returns the income and rent limits keyed by AMI percentage,
+        the date they are effective and the path to the wizard.
+        """
+        cache_key = get_project_cache_key(self.project, 'limits')
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = {
+                'limits': self.compute_limits(),
+                'effective_date': self.project.county.current_effective_date,
+                'application_path': reverse(
+                    'application_wizard', args=(self.project,))}
+            cache.set(cache_key, cached, PROJECT_CACHE_TIMEOUT)
+        return cached
+
+    def compute_limits(self):
         limits = OrderedDict()
         for ami_units in PropertyAMIUnits.objects.filter(
                 lihtc_property=self.project).order_by('-ami_percentage'):
@@ -56,10 +77,18 @@ class ProjectDetailView(PropertyMixin, DetailView):
                      rent_limit.as_percent(ami_percentage))]
             limits[ami_percentage] = {
                 'income': income_limits, 'rent': rent_limits}
+        return limits
+
+    def get_context_data(self, **kwargs):
+        context = super(ProjectDetailView, self).get_context_data(**kwargs)
+        cached = self.get_limits()
         context.update({
-            'limits': limits,
-            'application_url': self.request.build_absolute_uri(reverse(
-                'application_wizard', args=(self.project,)))
+            'limits': cached['limits'],
+            'limits_effective_date': cached['effective_date'],
+            'cache_version': get_project_cache_version(self.project),
+            'cache_timeout': PROJECT_CACHE_TIMEOUT,
+            'application_url': self.request.build_absolute_uri(
+                cached['application_path'])
         })
         return context
 
@@ -71,20 +100,22 @@ class ProjectListMixin(object):
         return Property.objects.all()
 
 
-class ProjectSearchView(SearchableListMixin, ProjectListMixin, ListView):
+class ProjectSearchView(ProjectListMixin, ListView):
     """
-    Search for a project based on its TCC number.
+    Search for a project based on its TCC number, name or locality.
+
+    Results are looked up through the ``PropertySearchTerm`` index
+    (see ``tcapp.search``) and ranked by match quality.
     """
 
     form_class = ProjectSearchForm
     paginate_by = 25
 
-    # XXX q="San Francisco" often written San+Francisco
-    search_fields = [('tcac_number', 'startswith'),
-                     'name',
-                     'locality']
     template_name = 'tcapp/project/index.html'
 
+    def get_queryset(self):
+        return search_properties(self.get_search_query())
+
     def get_search_query(self):
         if not hasattr(self, '_query'):
             form = self.form_class(data=self.request.GET)
@@ -103,9 +134,9 @@ class ProjectSearchView(SearchableListMixin, ProjectListMixin, ListView):
         self.object_list = []
         if self.get_search_query() is not None:
             self.object_list = self.get_queryset()
-            status = 404 if self.object_list.count() == 0 else None
-            if self.object_list.count() == 1:
+            status = 404 if not self.object_list else None
+            if len(self.object_list) == 1:
                 return HttpResponseRedirect(reverse(
-                    'project_detail', args=(self.object_list.get(),)))
+                    'project_detail', args=(self.object_list[0],)))
         context = self.get_context_data()
         return self.render_to_response(context, status=status)
@@ -0,0 +1,66 @@
+# Copyright (c) 2018, TeaCapp LLC
+#   All rights reserved.
+"""
+Serves static files, preferring precompressed variants.
+
+Bundles built by ``manage.py assets build`` have a content hash in their
+filename (see ``tcapp.assets``). ``manage.py compress_assets`` writes
+``.br`` and ``.gz`` variants next to them. This view picks the smallest
+variant the client accepts and marks fingerprinted files as cacheable
+forever. Deployments behind nginx can achieve the same with ``gzip_static``
+and an ``expires max`` directive on the cache/ directory.
+"""
+from __future__ import unicode_literals
+
+import mimetypes, os, re
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.static import serve as static_serve
+
+
+FINGERPRINTED_RE = re.compile(r'\.[0-9a-f]{8,}\.(css|js)$')
+
+# Encodings in order of preference, with the extension of their variant.
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+STATIC_FINGERPRINTED_MAX_AGE = getattr(
+    settings, 'STATIC_FINGERPRINTED_MAX_AGE', 365 * 24 * 3600)
+
+
+def _accepted_encodings(request):
+    return [encoding.split(';')[0].strip() for encoding in
+        request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')]
+
+
+def serve(request, path, document_root=None, show_indexes=False):
+    """
+    Same as ``django.views.static.serve`` except that a precompressed
+    variant of *path* is returned when the client accepts it.
+    """
+    accepted_encodings = _accepted_encodings(request)
+    served_path = path
+    content_encoding = None
+    has_variants = False
+    for encoding, ext in PRECOMPRESSED:
+        if not os.path.isfile(os.path.join(document_root, path + ext)):
+            continue
+        has_variants = True
+        if encoding in accepted_encodings:
+            served_path = path + ext
+            content_encoding = encoding
+            break
+    response = static_serve(request, served_path,
+        document_root=document_root, show_indexes=show_indexes)
+    if content_encoding:
+        content_type, _ = mimetypes.guess_type(path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        response['Content-Encoding'] = content_encoding
+    if has_variants:
+        # The body depends on ``Accept-Encoding`` whether or not
+        # a variant was served.
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if FINGERPRINTED_RE.search(path):
+        patch_cache_control(response, public=True,
+            max_age=STATIC_FINGERPRINTED_MAX_AGE)
+    return response
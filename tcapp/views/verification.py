@@ -4,22 +4,25 @@
 from __future__ import unicode_literals
 
 import logging
+from timeit import default_timer
 
 from django.http import Http404, HttpResponse
 from django.template import TemplateDoesNotExist
 from django.views.generic import TemplateView
-from extended_templates.utils import get_template
 
-from ..mixins import (ApplicationMixin, ResidentBaseMixin, ResidentMixin,
-    SourceMixin)
+from ..budgets import QueryBudget, QueryBudgetMixin
+from ..caches import get_project_cache_version
+from ..mixins import (ApplicationMixin, ConditionalGetMixin,
+    ResidentBaseMixin, ResidentMixin, SourceMixin)
 from ..models import Answer, Asset, Income, Question, Resident
-from ..humanize import as_money, as_percentage
+from ..humanize import DATETIME_FORMAT, as_money, as_percentage
+from ..middleware import record_duration
+from ..routers import use_replica
 from ..templatetags.tcapptags import humanize_list
 
 
 LOGGER = logging.getLogger(__name__)
 
-DATETIME_FORMAT = "%m-%d-%Y"
 DOB_DATETIME_FORMAT = "%m/%d/%Y"
 
 def _format_date(date_to_format, date_format=DATETIME_FORMAT):
@@ -29,17 +32,39 @@ def _format_date(date_to_format, date_format=DATETIME_FORMAT):
         return "invalid-date"
 
 
-class VerificationFormView(TemplateView):
+class VerificationFormView(ConditionalGetMixin, TemplateView):
+    """
+    PDF form filled with information about an application.
+
+    Unchanged forms are answered with 304 Not Modified (see
+    ``ConditionalGetMixin``) before the form is rendered.
+    """
 
     http_method_names = ['get']
 
+    def get_etag_key(self):
+        # Forms also print property information and income limits.
+        application = self.application
+        return '%s|%s|%s' % (super(VerificationFormView, self).get_etag_key(),
+            self.template_name, get_project_cache_version(
+                application.lihtc_property) if application else '')
+
+    @use_replica()
     def get(self, request, *args, **kwargs):
+        not_modified = self.get_not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+        # The PDF machinery is only loaded when a form is first rendered.
+        from extended_templates.utils import get_template
         context = self.get_context_data(**kwargs)
         response = HttpResponse(content_type='application/pdf')
         try:
             template = get_template(self.template_name)
+            started_at = default_timer()
             response.write(template.render(context))
-            return response
+            record_duration(request, 'pdf_duration',
+                default_timer() - started_at)
+            return self.set_validators(response)
         except TemplateDoesNotExist:
             raise Http404("cannot find template '%s'" % self.template_name)
 
@@ -427,9 +452,10 @@ class StudentStatusView(ResidentMixin, VerificationFormView):
         return context
 
 
-class TICView(ApplicationMixin, VerificationFormView):
+class TICView(QueryBudgetMixin, ApplicationMixin, VerificationFormView):
 
     template_name = 'tcapp/forms/tic.pdf'
+    query_budget = QueryBudget(base=18, per_resident=4)
 
     def get_context_data(self, **kwargs):
         #pylint:disable=too-many-locals,too-many-statements
@@ -653,9 +679,10 @@ class TICView(ApplicationMixin, VerificationFormView):
         return context
 
 
-class TICQView(ResidentBaseMixin, VerificationFormView):
+class TICQView(QueryBudgetMixin, ResidentBaseMixin, VerificationFormView):
 
     template_name = 'tcapp/forms/tic-questionnaire.pdf'
+    query_budget = QueryBudget(base=34)
 
     def get_context_data(self, **kwargs):
         #pylint:disable=too-many-locals,too-many-statements
@@ -1202,9 +1229,34 @@ class TICQView(ResidentBaseMixin, VerificationFormView):
         return context
 
 
-class Under5000AssetsView(ResidentMixin, VerificationFormView):
+def _select_assets(assets, questions, descr=None):
+    return [asset for asset in assets if asset.question_id in questions
+        and (descr is None or asset.descr == descr)]
+
+
+def _sum_assets(assets, questions, descr=None):
+    """
+    Returns the total amount, average interest rate and total annual income
+    of *assets* declared for *questions* (and *descr* when specified).
+    """
+    total_amount = 0
+    total_interest = 0
+    total_annual_income = 0
+    selected = _select_assets(assets, questions, descr=descr)
+    if selected:
+        for asset in selected:
+            total_amount += asset.amount
+            total_interest += asset.interest_rate
+            total_annual_income += asset.annual_income
+        total_interest = total_interest / len(selected)
+    return total_amount, total_interest, total_annual_income
+
+
+class Under5000AssetsView(QueryBudgetMixin, ResidentMixin,
+                          VerificationFormView):
 
     template_name = 'tcapp/forms/under-5000-assets.pdf'
+    query_budget = QueryBudget(base=10)
 
     def get_context_data(self, **kwargs):
         #pylint:disable=too-many-statements
@@ -1218,21 +1270,15 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
             'application-unit-number': self.application.unit_number,
             'tenant-name': self.resident.printable_name
         }
-        if self.resident.assets.count() > 0:
+        # All assets are loaded once and grouped by question below.
+        assets = list(self.resident.assets.all())
+        if assets:
             context.update({'no-assets-no': 1})
         else:
             context.update({'no-assets-yes': 1})
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(question__in=Question.CHECKING)
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.CHECKING)
         context.update({
             'checking-amount': as_money(total_amount, show_unit=False),
             'checking-interest-rate': as_percentage(total_interest),
@@ -1240,16 +1286,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
                 total_annual_income, show_unit=False),
         })
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(question__in=Question.SAVINGS)
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.SAVINGS)
         context.update({
             'savings-amount': as_money(total_amount, show_unit=False),
             'savings-interest-rate': as_percentage(total_interest),
@@ -1257,17 +1295,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
                 total_annual_income, show_unit=False),
         })
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.REVOCABLE_TRUST)
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.REVOCABLE_TRUST)
         context.update({
             'trusts-amount':  as_money(total_amount, show_unit=False),
             'trusts-interest-rate': as_percentage(total_interest),
@@ -1275,17 +1304,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
                 total_annual_income, show_unit=False),
         })
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.REAL_ESTATE)
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.REAL_ESTATE)
         context.update({
             'real-estate-amount': as_money(total_amount, show_unit=False),
             'real-estate-interest-rate': as_percentage(total_interest),
@@ -1294,17 +1314,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.STOCKS, descr="Stocks")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.STOCKS, descr="Stocks")
         context.update({
             'stocks-amount': as_money(total_amount, show_unit=False),
             'stocks-interest-rate': as_percentage(total_interest),
@@ -1313,17 +1324,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.STOCKS, descr="Bonds")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.STOCKS, descr="Bonds")
         context.update({
             'bonds-amount':  as_money(total_amount, show_unit=False),
             'bonds-interest-rate': as_percentage(total_interest),
@@ -1332,17 +1334,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.MONEY_MARKET, descr="Money Market")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.MONEY_MARKET, descr="Money Market")
         context.update({
             'money-market-amount': as_money(total_amount, show_unit=False),
             'money-market-interest-rate': as_percentage(total_interest),
@@ -1350,17 +1343,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
                 total_annual_income, show_unit=False),
         })
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.MONEY_MARKET, descr="CDs")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.MONEY_MARKET, descr="CDs")
         context.update({
             'cds-amount': as_money(total_amount, show_unit=False),
             'cds-interest-rate': as_percentage(total_interest),
@@ -1368,17 +1352,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.RETIREMENT, descr="401K")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.RETIREMENT, descr="401K")
         context.update({
             'retire-401k-amount': as_money(total_amount, show_unit=False),
             'retire-401k-interest-rate': as_percentage(total_interest),
@@ -1387,17 +1362,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.RETIREMENT, descr="IRA")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.RETIREMENT, descr="IRA")
         context.update({
             'ira-amount': as_money(total_amount, show_unit=False),
             'ira-interest-rate': as_percentage(total_interest),
@@ -1405,17 +1371,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.RETIREMENT, descr="Lump Sum Pension")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.RETIREMENT, descr="Lump Sum Pension")
         context.update({
             'lump-sum-amount':  as_money(total_amount, show_unit=False),
             'lump-sum-interest-rate': as_percentage(total_interest),
@@ -1424,17 +1381,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         })
 
         # descr must match BANK_CATEGORY is Javascript.
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.RETIREMENT, descr="Keogh account")
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.RETIREMENT, descr="Keogh account")
         context.update({
             'keogh-amount': as_money(total_amount, show_unit=False),
             'keogh-interest-rate': as_percentage(total_interest),
@@ -1442,9 +1390,7 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
                 total_annual_income, show_unit=False),
         })
 
-        queryset = self.resident.assets.filter(
-            question__in=Question.DISPOSED_ASSETS)
-        if queryset.exists():
+        if _select_assets(assets, Question.DISPOSED_ASSETS):
             context.update({
                 'disposed-assets-yes': 1,
                 'disposed-assets-amount':  as_money(
@@ -1453,17 +1399,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
         else:
             context.update({'disposed-assets-no': 1})
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.LIFE_INSURANCE)
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.LIFE_INSURANCE)
         context.update({
             'life-insurance-amount': as_money(total_amount, show_unit=False),
             'life-insurance-interest-rate': as_percentage(total_interest),
@@ -1539,17 +1476,8 @@ class Under5000AssetsView(ResidentMixin, VerificationFormView):
                 total_annual_income, show_unit=False),
         })
 
-        total_amount = 0
-        total_interest = 0
-        total_annual_income = 0
-        queryset = self.resident.assets.filter(
-            question__in=Question.CASH_ON_HAND)
-        if queryset.exists():
-            for asset in queryset:
-                total_amount += asset.amount
-                total_interest += asset.interest_rate
-                total_annual_income += asset.annual_income
-            total_interest = total_interest / queryset.count()
+        total_amount, total_interest, total_annual_income = _sum_assets(
+            assets, Question.CASH_ON_HAND)
         context.update({
             'cash-amount': as_money(total_amount, show_unit=False),
             'cash-interest-rate': as_percentage(total_interest),